@@ -0,0 +1,206 @@
+#  This file contains a streaming group-by for the results of saved functions.
+#  An Aggregator is fed result dicts as they are scraped and keeps one set of
+#  accumulators (count, sum, min, max, and a quantile sketch) per group, so
+#  memory grows with the number of groups rather than the number of rows.
+#  Aggregators built by separate workers can be merged.
+
+import math
+
+
+class QuantileSketch:
+  # A mergeable sketch of a distribution of numbers that answers quantile
+  # queries to within `relative_accuracy` of the true value.  Values are
+  # counted in logarithmically sized buckets (the DDSketch scheme), so a
+  # sketch of sentence lengths in days holds a few hundred buckets at most.
+
+  def __init__(self, relative_accuracy=0.01):
+    self.relative_accuracy = relative_accuracy
+    self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+    self.log_gamma = math.log(self.gamma)
+    self.positive = {}
+    self.negative = {}
+    self.zeros = 0
+    self.count = 0
+
+  def _index(self, value):
+    return int(math.ceil(math.log(value) / self.log_gamma))
+
+  def _value(self, index):
+    return 2 * self.gamma ** index / (self.gamma + 1)
+
+  def add(self, value):
+    self.count += 1
+    if value > 0:
+      index = self._index(value)
+      self.positive[index] = self.positive.get(index, 0) + 1
+    elif value < 0:
+      index = self._index(-value)
+      self.negative[index] = self.negative.get(index, 0) + 1
+    else:
+      self.zeros += 1
+
+  def merge(self, other):
+    if other.relative_accuracy != self.relative_accuracy:
+      raise ValueError("Cannot merge sketches with different accuracies.")
+    for index, count in other.positive.items():
+      self.positive[index] = self.positive.get(index, 0) + count
+    for index, count in other.negative.items():
+      self.negative[index] = self.negative.get(index, 0) + count
+    self.zeros += other.zeros
+    self.count += other.count
+    return self
+
+  def quantile(self, q):
+    # Input: A number between 0 and 1.
+    # Output: The approximate q-th quantile, or None for an empty sketch.
+    if self.count == 0:
+      return None
+    rank = q * (self.count - 1)
+    seen = 0
+    for index in sorted(self.negative, reverse=True):
+      seen += self.negative[index]
+      if seen > rank:
+        return -self._value(index)
+    seen += self.zeros
+    if seen > rank:
+      return 0
+    for index in sorted(self.positive):
+      seen += self.positive[index]
+      if seen > rank:
+        return self._value(index)
+    return self._value(max(self.positive))
+
+
+class FieldAccumulator:
+  # Count, sum, min, max and quantile sketch of one numeric field within
+  # one group.
+
+  def __init__(self, relative_accuracy=0.01):
+    self.count = 0
+    self.total = 0
+    self.min = None
+    self.max = None
+    self.sketch = QuantileSketch(relative_accuracy)
+
+  def add(self, value):
+    self.count += 1
+    self.total += value
+    self.min = value if self.min is None else min(self.min, value)
+    self.max = value if self.max is None else max(self.max, value)
+    self.sketch.add(value)
+
+  def merge(self, other):
+    self.count += other.count
+    self.total += other.total
+    if other.min is not None:
+      self.min = other.min if self.min is None else min(self.min, other.min)
+      self.max = other.max if self.max is None else max(self.max, other.max)
+    self.sketch.merge(other.sketch)
+    return self
+
+  def quantile(self, q):
+    # The sketch's estimate, kept within the observed range.
+    estimate = self.sketch.quantile(q)
+    if estimate is None:
+      return None
+    return min(max(estimate, self.min), self.max)
+
+
+class Aggregator:
+  # Input: The fields to group results by, e.g. ["judge_name", "grade"],
+  #        the numeric fields to accumulate, e.g. ["min_time", "max_time"],
+  #        and the quantiles to report for each numeric field.
+  # Rows missing a group field are grouped under "unknown".  Values that
+  # aren't numbers (like "unknown") count towards the group's row count but
+  # not towards the field's accumulators.
+
+  def __init__(self, by, values, quantiles=(0.5, 0.9), relative_accuracy=0.01):
+    self.by = list(by)
+    self.values = list(values)
+    self.quantiles = list(quantiles)
+    self.relative_accuracy = relative_accuracy
+    self.groups = {}
+
+  def empty(self):
+    # Output: A new Aggregator with the same settings and no groups, e.g. for
+    #         a worker to fill in.
+    return Aggregator(self.by, self.values, self.quantiles, self.relative_accuracy)
+
+  def _group(self, key):
+    group = self.groups.get(key)
+    if group is None:
+      group = {"count": 0,
+               "fields": {value: FieldAccumulator(self.relative_accuracy)
+                          for value in self.values}}
+      self.groups[key] = group
+    return group
+
+  def add(self, row):
+    group = self._group(tuple(row.get(field, "unknown") for field in self.by))
+    group["count"] += 1
+    for value in self.values:
+      observed = row.get(value)
+      if isinstance(observed, (int, float)) and not isinstance(observed, bool):
+        group["fields"][value].add(observed)
+
+  def add_all(self, rows):
+    for row in rows:
+      self.add(row)
+
+  def merge(self, other):
+    # Input: Another Aggregator with the same settings.
+    # Output: This Aggregator, with other's groups added into it.
+    if other.by != self.by or other.values != self.values:
+      raise ValueError("Cannot merge aggregators over different fields.")
+    for key, other_group in other.groups.items():
+      group = self._group(key)
+      group["count"] += other_group["count"]
+      for value, accumulator in other_group["fields"].items():
+        group["fields"][value].merge(accumulator)
+    return self
+
+  def rows(self):
+    # Output: A list of dicts, one per group, sorted by group.  Each has the
+    #         group fields, "count", and for each value field v: v_count,
+    #         v_sum, v_min, v_max, v_mean and v_p50 etc. for each quantile.
+    rows = []
+    for key in sorted(self.groups, key=str):
+      group = self.groups[key]
+      row = dict(zip(self.by, key))
+      row["count"] = group["count"]
+      for value in self.values:
+        accumulator = group["fields"][value]
+        row[value + "_count"] = accumulator.count
+        row[value + "_sum"] = accumulator.total
+        row[value + "_min"] = accumulator.min
+        row[value + "_max"] = accumulator.max
+        row[value + "_mean"] = (accumulator.total / accumulator.count
+                                if accumulator.count else None)
+        for q in self.quantiles:
+          row["{}_p{:g}".format(value, q * 100)] = accumulator.quantile(q)
+      rows.append(row)
+    return rows
+
+
+def aggregate_chunk(job):
+  # Input: A tuple of an AskADocket, an empty Aggregator and a list of
+  #        docket paths.  (One argument, so it can be mapped over a Pool.)
+  # Output: The errors, the filled in Aggregator and the counts for the
+  #         chunk.
+  scraper, aggregator, files = job
+  errors = []
+  successes = 0
+  rows = 0
+  for file in files:
+    try:
+      file_errors, file_results = scraper.scrape_docket(file)
+    except Exception as e:
+      print("Error while parsing {}.".format(file))
+      print(e)
+      continue
+    aggregator.add_all(file_results)
+    rows += len(file_results)
+    errors += file_errors
+    successes += 1
+  return errors, aggregator, {"total_dockets_scraped": len(files),
+                              "successes": successes, "rows": rows}
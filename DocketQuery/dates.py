@@ -0,0 +1,71 @@
+#  This file turns the MM/DD/YYYY date strings that saved functions return
+#  into datetime.date objects, once, at scrape time, and adds fields derived
+#  from them.  Use normalize_dates as an AskADocket transform:
+#
+#    AskADocket(conviction_information, transforms=[normalize_dates])
+#
+#  A corpus only has a few thousand distinct dates, so parsed dates are
+#  cached.  Dates that can't be parsed (like "unknown") become None, which
+#  dicts2csv writes as an empty cell; dates are written as YYYY-MM-DD.
+
+import datetime
+from functools import lru_cache
+
+DATE_FIELDS = ("date_filed", "date_initiated", "birth_date", "action_date")
+
+
+@lru_cache(maxsize=1 << 15)
+def parse_date(text):
+  # Input: A date string like "01/03/2011" (surrounding space is ignored).
+  # Output: A datetime.date, or None if the string isn't a date.
+  try:
+    month, day, year = text.strip().split("/")
+    return datetime.date(int(year), int(month), int(day))
+  except (AttributeError, ValueError):
+    return None
+
+
+def to_date(value):
+  # Input: A date string, a datetime.date, or anything else.
+  # Output: A datetime.date, or None.
+  if isinstance(value, datetime.date):
+    return value
+  if isinstance(value, str):
+    return parse_date(value)
+  return None
+
+
+def years_between(start, end):
+  # Input: Two datetime.dates, or None.
+  # Output: The number of whole years from start to end (an age), or None.
+  if start is None or end is None:
+    return None
+  return end.year - start.year - ((end.month, end.day) < (start.month, start.day))
+
+
+def days_between(start, end):
+  # Input: Two datetime.dates, or None.
+  # Output: The number of days from start to end, or None.
+  if start is None or end is None:
+    return None
+  return (end - start).days
+
+
+def normalize_dates(row):
+  # Input: A result dict from a saved function.
+  # Output: The same dict, with every field in DATE_FIELDS it has turned
+  #         into a datetime.date (or None), and these derived fields:
+  #         "age_at_filing" (with a birth_date and date_filed),
+  #         "age_at_action" and "days_filing_to_action" (with an action_date
+  #         as well; conviction_information's action_date is the sentencing).
+  for field in DATE_FIELDS:
+    if field in row:
+      row[field] = to_date(row[field])
+  if "birth_date" in row and "date_filed" in row:
+    row["age_at_filing"] = years_between(row["birth_date"], row["date_filed"])
+  if "action_date" in row:
+    if "birth_date" in row:
+      row["age_at_action"] = years_between(row["birth_date"], row["action_date"])
+    if "date_filed" in row:
+      row["days_filing_to_action"] = days_between(row["date_filed"], row["action_date"])
+  return row
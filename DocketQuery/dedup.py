@@ -0,0 +1,134 @@
+#  This file picks one version of each docket out of a directory that holds
+#  several versions of some dockets (re-downloads, _stitched_complete
+#  variants and so on), so they are only scraped and counted once.
+#
+#  Versions are keyed by docket number and ranked: complete versions beat
+#  incomplete ones, then newer files beat older ones, then bigger files beat
+#  smaller ones.  Files with identical contents are recognized by a content
+#  hash, which is only computed when two files claim the same docket number.
+#  The index fits in a dict, or in a shelve file on disk for corpora too big
+#  to index in memory.
+
+import hashlib
+import os
+import shelve
+
+from lxml import etree
+
+from DocketQuery.docket_query import docket_number_from_path
+
+
+def content_hash(path):
+  # Input: A path to a file.
+  # Output: The sha1 hex digest of its contents.
+  digest = hashlib.sha1()
+  with open(path, "rb") as f:
+    for block in iter(lambda: f.read(1 << 16), b""):
+      digest.update(block)
+  return digest.hexdigest()
+
+
+def read_docket_number(path):
+  # Input: A path to a parsed docket.
+  # Output: The docket number in the file name, or if the name doesn't have
+  #         one, the docket number in the docket's header.  Only the
+  #         beginning of the file is parsed.  None if neither works.
+  docket_number = docket_number_from_path(path)
+  if docket_number is not None:
+    return docket_number
+  try:
+    for event, element in etree.iterparse(path, tag="docket_number"):
+      return (element.text or "").strip() or None
+  except etree.XMLSyntaxError:
+    return None
+  return None
+
+
+def version_rank(path, stat=None):
+  # Input: A path to a parsed docket (and its os.stat, if already known).
+  # Output: A tuple that sorts the better version of a docket last.
+  stat = stat or os.stat(path)
+  name = os.path.basename(path)
+  # "_incomplete.xml" contains "complete" too, so match the whole marker.
+  complete = name.endswith("_complete.xml") or "_stitched_complete" in name
+  return (complete, stat.st_mtime_ns, stat.st_size)
+
+
+class VersionIndex:
+  # Input: Optionally a path for an on-disk index.  Without one, the index
+  #        is kept in memory.
+  # Each docket number maps to [rank, path, content hash or None].
+
+  def __init__(self, index_path=None):
+    self.index = shelve.open(index_path, flag="n") if index_path else {}
+    self.counts = {"files": 0, "unnumbered": 0, "identical": 0, "superseded": 0}
+
+  def offer(self, path):
+    # Input: A path to a version of a docket.
+    # Output: True if it is now the kept version of its docket.
+    self.counts["files"] += 1
+    docket_number = read_docket_number(path)
+    if docket_number is None:
+      # Can't tell what docket this is, so keep it under its own name.
+      self.counts["unnumbered"] += 1
+      docket_number = "path:" + path
+    candidate = [version_rank(path), path, None]
+    kept = self.index.get(docket_number)
+    if kept is None:
+      self.index[docket_number] = candidate
+      return True
+    if kept[2] is None:
+      kept[2] = content_hash(kept[1])
+    candidate[2] = content_hash(path)
+    if candidate[2] == kept[2]:
+      self.counts["identical"] += 1
+    else:
+      self.counts["superseded"] += 1
+    if candidate[0] > kept[0]:
+      self.index[docket_number] = candidate
+      return True
+    self.index[docket_number] = kept
+    return False
+
+  def paths(self):
+    # Output: An iterator over the path of the kept version of each docket.
+    for docket_number in self.index.keys():
+      yield self.index[docket_number][1]
+
+  def close(self):
+    if isinstance(self.index, shelve.Shelf):
+      self.index.close()
+
+
+def _kept_paths(index):
+  # Yield the paths of an index, then close it.
+  try:
+    for path in index.paths():
+      yield path
+  finally:
+    index.close()
+
+
+def latest_versions(files, index_path=None, sort=True):
+  # Input: An iterable of docket paths, optionally a path for an on-disk
+  #        index, and whether to sort the kept paths.
+  # Output: The paths of the kept version of each docket, and a dict of
+  #         counts: "files" seen, "unnumbered" files, and the number of
+  #         files dropped because they were "identical" to or "superseded"
+  #         by another version.  Sorted, the paths are a list; otherwise
+  #         they are an iterator in index order, read from the index as
+  #         they are needed, so an on-disk index isn't loaded into memory.
+  index = VersionIndex(index_path)
+  try:
+    for path in files:
+      index.offer(path)
+  except BaseException:
+    index.close()
+    raise
+  counts = dict(index.counts)
+  if not sort:
+    return _kept_paths(index), counts
+  try:
+    return sorted(index.paths()), counts
+  finally:
+    index.close()
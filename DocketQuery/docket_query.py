@@ -10,41 +10,428 @@ import pytest
 import io
 from io import StringIO
 import csv
+import collections
+import itertools
+import os
+import re
+import multiprocessing
+import threading
+
+DOCKET_NUMBER_PATTERN = re.compile(r"([A-Z]{2})-(\d{2})-([A-Z]{2})-(\d{7})-(\d{4})")
 
 class AskADocket:
 
-  def __init__(self, fun):
-    #Input: A function
+  def __init__(self, fun, transforms=(), backend="tree"):
+    #Input: A function, and optionally a list of transforms.  A transform
+    #       is a function that takes a result dict and returns it (changed),
+    #       such as dates.normalize_dates.  They are applied to every
+    #       result, in order, as each docket is scraped.
+    #       backend is "tree" to parse each docket into a tree and call the
+    #       function on it, or "target" to use the function's parser target
+    #       version (see targets.py), which never builds a tree.
     self.scrape_function = fun
+    self.transforms = list(transforms)
+    if backend == "target":
+      from DocketQuery.targets import TARGET_EXTRACTORS
+      if fun not in TARGET_EXTRACTORS:
+        raise ValueError("{} has no parser target version.".format(fun.__name__))
+    elif backend != "tree":
+      raise ValueError("Unknown backend {}.".format(backend))
+    self.backend = backend
 
   def scrape_docket(self, docket):
-    # Input: Path to a parsed docket file.  Could be a file object or StringIO object
+    # Input: Path to a parsed docket file.  Could be a file object or StringIO object,
+    #        or a packs.PackedDocket, which is scraped under its original path.
     # Output: A list of errors, each of which is a dict,
     #         A list of results, each of which is a dict that is the result
     #         of applying the function
     #         A dict with the total count of dockets scraped.
-    return self.scrape_function(etree.parse(docket), docket)
+    if self.backend == "target":
+      from DocketQuery.targets import TARGET_EXTRACTORS
+      extract = TARGET_EXTRACTORS[self.scrape_function]
+      if hasattr(docket, "tree"):
+        errors, results = extract(docket.stream(), docket.name)
+      else:
+        errors, results = extract(docket, docket)
+      return errors, self.transform(results)
+    if hasattr(docket, "tree"):
+      return self.scrape_tree(docket.tree(), docket.name)
+    return self.scrape_tree(parse_docket(docket), docket)
+
+  def scrape_tree(self, docket_tree, file_name):
+    # Input: A docket already parsed into an ElementTree, and its file name.
+    # Output: errors and results, as in scrape_docket.  This lets several
+    #         scrapers share one parse (see pipeline.py).
+    errors, results = self.scrape_function(docket_tree, file_name)
+    return errors, self.transform(results)
+
+  def transform(self, results):
+    # Output: The results with each of the transforms applied, in order.
+    for transform in self.transforms:
+      results = [transform(result) for result in results]
+    return results
+
+  def scrape_directory(self, directory_path, dedup=False, dedup_index=None, **options):
+    # Input: A path to a directory of parsed dockets.  With dedup, only the
+    #        latest, most complete version of each docket number is scraped
+    #        (see dedup.py); dedup_index is an optional path for an on-disk
+    #        index, for directories too big to index in memory.  Other
+    #        options (workers, progress ...) are passed on to scrape_files.
+    # Output: errors, results and counts, as in scrape_files.  With dedup,
+    #         counts also has the number of "duplicates_skipped".
+    files = list_dockets(directory_path)
+    if not dedup:
+      return self.scrape_files(list(files), **options)
+    from DocketQuery.dedup import latest_versions
+    # An on-disk index is streamed rather than sorted in memory, so its
+    # dockets are scraped in index order.  (scrape_files still lists them
+    # all if a size schedule or linkage needs them at once.)
+    files, version_counts = latest_versions(files, index_path=dedup_index,
+                                            sort=dedup_index is None)
+    errors, results, counts = self.scrape_files(files, **options)
+    counts["duplicates_skipped"] = version_counts["identical"] + version_counts["superseded"]
+    return errors, results, counts
+
+  def scrape_files(self, files, workers=1, chunksize=100, progress=None,
+                   error_summary=False, spill_after=None, linkage=None,
+                   schedule=None):
+    # Input: An iterable of paths to parsed dockets, the number of worker
+    #        processes, the number of dockets each worker takes at a time,
+    #        optionally a progress.Progress to report to, whether to
+    #        summarize errors instead of listing them, optionally the
+    #        number of results (and of errors) to keep in memory before
+    #        spilling them to disk, optionally a linkage.DefendantIndex
+    #        to give each result a defendant_id (dockets without results
+    #        are linked by their header, see linked_chunks), and how to
+    #        chunk the files (see chunk_files).
+    # Output: Same as scrape_directory: errors, results and counts.  With
+    #         error_summary, errors is an errors.ErrorSummary, with counts
+    #         of errors by field and by file (see its field_rows() and
+    #         file_rows() for writing them out with dicts2csv).  With
+    #         spill_after, results and errors are spill.SpillLists, which
+    #         can be used like lists and passed to dicts2csv.  With
+    #         schedule="size", results come in the order the chunks were
+    #         scheduled (largest dockets first) rather than file order,
+    #         except with linkage, which always links and returns them in
+    #         file order (see linked_chunks).  Without a size schedule or
+    #         linkage, an iterator of files is only read as far as the chunks
+    #         handed out so far, so it can come straight from an on-disk
+    #         index.  (A progress.Progress then only knows the total if
+    #         files has a length.)
+    if workers <= 1:
+      chunksize = 1
+    if linkage is None and (schedule is None or workers <= 1):
+      total = len(files) if hasattr(files, "__len__") else None
+      jobs = ((self, chunk) for chunk in iter_chunks(files, chunksize))
+    else:
+      files = list(files)
+      total = len(files)
+      jobs = [(self, chunk) for chunk in chunk_files(files, workers, chunksize, schedule)]
+    if spill_after:
+      from DocketQuery.spill import SpillList
+      results = SpillList(spill_after)
+    else:
+      results = []
+    if error_summary:
+      from DocketQuery.errors import ErrorSummary
+      errors = ErrorSummary()
+    elif spill_after:
+      errors = SpillList(spill_after)
+    else:
+      errors = []
+    counts = {"total_dockets_scraped": 0, "successes": 0}
+    if progress is not None:
+      progress.start(total)
+    if linkage is not None:
+      outcomes = linked_chunks(files, jobs, workers, linkage)
+    else:
+      outcomes = map_chunks(scrape_chunk, jobs, workers)
+    for chunk_errors, chunk_results, chunk_counts in outcomes:
+      results += chunk_results
+      if error_summary:
+        errors.add(chunk_errors)
+      else:
+        errors += chunk_errors
+      for key in counts:
+        counts[key] += chunk_counts[key]
+      if progress is not None:
+        progress.update(chunk_counts, rows=len(chunk_results), errors=len(chunk_errors))
+    if progress is not None:
+      progress.finish()
+    return errors, results, counts
+
+  def scrape_pack(self, pack_directory, **options):
+    # Input: A directory of dockets converted with packs.convert_corpus, and
+    #        options for scrape_files (workers, progress ...).
+    # Output: errors, results and counts, as in scrape_files.  Errors name
+    #         the dockets' original paths.
+    from DocketQuery.packs import PackIndex
+    return self.scrape_files(PackIndex.load(pack_directory).dockets(), **options)
+
+  def sample_directory(self, directory_path, n, seed=None, stratify=None):
+    # Input: A directory, the number of dockets to sample, a random seed
+    #        (the same seed always picks the same files) and optionally
+    #        a list of docket number parts to stratify by, such as
+    #        ["year", "court"].
+    # Output: Same as scrape_directory, with the size of the population
+    #         the sample was drawn from added to the counts.  The listing
+    #         goes straight into the reservoirs, so only the sampled paths
+    #         are held in memory; they are scraped in sorted order.
+    from DocketQuery import sampling
+    population = itertools.count()   # Counts the paths as they are listed.
+    files = (path for path, _ in zip(list_dockets(directory_path), population))
+    sample = sampling.sample_files(files, n, seed=seed, stratify=stratify)
+    errors, results, counts = self.scrape_files(sorted(sample))
+    counts["population"] = next(population)
+    return errors, results, counts
+
+  def scrape_partitions(self, catalog, where=None, **options):
+    # Input: A partitions.Catalog of a partitioned corpus, a predicate on
+    #        partitions (see partitions.matches), e.g.
+    #        {"county": "51", "year": ["2011", "2012"]}, and options for
+    #        scrape_files (workers, progress ...).  Partitions that don't
+    #        match are never listed or opened.
+    # Output: errors, results and counts, as in scrape_files, with the
+    #         number of "partitions_scanned" and "partitions_pruned".
+    files = catalog.files(where)
+    errors, results, counts = self.scrape_files(files, **options)
+    scanned = len(catalog.select(where))
+    counts["partitions_scanned"] = scanned
+    counts["partitions_pruned"] = len(catalog.partitions) - scanned
+    return errors, results, counts
+
+  def aggregate_directory(self, directory_path, aggregator, workers=1,
+                          chunksize=100, progress=None, schedule=None):
+    # Input: A path to a directory of parsed dockets, an
+    #        aggregation.Aggregator, and options for aggregate_files
+    #        (workers, chunksize, progress, schedule).
+    # Output: errors, the aggregator and counts, as in aggregate_files.
+    return self.aggregate_files(list_dockets(directory_path), aggregator,
+                                workers=workers, chunksize=chunksize,
+                                progress=progress, schedule=schedule)
 
-  def scrape_directory(self, directory_path):
-    successes = 0
-    total = 0
-    results = []
+  def aggregate_files(self, files, aggregator, workers=1, chunksize=100, progress=None,
+                      schedule=None):
+    # Input: An iterable of paths to parsed dockets, an
+    #        aggregation.Aggregator, the number of worker processes, the
+    #        number of dockets each worker takes at a time, optionally a
+    #        progress.Progress to report to, and how to chunk the files
+    #        (see chunk_files).
+    # Output: A list of errors, the aggregator, holding the aggregates of all
+    #         the results, and a dict with the total count of dockets scraped.
+    #         Results are never collected into a list.  Each worker fills in
+    #         its own Aggregator and they are merged into `aggregator`.
+    from DocketQuery.aggregation import aggregate_chunk
+    files = list(files)
+    jobs = [(self, aggregator.empty(), chunk)
+            for chunk in chunk_files(files, workers, chunksize, schedule)]
     errors = []
-    for file in glob.iglob(directory_path + "*.xml"):
-      total += 1
-      try:
-        file_errors, file_results = self.scrape_docket(file)
-        results += file_results
-        errors += file_errors
-        successes += 1
-      except Exception as e:
-        print("Error while parsing {}.".format(file))
-        print(e)
-    return errors, results, {"total_dockets_scraped": total, "successes": successes}
+    counts = {"total_dockets_scraped": 0, "successes": 0}
+    if progress is not None:
+      progress.start(len(files))
+    for chunk_errors, partial, chunk_counts in map_chunks(aggregate_chunk, jobs, workers):
+      errors += chunk_errors
+      aggregator.merge(partial)
+      for key in counts:
+        counts[key] += chunk_counts[key]
+      if progress is not None:
+        progress.update(chunk_counts, rows=chunk_counts["rows"], errors=len(chunk_errors))
+    if progress is not None:
+      progress.finish()
+    return errors, aggregator, counts
+
+
+def chunk_files(files, workers, chunksize, schedule=None):
+  # Input: A list of dockets, the number of workers, the most dockets in a
+  #        chunk, and how to schedule them: None for chunks of `chunksize`
+  #        dockets in file order, "size" for chunks of about equal bytes,
+  #        largest dockets first (see scheduling.py), or a path to a
+  #        snapshot.py manifest to take the sizes from.
+  # Output: A list of lists of dockets.
+  if schedule is None or workers <= 1:
+    return [files[i:i + chunksize] for i in range(0, len(files), chunksize)]
+  from DocketQuery import scheduling
+  manifest_path = None if schedule == "size" else schedule
+  sizes = scheduling.docket_sizes(files, manifest_path)
+  return scheduling.size_chunks(files, workers, sizes, max_chunksize=chunksize)
+
+
+def iter_chunks(files, chunksize):
+  # Input: An iterable of dockets and the most dockets in a chunk.
+  # Output: An iterator over lists of `chunksize` dockets in file order,
+  #         reading the files only as each chunk is taken.
+  files = iter(files)
+  while True:
+    chunk = list(itertools.islice(files, chunksize))
+    if not chunk:
+      return
+    yield chunk
+
+
+def scrape_chunk(job):
+  # Input: A tuple of an AskADocket and a list of docket paths.  (One
+  #        argument, so it can be mapped over a Pool.)
+  # Output: The errors, results and counts for the chunk.
+  scraper, files = job
+  errors = []
+  results = []
+  successes = 0
+  for file in files:
+    try:
+      file_errors, file_results = scraper.scrape_docket(file)
+      results += file_results
+      errors += file_errors
+      successes += 1
+    except Exception as e:
+      print("Error while parsing {}.".format(file))
+      print(e)
+  return errors, results, {"total_dockets_scraped": len(files), "successes": successes}
+
+
+def docket_header(docket):
+  # Input: A path to a parsed docket, or a packs.PackedDocket.
+  # Output: The single result of saved_functions.docket_num_name_age for it
+  #         (read without building a tree, from a path), or None if it
+  #         can't be read.
+  try:
+    if hasattr(docket, "tree"):
+      from DocketQuery.saved_functions import docket_num_name_age
+      return docket_num_name_age(docket.tree(), docket.name)[1][0]
+    from DocketQuery.targets import docket_num_name_age
+    return docket_num_name_age(docket, docket)[1][0]
+  except Exception:
+    return None
+
+
+def scrape_chunk_by_file(job):
+  # Input: The same as scrape_chunk.
+  # Output: A list of (file, errors, results, header) for each docket in the
+  #         chunk, with results None for dockets that failed, and the
+  #         counts.  Dockets with no results have their docket_header, so
+  #         they can still be linked; for the others it is None.
+  scraper, files = job
+  dockets = []
+  successes = 0
+  for file in files:
+    try:
+      file_errors, file_results = scraper.scrape_docket(file)
+      successes += 1
+    except Exception as e:
+      print("Error while parsing {}.".format(file))
+      print(e)
+      file_errors, file_results = [], None
+    header = docket_header(file) if file_results == [] else None
+    dockets.append((file, file_errors, file_results, header))
+  return dockets, {"total_dockets_scraped": len(files), "successes": successes}
+
+
+def linked_chunks(files, jobs, workers, linkage):
+  # Input: The list of dockets, the chunk jobs for them, the number of
+  #        workers, and a linkage.DefendantIndex.
+  # Output: An iterator over errors, results and counts, like
+  #         map_chunks(scrape_chunk, ...), with every result given its
+  #         defendant_id.  Dockets are linked here rather than in the
+  #         workers, so one index sees them all, and in file order whatever
+  #         order their chunks were scheduled in, so the ids are the same
+  #         for any schedule and number of workers.  A docket whose chunk
+  #         finishes before an earlier docket's waits for it.  Dockets with
+  #         no results are linked by their header, so they still count
+  #         among their defendant's dockets.
+  positions = {}
+  for i, file in enumerate(files):
+    positions.setdefault(file, []).append(i)
+  waiting = {}
+  next_position = 0
+  for dockets, counts in map_chunks(scrape_chunk_by_file, jobs, workers):
+    for file, file_errors, file_results, header in dockets:
+      waiting[positions[file].pop(0)] = (file, file_errors, file_results, header)
+    chunk_errors = []
+    chunk_results = []
+    while next_position in waiting:
+      file, file_errors, file_results, header = waiting.pop(next_position)
+      next_position += 1
+      chunk_errors += file_errors
+      if file_results:
+        chunk_results += linkage.add_all(file_results, getattr(file, "name", file))
+      elif header is not None:
+        linkage.add_docket(header, getattr(file, "name", file))
+    yield chunk_errors, chunk_results, counts
+
+
+def map_chunks(function, jobs, workers=1):
+  # Input: A function of one argument, a list of arguments for it, and the
+  #        number of worker processes to use.
+  # Output: An iterator over function(job) for each job, in order.  With
+  #         more than one worker, jobs run in a multiprocessing.Pool, so the
+  #         function and its arguments must be picklable (saved functions
+  #         and transforms defined at module level are; lambdas aren't).
+  #         Jobs are taken from `jobs` as the pool has room for them (two
+  #         per worker), so an iterator of jobs is never read far ahead.
+  if workers <= 1:
+    for job in jobs:
+      yield function(job)
+    return
+  pool = multiprocessing.Pool(workers)
+  try:
+    pending = collections.deque()
+    for job in jobs:
+      pending.append(pool.apply_async(function, (job,)))
+      if len(pending) >= 2 * workers:
+        yield pending.popleft().get()
+    while pending:
+      yield pending.popleft().get()
+  finally:
+    pool.close()
+    pool.join()
+
+
+_parsers = threading.local()
+
+def parse_docket(docket):
+  # Input: Path to a parsed docket file, or a file object.
+  # Output: The docket as an ElementTree.  Whitespace-only text between
+  #         elements (docket_parse indents its output) is dropped while
+  #         parsing, so the tree has fewer nodes to build and search.
+  #         lxml parsers can't be shared between threads, so each thread
+  #         gets its own.
+  parser = getattr(_parsers, "parser", None)
+  if parser is None:
+    parser = _parsers.parser = etree.XMLParser(remove_blank_text=True)
+  return etree.parse(docket, parser)
+
+
+def list_dockets(directory_path):
+  # Input: A path to a directory of parsed dockets, ending in a slash.
+  # Output: An iterator over the paths of the xml files in the directory.
+  return glob.iglob(directory_path + "*.xml")
+
+
+def docket_number_from_path(path):
+  # Input: A path to a docket named the way docket_parse names them, e.g.
+  #        .../CP-51-CR-0000001-2011_stitched_complete.xml
+  # Output: The docket number in the name, or None if there isn't one.
+  match = DOCKET_NUMBER_PATTERN.search(os.path.basename(path))
+  return match.group(0) if match else None
+
+
+def docket_number_parts(docket_number):
+  # Input: A docket number like CP-51-CR-0000001-2011
+  # Output: A dict of its parts: court ("CP"), county ("51"),
+  #         case_type ("CR"), serial ("0000001") and year ("2011").
+  #         Parts are "unknown" if the docket number can't be read.
+  match = DOCKET_NUMBER_PATTERN.search(docket_number or "")
+  if match is None:
+    return {"court": "unknown", "county": "unknown", "case_type": "unknown",
+            "serial": "unknown", "year": "unknown"}
+  court, county, case_type, serial, year = match.groups()
+  return {"court": court, "county": county, "case_type": case_type,
+          "serial": serial, "year": year}
 
 
 def dicts2csv(errors, results, error_file, results_file, counts = {}, counts_file = None):
   # Input: a list of hashes which will become the rows of a csv table
+  #        (or a spill.SpillList of them, which is read back from disk one
+  #        row at a time)
   # Output: Writes errors and results to two csv files (or file-like objects)
 
   # Writing errors:
@@ -0,0 +1,128 @@
+#  This file contains the compact representation of the errors saved
+#  functions report, and a summary of errors for error-heavy corpora.
+#
+#  Saved functions report an error as a dict with an "error_file", an
+#  "error_field", and (for most functions) a "message".  The message is a
+#  short error code from ERROR_CODES rather than the exception itself, since
+#  an exception keeps its traceback, and with it the docket's tree, alive.
+#  Field paths like "sequence_0/action_1/judge_name" repeat across dockets,
+#  so they are interned.
+#
+#  An ErrorSummary keeps counts of errors by field and by file, and a
+#  bitmask per file of which fields had errors, instead of every error.
+
+import re
+import sys
+
+MISSING = "missing"          # The xpath found nothing.
+UNPARSEABLE = "unparseable"  # A value was found but couldn't be converted.
+OTHER = "error"
+
+ERROR_CODES = {
+  IndexError: MISSING,
+  ValueError: UNPARSEABLE,
+  ZeroDivisionError: UNPARSEABLE,
+  TypeError: UNPARSEABLE,
+  AttributeError: UNPARSEABLE,
+}
+
+# Each field saved functions report errors for gets a bit in a docket's
+# error mask.  Fields not listed here share the last bit.
+FIELD_BITS = {name: 1 << bit for bit, name in enumerate([
+  "defendant_name", "docket number", "birth_date", "date_initiated",
+  "date_filed", "charge_desc", "charge_section", "grade", "judge_name",
+  "date", "program", "min_time", "max_time", "other"])}
+
+INDEX_PATTERN = re.compile(r"_\d+(?=/)")
+
+
+def error_code(exception):
+  # Input: An exception raised while scraping a field.
+  # Output: A short code for it, from ERROR_CODES.
+  for kind in type(exception).__mro__:
+    if kind in ERROR_CODES:
+      return ERROR_CODES[kind]
+  return OTHER
+
+
+def field_path(path):
+  # Input: A field path, like "sequence_0/action_1/judge_name".
+  # Output: The same string, interned, so repeated paths share memory.
+  return sys.intern(path)
+
+
+def field_name(path):
+  # Input: A field path.
+  # Output: The field at the end of it, e.g. "judge_name".
+  return path.rsplit("/", 1)[-1]
+
+
+def generic_path(path):
+  # Input: A field path.
+  # Output: The path with its indices replaced by *, e.g.
+  #         "sequence_*/action_*/judge_name", for counting errors by field.
+  return INDEX_PATTERN.sub("_*", path)
+
+
+def field_mask(errors):
+  # Input: A list of error dicts.
+  # Output: An int with the FIELD_BITS of every field that had an error.
+  mask = 0
+  for error in errors:
+    mask |= FIELD_BITS.get(field_name(str(error["error_field"])), FIELD_BITS["other"])
+  return mask
+
+
+def mask_fields(mask):
+  # Input: An error mask.
+  # Output: A list of the names of the fields set in it.
+  return [name for name, bit in FIELD_BITS.items() if mask & bit]
+
+
+class ErrorSummary:
+  # Counts of errors by field and code, and per file.  add() takes the
+  # errors of one or more dockets.  Summaries from different workers can be
+  # merged.
+
+  def __init__(self):
+    self.by_field = {}
+    self.by_file = {}
+
+  def __len__(self):
+    return sum(count for count, mask in self.by_file.values())
+
+  def add(self, errors):
+    for error in errors:
+      error_file = error.get("error_file", error.get("file"))
+      path = str(error["error_field"])
+      message = error.get("message", OTHER)
+      code = message if isinstance(message, str) else error_code(message)
+      key = (field_path(generic_path(path)), code)
+      self.by_field[key] = self.by_field.get(key, 0) + 1
+      count, mask = self.by_file.get(error_file, (0, 0))
+      bit = FIELD_BITS.get(field_name(path), FIELD_BITS["other"])
+      self.by_file[error_file] = (count + 1, mask | bit)
+    return self
+
+  def merge(self, other):
+    for key, count in other.by_field.items():
+      self.by_field[key] = self.by_field.get(key, 0) + count
+    for error_file, (count, mask) in other.by_file.items():
+      old_count, old_mask = self.by_file.get(error_file, (0, 0))
+      self.by_file[error_file] = (old_count + count, old_mask | mask)
+    return self
+
+  def field_rows(self):
+    # Output: A list of dicts with "error_field", "error_code" and "count",
+    #         most common first.
+    return [{"error_field": path, "error_code": code, "count": count}
+            for (path, code), count in sorted(self.by_field.items(),
+                                              key=lambda item: (-item[1], item[0]))]
+
+  def file_rows(self):
+    # Output: A list of dicts with "error_file", "error_count", "error_mask"
+    #         and the names of the "error_fields" in the mask.
+    return [{"error_file": error_file, "error_count": count, "error_mask": mask,
+             "error_fields": " ".join(mask_fields(mask))}
+            for error_file, (count, mask) in sorted(self.by_file.items(),
+                                                      key=lambda item: str(item[0]))]
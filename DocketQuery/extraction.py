@@ -0,0 +1,166 @@
+#  This file is the extraction engine behind the two ways of getting
+#  sentencing records out of a docket: saved_functions.conviction_information
+#  and scripts/guilty_records_query.py's Docket.get_guilty_sequence_records.
+#  Both call guilty_sentences() and only differ in what they make of its
+#  output: their field names, how they mark a missing value, and how they
+#  report sentence lengths.
+#
+#    for sequence, actions in guilty_sentences(docket_tree):
+#      sequence["sequence_description"]          # text, or None if missing
+#      for action, sentences in actions:
+#        action["judge_name"], action["date"]
+#        for sentence in sentences:
+#          sentence["program"], sentence["min_time"], sentence["min_unit"] ...
+#
+#  The guilty sequences are found with one compiled query.  Their fields are
+#  then read by walking each sequence's children once, instead of running a
+#  query per field, and sentence lengths are converted through a cache,
+#  since a corpus only has a few hundred distinct (time, unit) pairs.  A
+#  field's text is what the query "field/text()" would find first, so the
+#  values are the same as the per-field queries these replace; the tests in
+#  tests/test_extraction.py check that against copies of the old code.
+
+import datetime
+import re
+from fractions import Fraction
+from functools import lru_cache
+
+from lxml import etree
+
+
+def xpath_text(query):
+  return etree.XPath(query, smart_strings=False)
+
+DEFENDANT_NAME = xpath_text("/docket/header/caption/defendant/text()")
+DOCKET_NUMBER = xpath_text("/docket/header/docket_number/text()")
+BIRTH_DATE = xpath_text("/docket/section[@name='Defendant_Information']/defendant_information/birth_date/text()")
+DATE_INITIATED = xpath_text("/docket/section[@name='Case_Information']/case_info/date_initiated/text()")
+DATE_FILED = xpath_text("/docket/section[@name='Case_Information']/case_info/date_filed/text()")
+GUILTY_SEQUENCES = etree.XPath("//sequence[contains(./offense_disposition, 'Guilty') and (judge_action/sentence_info/length_of_sentence)]")
+
+HEADER_QUERIES = {"defendant_name": DEFENDANT_NAME,
+                  "docket_number": DOCKET_NUMBER,
+                  "birth_date": BIRTH_DATE,
+                  "date_initiated": DATE_INITIATED,
+                  "date_filed": DATE_FILED}
+SEQUENCE_FIELDS = ("sequence_description", "code_section", "grade", "offense_disposition")
+ACTION_FIELDS = ("judge_name", "date")
+# The fields of a sentence_info, by the path of child elements they are in.
+SENTENCE_FIELDS = {"program": "program",
+                   "length_of_sentence": {"min_length": {"time": "min_time", "unit": "min_unit"},
+                                          "max_length": {"time": "max_time", "unit": "max_unit"}}}
+SENTENCE_NAMES = ("program", "min_time", "min_unit", "max_time", "max_unit")
+
+YEAR = re.compile("year", flags=re.I)
+MONTH = re.compile("month", flags=re.I)
+
+
+def element_text(element):
+  # Input: An element.
+  # Output: Its first text node, as xpath("text()")[0] would find it, with
+  #         surrounding whitespace stripped, or None if it has no text.
+  #         Text after a child element (its tail) is a text node of the
+  #         element too.
+  if element.text:
+    return element.text.strip()
+  for child in element:
+    if child.tail:
+      return child.tail.strip()
+  return None
+
+
+def _root(node):
+  # xpath() on an ElementTree runs relative to its root element.
+  return node.getroot() if isinstance(node, etree._ElementTree) else node
+
+
+def header_text(docket_tree, name):
+  # Input: A docket and a name from HEADER_QUERIES.
+  # Output: The field's text, stripped, or None if the docket doesn't have it.
+  found = HEADER_QUERIES[name](docket_tree)
+  return found[0].strip() if found else None
+
+
+def _collect(element, fields, found):
+  for child in element:
+    field = fields.get(child.tag)
+    if field is None:
+      continue
+    if isinstance(field, dict):
+      _collect(child, field, found)
+    elif found[field] is None:
+      found[field] = element_text(child)
+
+
+def sentence_fields(sentence):
+  # Input: A sentence_info element.
+  # Output: A dict of the texts of SENTENCE_NAMES (None where missing).
+  found = dict.fromkeys(SENTENCE_NAMES)
+  _collect(_root(sentence), SENTENCE_FIELDS, found)
+  return found
+
+
+def action_fields(action):
+  # Input: A judge_action element.
+  # Output: A dict of the texts of ACTION_FIELDS (None where missing), and
+  #         a list of the sentence_fields of its sentences.
+  found = dict.fromkeys(ACTION_FIELDS)
+  sentences = []
+  for child in _root(action):
+    tag = child.tag
+    if tag == "sentence_info":
+      sentences.append(sentence_fields(child))
+    elif tag in found and found[tag] is None:
+      found[tag] = element_text(child)
+  return found, sentences
+
+
+def sequence_fields(sequence):
+  # Input: A sequence element.
+  # Output: A dict of the texts of SEQUENCE_FIELDS (None where missing), and
+  #         a list of (action fields, sentences) for each of its
+  #         judge_actions that has a sentence.
+  found = dict.fromkeys(SEQUENCE_FIELDS)
+  actions = []
+  for child in _root(sequence):
+    tag = child.tag
+    if tag == "judge_action":
+      action, sentences = action_fields(child)
+      if sentences:
+        actions.append((action, sentences))
+    elif tag in found and found[tag] is None:
+      found[tag] = element_text(child)
+  return found, actions
+
+
+def guilty_sentences(docket_tree):
+  # Input: A docket as an ElementTree.
+  # Output: A list of sequence_fields, one per sequence with a guilty
+  #         disposition and a sentence with a length, in docket order.
+  return [sequence_fields(sequence) for sequence in GUILTY_SEQUENCES(docket_tree)]
+
+
+@lru_cache(maxsize=4096)
+def day_count(period, unit):
+  # Input: A period of time as a number and the unit of that number, as in
+  #        ("7 1/2", "years").  Months are 30.42 days.
+  # Output: The number of days, as a float, or None if the unit isn't years
+  #         or months.  Raises ValueError if the period isn't numbers.
+  if YEAR.search(unit) is not None:
+    return sum([float(Fraction(quantity)) * 365 for quantity in period.split()])
+  if MONTH.search(unit) is not None:
+    return sum([float(Fraction(quantity)) * 30.42 for quantity in period.split()])
+  return None
+
+
+def sentence_days(time, unit):
+  # The length of a sentence in whole days, failing the way
+  # conviction_information reports it: IndexError if the time or unit is
+  # missing, AttributeError if the unit can't be read and ValueError if the
+  # time can't be.
+  if time is None or unit is None:
+    raise IndexError("list index out of range")
+  days = day_count(time.strip(), unit.strip())
+  if days is None:
+    raise AttributeError("cannot parse the unit {}".format(unit))
+  return datetime.timedelta(days=days).days
@@ -0,0 +1,176 @@
+#  This file links the dockets of the same defendant.  A DefendantIndex
+#  gives every result row a "defendant_id", the same for every docket of
+#  the same person, and keeps a linkage table of which dockets it put
+#  together and why.  Give one to scrape_files so it is built as the
+#  dockets are scraped (dockets the function returns no rows for are linked
+#  by their header, so they are in the table too):
+#
+#    index = DefendantIndex()
+#    errors, results, counts = scraper.scrape_directory(dir, workers=4, linkage=index)
+#    dicts2csv([], index.linkage_rows(), StringIO(), linkage_file)
+#
+#  Defendants are keyed by birth date and normalized name ("MCCRAY, Samuel
+#  Jr." and "Samuel Mccray" are both "mccray samuel").  Names that aren't
+#  an exact match are compared with difflib, but only against defendants in
+#  the same block, i.e. with the same birth date and the same first letter
+#  of one of their names, so each docket is compared with a handful of
+#  others and building the index stays close to linear in the number of
+#  dockets.  Dockets without a birth date are only linked to dockets with
+#  the same name and no birth date.
+
+import difflib
+import re
+from collections import defaultdict
+
+from DocketQuery.dates import to_date
+
+NAME_SUFFIXES = {"jr", "sr", "ii", "iii", "iv"}
+
+
+def normalize_name(name):
+  # Input: A defendant name, in any case, in either order, with or without
+  #        punctuation and suffixes.
+  # Output: Its lowercase name parts, without suffixes, sorted and joined
+  #         with spaces, or None if there are none.
+  if not isinstance(name, str):
+    return None
+  parts = [part for part in re.split(r"[^a-z]+", name.lower())
+           if part and part not in NAME_SUFFIXES]
+  if not parts or parts == ["unknown"]:
+    return None
+  return " ".join(sorted(parts))
+
+
+def block_keys(birth_date, name_key):
+  # Output: The blocks a defendant goes in: one per distinct initial of the
+  #         name parts, so a typo in one part still shares a block.
+  return {(birth_date, part[0]) for part in name_key.split(" ")}
+
+
+class DefendantIndex:
+  # Input: How similar (0 to 1, see difflib.SequenceMatcher.ratio) two
+  #        normalized names with the same birth date must be to be the same
+  #        defendant, and the names of the result fields to read.
+
+  def __init__(self, threshold=0.9, name_field="defendant_name",
+               birth_field="birth_date", docket_field="docket_number"):
+    self.threshold = threshold
+    self.name_field = name_field
+    self.birth_field = birth_field
+    self.docket_field = docket_field
+    self.exact = {}                   # (birth date, name key) -> defendant id
+    self.blocks = defaultdict(list)   # block key -> [(name key, defendant id)]
+    self.defendants = []              # Indexed by defendant id.
+    self.links = {}                   # docket number -> linkage row
+    self.comparisons = 0
+
+  def __len__(self):
+    return len(self.defendants)
+
+  def find(self, name_key, birth_date):
+    # Output: The id of the defendant this name and birth date belong to,
+    #         how they matched ("exact" or "fuzzy") and the name similarity,
+    #         or None if there is no such defendant.
+    defendant_id = self.exact.get((birth_date, name_key))
+    if defendant_id is not None:
+      return defendant_id, "exact", 1.0
+    if birth_date is None:
+      return None
+    best = None
+    seen = set()
+    matcher = difflib.SequenceMatcher(b=name_key, autojunk=False)
+    for block in block_keys(birth_date, name_key):
+      for other_key, other_id in self.blocks.get(block, ()):
+        if other_key in seen:
+          continue
+        seen.add(other_key)
+        self.comparisons += 1
+        matcher.set_seq1(other_key)
+        if matcher.real_quick_ratio() < self.threshold or matcher.quick_ratio() < self.threshold:
+          continue
+        score = matcher.ratio()
+        if score >= self.threshold and (best is None or score > best[2]):
+          best = (other_id, "fuzzy", score)
+    return best
+
+  def link(self, name, birth_date):
+    # Input: A defendant name and birth date (a string or datetime.date).
+    # Output: The defendant's id, how they matched ("exact", "fuzzy" or
+    #         "new") and the name similarity.
+    name_key = normalize_name(name)
+    birth_date = to_date(birth_date)
+    if name_key is None:
+      defendant_id = self.new_defendant(name, birth_date)
+      return defendant_id, "new", None
+    match = self.find(name_key, birth_date)
+    if match is None:
+      defendant_id = self.new_defendant(name, birth_date)
+      match = (defendant_id, "new", None)
+    defendant_id = match[0]
+    if (birth_date, name_key) not in self.exact:
+      self.exact[(birth_date, name_key)] = defendant_id
+      if birth_date is not None:
+        for block in block_keys(birth_date, name_key):
+          self.blocks[block].append((name_key, defendant_id))
+    return match
+
+  def new_defendant(self, name, birth_date):
+    defendant_id = len(self.defendants)
+    self.defendants.append({"defendant_id": defendant_id, "defendant_name": name,
+                            "birth_date": birth_date, "dockets": 0})
+    return defendant_id
+
+  def add(self, row, file_name=None):
+    # Input: A result dict with a name, birth date and docket number, and
+    #        the name of the file it came from.
+    # Output: The same dict with its "defendant_id".  Every row of a docket
+    #         gets the id its first row was linked to.  Dockets without a
+    #         number are told apart by their file name (and listed under it
+    #         in linkage_rows); without one, each such row is linked again.
+    docket_number = row.get(self.docket_field)
+    if docket_number in (None, "unknown"):
+      key = None if file_name is None else str(file_name)
+    else:
+      key = docket_number
+    link = self.links.get(key) if key is not None else None
+    if link is None:
+      defendant_id, match, score = self.link(row.get(self.name_field),
+                                             row.get(self.birth_field))
+      link = {"docket_number": key if key is not None else docket_number,
+              "defendant_id": defendant_id,
+              "defendant_name": row.get(self.name_field),
+              "birth_date": to_date(row.get(self.birth_field)),
+              "match": match, "score": score}
+      self.defendants[defendant_id]["dockets"] += 1
+      if key is not None:
+        self.links[key] = link
+    row["defendant_id"] = link["defendant_id"]
+    return row
+
+  def add_docket(self, header, file_name=None):
+    # Input: A docket's number, name and birth date, as the result of
+    #        saved_functions.docket_num_name_age, and its file name.  For
+    #        dockets that have no result rows to link.
+    # Output: The docket's defendant id.
+    row = {self.docket_field: header.get("docket_number"),
+           self.name_field: header.get("defendant_name"),
+           self.birth_field: header.get("birth_date")}
+    return self.add(row, file_name)["defendant_id"]
+
+  def add_all(self, rows, file_name=None):
+    # Input: Result dicts, and the name of the file they came from if they
+    #        are all from one docket.
+    for row in rows:
+      self.add(row, file_name)
+    return rows
+
+  def linkage_rows(self):
+    # Output: One row per docket: its number, the defendant id, the name and
+    #         birth date on the docket, and how it was linked.
+    return sorted(self.links.values(), key=lambda link: (link["defendant_id"],
+                                                         link["docket_number"]))
+
+  def defendant_rows(self):
+    # Output: One row per defendant: the id, the name and birth date it was
+    #         first seen with, and its number of dockets.
+    return list(self.defendants)
@@ -0,0 +1,118 @@
+#  This file measures the memory a saved function (or any function of one
+#  docket) uses over a corpus, for the memory regression tests in
+#  tests/test_memory.py and for benchmarks/bench_memory.py.
+#
+#  profile() runs a function over a list of dockets under tracemalloc and
+#  reports the bytes still allocated afterwards (per docket, with or without
+#  keeping the outputs), the peak, the change in resident memory, and the
+#  lines that allocated the most retained memory.  lxml trees live in
+#  libxml2's memory, which tracemalloc can't see, so outputs are also
+#  searched for values that keep a tree alive (see retaining_values).
+
+import gc
+import os
+import tracemalloc
+
+from lxml import etree
+
+# Values that keep a whole parsed docket in memory: elements and trees,
+# lxml's "smart" strings (which point back to their element), and exceptions
+# (whose tracebacks hold the frames, and so the trees, they were raised in).
+RETAINING_TYPES = (etree._Element, etree._ElementTree, etree._ElementUnicodeResult,
+                   BaseException)
+
+
+def rss_bytes():
+  # Output: The resident memory of this process in bytes, or None where
+  #         /proc isn't available.
+  try:
+    with open("/proc/self/statm") as f:
+      return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+  except (OSError, ValueError, AttributeError):
+    return None
+
+
+def retaining_values(value, path="output", found=None, limit=10):
+  # Input: A function's output (nested lists, tuples and dicts).
+  # Output: A list of (path, type name) for the values in it that keep a
+  #         tree alive, e.g. ("output[0][2]['message']", "XPathEvalError").
+  if found is None:
+    found = []
+  if len(found) >= limit:
+    return found
+  if isinstance(value, RETAINING_TYPES):
+    found.append((path, type(value).__name__))
+  elif isinstance(value, dict):
+    for key, item in value.items():
+      retaining_values(item, "{}[{!r}]".format(path, key), found, limit)
+  elif isinstance(value, (list, tuple)):
+    for i, item in enumerate(value):
+      retaining_values(item, "{}[{}]".format(path, i), found, limit)
+  return found
+
+
+def top_sites(snapshot, baseline, count=10):
+  # Output: The `count` lines that allocated the most memory still held in
+  #         snapshot but not in baseline, formatted like
+  #         "DocketQuery/saved_functions.py:128: +12.5 KiB (210 blocks)".
+  # The profiler's own allocations aren't interesting.
+  ignore = [tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__)]
+  snapshot = snapshot.filter_traces(ignore)
+  baseline = baseline.filter_traces(ignore)
+  sites = []
+  for stat in snapshot.compare_to(baseline, "lineno")[:count]:
+    if stat.size_diff <= 0:
+      continue
+    frame = stat.traceback[0]
+    sites.append("{}:{}: {:+.1f} KiB ({:+d} blocks)".format(
+      frame.filename, frame.lineno, stat.size_diff / 1024, stat.count_diff))
+  return sites
+
+
+def profile(function, items, keep=True, top=10):
+  # Input: A function of one item, the items (docket paths, usually), whether
+  #        to keep the outputs (as a caller collecting results would), and
+  #        how many allocation sites to report.
+  # Output: A dict with the number of "items", the "retained_bytes" still
+  #         allocated after the run (and "retained_per_item"), the
+  #         "peak_bytes" allocated at once, the change in resident memory
+  #         ("rss_bytes", None if unknown), the "top_sites" of retained
+  #         memory, and the "retaining" values found in the outputs.
+  outputs = []
+  gc.collect()
+  rss_before = rss_bytes()
+  tracemalloc.start()
+  try:
+    baseline = tracemalloc.take_snapshot()
+    start = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    for item in items:
+      output = function(item)
+      if keep:
+        outputs.append(output)
+      del output
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+  finally:
+    tracemalloc.stop()
+  rss_after = rss_bytes()
+  retained = current - start
+  return {"items": len(items),
+          "retained_bytes": retained,
+          "retained_per_item": retained / len(items) if items else 0.0,
+          "peak_bytes": peak - start,
+          "rss_bytes": rss_after - rss_before if rss_before is not None else None,
+          "top_sites": top_sites(snapshot, baseline, top),
+          "retaining": retaining_values(outputs)}
+
+
+def report(name, result):
+  # Output: A few lines describing a profile() result.
+  lines = ["{}: {} dockets, {:.0f} bytes/docket retained, peak {:.1f} KiB{}".format(
+    name, result["items"], result["retained_per_item"], result["peak_bytes"] / 1024,
+    "" if result["rss_bytes"] is None else ", rss {:+.1f} KiB".format(result["rss_bytes"] / 1024))]
+  lines += ["  retains a tree: {} ({})".format(path, kind) for path, kind in result["retaining"]]
+  lines += ["  " + site for site in result["top_sites"]]
+  return "\n".join(lines)
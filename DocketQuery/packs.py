@@ -0,0 +1,181 @@
+#  This file converts a corpus of parsed dockets into pack files, once, so
+#  repeat scrapes don't pay for reading and parsing thousands of small,
+#  indented xml files again.  Each docket is stored in a pack as compact xml
+#  (no indentation, and optionally only the sections saved functions read),
+#  length-prefixed, and an index records the pack, offset and length of each
+#  docket under its original path:
+#
+#    <pack directory>/pack-00000.dqp, pack-00001.dqp ...
+#    <pack directory>/index.json
+#
+#    convert_corpus(list_dockets(dir), "packs/", sections=SAVED_FUNCTION_SECTIONS)
+#    errors, results, counts = scraper.scrape_pack("packs/", workers=4)
+#
+#  Dockets are still handed to saved functions as lxml trees, so every saved
+#  function works unchanged, with the same errors and results as scraping
+#  the xml files (errors name the original path).  A pack can be extended
+#  with new dockets later; dockets already in it are skipped.
+#
+#  Parsing compact xml with lxml is faster than rebuilding a tree from
+#  msgpack or marshal records in Python, which is why the payload is xml.
+
+import json
+import os
+import struct
+import threading
+from collections import namedtuple
+from io import BytesIO
+
+from lxml import etree
+
+from DocketQuery.docket_query import parse_docket
+
+PACK_MAGIC = b"DQPACK1\n"
+INDEX_NAME = "index.json"
+LENGTH = struct.Struct("<I")
+# The sections read by the saved functions in saved_functions.py.  The
+# header is always kept.
+SAVED_FUNCTION_SECTIONS = ("Case_Information", "Defendant_Information",
+                           "Disposition_Sentencing_Penalties")
+
+_parsers = threading.local()
+_pack_files = {}
+_pack_files_lock = threading.Lock()
+
+
+def compact_docket(path, sections=None):
+  # Input: A path to a parsed docket, and optionally the names of the
+  #        <section>s to keep (all of them if None).
+  # Output: The docket as compact xml bytes.
+  root = parse_docket(path).getroot()
+  if sections is not None:
+    for section in root.findall("section"):
+      if section.get("name") not in sections:
+        root.remove(section)
+  return etree.tostring(root, encoding="utf-8")
+
+
+def _read_at(path, offset, length):
+  # Read from a pack without moving a shared file position, so threads and
+  # forked workers can read the same pack at once.  Files are kept open,
+  # once per process.
+  key = (os.getpid(), path)
+  with _pack_files_lock:
+    f = _pack_files.get(key)
+    if f is None:
+      f = _pack_files[key] = open(path, "rb")
+  if hasattr(os, "pread"):
+    return os.pread(f.fileno(), length, offset)
+  with _pack_files_lock:
+    f.seek(offset)
+    return f.read(length)
+
+
+def close_packs():
+  # Close the pack files this process has open.  Packs are never changed
+  # once written, but one that is deleted and written again must be
+  # reopened.
+  with _pack_files_lock:
+    for f in _pack_files.values():
+      f.close()
+    _pack_files.clear()
+
+
+class PackedDocket(namedtuple("PackedDocket", "name pack offset length")):
+  # A docket in a pack: its original path, the path of its pack file, and
+  # where its xml is in the pack.  Small, so it is cheap to send to workers.
+
+  def read(self):
+    return _read_at(self.pack, self.offset, self.length)
+
+  def tree(self):
+    # Output: The docket as an lxml ElementTree, like parse_docket's.
+    parser = getattr(_parsers, "parser", None)
+    if parser is None:
+      parser = _parsers.parser = etree.XMLParser(remove_blank_text=True)
+    return etree.fromstring(self.read(), parser).getroottree()
+
+  def stream(self):
+    # Output: The docket's xml as a file object, for parser targets.
+    return BytesIO(self.read())
+
+
+class PackIndex:
+  # Input: A pack directory, the list of pack file names in it, and a list
+  #        of [name, pack number, offset, length] entries, one per docket,
+  #        in the order they were packed.
+
+  def __init__(self, directory, packs=(), entries=(), sections=None):
+    self.directory = directory
+    self.packs = list(packs)
+    self.entries = [list(entry) for entry in entries]
+    self.sections = sections
+    self.names = {entry[0] for entry in self.entries}
+
+  @classmethod
+  def load(cls, directory):
+    with open(os.path.join(directory, INDEX_NAME)) as f:
+      index = json.load(f)
+    return cls(directory, index["packs"], index["dockets"], index["sections"])
+
+  def save(self):
+    temporary = os.path.join(self.directory, INDEX_NAME + ".tmp")
+    with open(temporary, "w") as f:
+      json.dump({"packs": self.packs, "sections": self.sections,
+                 "dockets": self.entries}, f)
+    os.replace(temporary, os.path.join(self.directory, INDEX_NAME))
+
+  def __len__(self):
+    return len(self.entries)
+
+  def dockets(self):
+    # Output: A list of PackedDockets, in the order they were packed.
+    return [PackedDocket(name, os.path.join(self.directory, self.packs[pack]), offset, length)
+            for name, pack, offset, length in self.entries]
+
+
+def convert_corpus(files, directory, sections=None, pack_size=256 << 20):
+  # Input: An iterable of paths to parsed dockets, the directory to pack
+  #        them into, optionally the sections to keep (see compact_docket;
+  #        SAVED_FUNCTION_SECTIONS is enough for saved_functions.py), and
+  #        the size in bytes at which to start a new pack file.
+  # Output: The PackIndex, which is also saved in the directory.  If the
+  #         directory already has packs, new dockets are added to a new
+  #         pack file and dockets already packed are skipped.  Dockets that
+  #         can't be parsed are skipped.
+  if not os.path.exists(directory):
+    os.makedirs(directory)
+  if os.path.exists(os.path.join(directory, INDEX_NAME)):
+    index = PackIndex.load(directory)
+    if index.sections != (list(sections) if sections is not None else None):
+      raise ValueError("{} was packed with sections {}.".format(directory, index.sections))
+  else:
+    index = PackIndex(directory, sections=list(sections) if sections is not None else None)
+  pack = None
+  try:
+    for path in files:
+      if path in index.names:
+        continue
+      try:
+        payload = compact_docket(path, sections)
+      except (etree.XMLSyntaxError, OSError) as e:
+        print("Error while packing {}.".format(path))
+        print(e)
+        continue
+      if pack is None or pack.tell() >= pack_size:
+        if pack is not None:
+          pack.close()
+        name = "pack-{:05d}.dqp".format(len(index.packs))
+        close_packs()
+        pack = open(os.path.join(directory, name), "wb")
+        pack.write(PACK_MAGIC)
+        index.packs.append(name)
+      pack.write(LENGTH.pack(len(payload)))
+      index.entries.append([path, len(index.packs) - 1, pack.tell(), len(payload)])
+      index.names.add(path)
+      pack.write(payload)
+  finally:
+    if pack is not None:
+      pack.close()
+  index.save()
+  return index
@@ -0,0 +1,119 @@
+#  This file lays out a corpus of parsed dockets by court, county and year,
+#  which are read from each docket's number (CP-51-CR-0000001-2011 is court
+#  CP, county 51, year 2011):
+#
+#    <root>/court=CP/county=51/year=2011/CP-51-CR-0000001-2011_stitched_complete.xml
+#
+#  A Catalog lists the partitions with their file counts and sizes, so a
+#  query can pick the partitions it needs without listing or opening the
+#  files in any other partition:
+#
+#    catalog = Catalog.load(root)
+#    scraper.scrape_partitions(catalog, where={"county": "51", "year": ["2011", "2012"]})
+#
+#  Dockets whose number can't be read go in court=unknown/county=unknown/year=unknown.
+
+import glob
+import json
+import os
+import shutil
+
+from DocketQuery.docket_query import docket_number_from_path, docket_number_parts
+
+PARTITION_KEYS = ("court", "county", "year")
+CATALOG_NAME = "catalog.json"
+
+
+def partition_of(path):
+  # Input: A path to a docket named with its docket number.
+  # Output: A dict of the docket's court, county and year.
+  parts = docket_number_parts(docket_number_from_path(path))
+  return {key: parts[key] for key in PARTITION_KEYS}
+
+
+def partition_path(partition):
+  # Input: A partition dict.
+  # Output: Its directory, relative to the corpus root.
+  return os.path.join(*["{}={}".format(key, partition[key]) for key in PARTITION_KEYS])
+
+
+def partition_corpus(files, root, move=False):
+  # Input: An iterable of docket paths, the root directory of the
+  #        partitioned corpus, and whether to move the files (rather than
+  #        copy them).
+  # Output: A Catalog of the root, which is also saved in it.
+  for path in files:
+    directory = os.path.join(root, partition_path(partition_of(path)))
+    if not os.path.exists(directory):
+      os.makedirs(directory)
+    destination = os.path.join(directory, os.path.basename(path))
+    if move:
+      shutil.move(path, destination)
+    else:
+      shutil.copy2(path, destination)
+  catalog = Catalog.build(root)
+  catalog.save()
+  return catalog
+
+
+def matches(partition, where):
+  # Input: A partition dict, and either None (everything matches), a
+  #        function of a partition dict, or a dict of key -> value or list of
+  #        values, e.g. {"county": "51", "year": ["2011", "2012"]}.
+  # Output: True if the partition matches.
+  if where is None:
+    return True
+  if callable(where):
+    return where(partition)
+  for key, wanted in where.items():
+    wanted = [wanted] if isinstance(wanted, (str, int)) else wanted
+    if partition[key] not in [str(value) for value in wanted]:
+      return False
+  return True
+
+
+class Catalog:
+  # Input: The root directory of a partitioned corpus and a list of
+  #        partition dicts, each with the PARTITION_KEYS, its "path"
+  #        (relative to root), and the number of "files" and "bytes" in it.
+
+  def __init__(self, root, partitions):
+    self.root = root
+    self.partitions = partitions
+
+  @classmethod
+  def build(cls, root):
+    # Scan the partition directories under root (the directories only, and
+    # the files in the partitions, but nothing else).
+    partitions = []
+    pattern = os.path.join(root, *["{}=*".format(key) for key in PARTITION_KEYS])
+    for directory in sorted(glob.glob(pattern)):
+      if not os.path.isdir(directory):
+        continue
+      relative = os.path.relpath(directory, root)
+      partition = dict(part.split("=", 1) for part in relative.split(os.sep))
+      files = glob.glob(os.path.join(directory, "*.xml"))
+      partition.update({"path": relative, "files": len(files),
+                        "bytes": sum(os.path.getsize(path) for path in files)})
+      partitions.append(partition)
+    return cls(root, partitions)
+
+  @classmethod
+  def load(cls, root):
+    with open(os.path.join(root, CATALOG_NAME)) as f:
+      return cls(root, json.load(f)["partitions"])
+
+  def save(self):
+    with open(os.path.join(self.root, CATALOG_NAME), "w") as f:
+      json.dump({"keys": list(PARTITION_KEYS), "partitions": self.partitions}, f, indent=1)
+
+  def select(self, where=None):
+    # Output: The partitions matching `where` (see matches()).
+    return [partition for partition in self.partitions if matches(partition, where)]
+
+  def files(self, where=None):
+    # Output: A list of the docket paths in the matching partitions.
+    files = []
+    for partition in self.select(where):
+      files += sorted(glob.glob(os.path.join(self.root, partition["path"], "*.xml")))
+    return files
@@ -0,0 +1,330 @@
+#  This file runs a job described by a pipeline spec (the "pipeline" section
+#  of a query_script.py yaml file) in one pass over a corpus.  Each docket
+#  is parsed once, and every stage's saved function runs on that tree, so
+#  several analyses cost one read of the corpus:
+#
+#    pipeline:
+#      input: {directory: dockets/}          # or files: <glob>, pack: <dir>,
+#                                            # or partitions: <root>
+#      filters: {county: "51", year: [2011, 2012]}   # by docket number
+#      workers: 4
+#      batch_size: 100                       # dockets per worker chunk
+#      schedule: size                        # optional, see scheduling.py
+#      counts: out/counts.csv
+#      stages:
+#        - name: convictions
+#          function: conviction_information
+#          transforms: [normalize_dates]
+#          where: {grade: [F1, F2]}          # keep only these rows
+#          results: out/convictions.csv
+#          errors: out/conviction_errors.csv
+#          aggregations:
+#            - by: [judge_name]
+#              values: [max_time]
+#              output: out/max_time_by_judge.csv
+#        - name: people
+#          function: docket_num_name_age
+#          results: out/people.csv
+#        - name: texts
+#          function: sentence_texts
+#          text_index: out/texts.sqlite      # see text_index.py
+#
+#  Functions are looked up in saved_functions.py and transforms in dates.py,
+#  unless given as "module.name".  Results and errors are written as each
+#  chunk of dockets comes back, so memory doesn't grow with the corpus;
+#  aggregations are filled in by the workers and merged.  A stage with a
+#  text_index adds its rows (which must have text_index.ROW_FIELDS, as
+#  sentence_texts' do) to that index as they come, so the free text is
+#  indexed in the same pass instead of by a second read with
+#  TextIndex.add_files.
+
+import csv
+import importlib
+import os
+
+from DocketQuery.docket_query import AskADocket, parse_docket, list_dockets, \
+                                     map_chunks, chunk_files, \
+                                     docket_number_from_path, docket_number_parts
+
+PIPELINE_KEYS = {"input", "filters", "workers", "batch_size", "schedule", "counts", "stages"}
+STAGE_KEYS = {"name", "function", "transforms", "where", "results", "errors", "aggregations",
+              "text_index"}
+AGGREGATION_KEYS = {"by", "values", "quantiles", "output"}
+
+
+def resolve(name, default_module):
+  # Input: A function name, either "module.name" or a name in default_module.
+  # Output: The function.  Raises ValueError if there is no such function.
+  module_name, _, attribute = name.rpartition(".")
+  try:
+    module = importlib.import_module(module_name or default_module)
+    return getattr(module, attribute)
+  except (ImportError, AttributeError):
+    raise ValueError("Unknown function {}.".format(name))
+
+
+def check_keys(spec, allowed, what):
+  unknown = set(spec) - allowed
+  if unknown:
+    raise ValueError("Unknown {} keys: {}.".format(what, ", ".join(sorted(unknown))))
+
+
+def row_matches(row, where):
+  # Input: A result dict, and None or a dict of field -> value or list of
+  #        values.  Values are compared as strings, so 2011 matches "2011".
+  # Output: True if the row matches.
+  if not where:
+    return True
+  for field, wanted in where.items():
+    wanted = wanted if isinstance(wanted, list) else [wanted]
+    if str(row.get(field)) not in [str(value) for value in wanted]:
+      return False
+  return True
+
+
+def input_dockets(spec):
+  # Input: The "input" section of a pipeline spec.
+  # Output: A list of dockets (paths, or packs.PackedDockets).
+  check_keys(spec, {"directory", "files", "pack", "partitions", "where", "dedup"}, "input")
+  if "directory" in spec:
+    files = sorted(list_dockets(os.path.join(spec["directory"], "")))
+  elif "files" in spec:
+    import glob
+    files = sorted(glob.glob(spec["files"]))
+  elif "pack" in spec:
+    from DocketQuery.packs import PackIndex
+    return PackIndex.load(spec["pack"]).dockets()
+  elif "partitions" in spec:
+    from DocketQuery.partitions import Catalog
+    files = Catalog.load(spec["partitions"]).files(spec.get("where"))
+  else:
+    raise ValueError("The input needs a directory, files, pack or partitions.")
+  if spec.get("dedup"):
+    from DocketQuery.dedup import latest_versions
+    files = latest_versions(files)[0]
+  return files
+
+
+class CsvOutput:
+  # Writes rows to a csv file as they come, in dicts2csv's format.  The
+  # header is the fields of the first row; a file that gets no rows gets
+  # dicts2csv's placeholder header.  As with dicts2csv, a later row with a
+  # field that isn't in the header raises ValueError.
+
+  def __init__(self, path, empty_header):
+    self.path = path
+    self.empty_header = empty_header
+    self.file = None
+    self.writer = None
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+      os.makedirs(directory)
+
+  def open(self, fieldnames):
+    self.file = open(self.path, "w", newline="")
+    self.writer = csv.DictWriter(self.file, delimiter=',', quotechar='|',
+                                 fieldnames=fieldnames)
+    self.writer.writeheader()
+
+  def write(self, rows):
+    if not rows:
+      return
+    if self.writer is None:
+      self.open(list(rows[0].keys()))
+    self.writer.writerows(rows)
+
+  def close(self):
+    if self.writer is None:
+      self.open([self.empty_header])
+    self.file.close()
+
+
+class Stage:
+  # One saved function of a pipeline, with the transforms and row filter
+  # applied to its results, and what to do with them: write them, write its
+  # errors, fill in aggregations, and add them to a text_index.TextIndex.
+
+  def __init__(self, name, scraper, where=None, results=None, errors=None, aggregations=(),
+               text_index=None):
+    self.name = name
+    self.scraper = scraper
+    self.where = where
+    self.results = results
+    self.errors = errors
+    self.aggregations = list(aggregations)   # (aggregation.Aggregator, path)
+    self.text_index = text_index
+
+  @classmethod
+  def from_spec(cls, spec):
+    check_keys(spec, STAGE_KEYS, "stage")
+    if "function" not in spec:
+      raise ValueError("Every stage needs a function.")
+    from DocketQuery.aggregation import Aggregator
+    function = resolve(spec["function"], "DocketQuery.saved_functions")
+    transforms = [resolve(name, "DocketQuery.dates") for name in spec.get("transforms", [])]
+    aggregations = []
+    for aggregation in spec.get("aggregations", []):
+      check_keys(aggregation, AGGREGATION_KEYS, "aggregation")
+      aggregator = Aggregator(aggregation.get("by", []), aggregation.get("values", []),
+                              aggregation.get("quantiles", (0.5, 0.9)))
+      aggregations.append((aggregator, aggregation["output"]))
+    return cls(spec.get("name", spec["function"]), AskADocket(function, transforms),
+               spec.get("where"), spec.get("results"), spec.get("errors"), aggregations,
+               spec.get("text_index"))
+
+  def job(self):
+    # Output: What a worker needs to run this stage on a chunk: the scraper,
+    #         the row filter, whether to send rows back, the aggregators
+    #         to fill in copies of, and whether to send rows back by file
+    #         for the text index.
+    return (self.scraper, self.where, self.results is not None,
+            [aggregator.empty() for aggregator, path in self.aggregations],
+            self.text_index is not None)
+
+
+def run_chunk(job):
+  # Input: A tuple of the stages' jobs (see Stage.job) and a list of
+  #        dockets.  (One argument, so it can be mapped over a Pool.)
+  # Output: For each stage, its errors, rows (if they are written), filled
+  #         in aggregators and, for a text index, a list of (file,
+  #         signature, rows) as text_index.index_chunk makes them; and the
+  #         counts for the chunk, with the dockets each stage scraped
+  #         successfully.  A stage that fails on a docket only loses that
+  #         docket for itself, as it would in a scrape of its own.
+  from DocketQuery.text_index import file_signature
+  stage_jobs, files = job
+  # Each chunk fills in its own aggregators, even when jobs share one
+  # stage_jobs tuple in this process.
+  outcomes = [([], [], [aggregator.empty() for aggregator in aggregators], [])
+              for scraper, where, keep_rows, aggregators, index_rows in stage_jobs]
+  rows = [0] * len(stage_jobs)
+  stage_successes = [0] * len(stage_jobs)
+  successes = 0
+  for file in files:
+    try:
+      if hasattr(file, "tree"):
+        tree, file_name = file.tree(), file.name
+      else:
+        tree, file_name = parse_docket(file), file
+    except Exception as e:
+      print("Error while parsing {}.".format(file))
+      print(e)
+      continue
+    successes += 1
+    for i, (scraper, where, keep_rows, _, index_rows) in enumerate(stage_jobs):
+      try:
+        file_errors, results = scraper.scrape_tree(tree, file_name)
+      except Exception as e:
+        print("Error while parsing {}.".format(file))
+        print(e)
+        continue
+      stage_successes[i] += 1
+      results = [result for result in results if row_matches(result, where)]
+      outcomes[i][0].extend(file_errors)
+      if keep_rows:
+        outcomes[i][1].extend(results)
+      for aggregator in outcomes[i][2]:
+        aggregator.add_all(results)
+      if index_rows:
+        outcomes[i][3].append((file_name, file_signature(file_name), results))
+      rows[i] += len(results)
+  return outcomes, {"total_dockets_scraped": len(files), "successes": successes,
+                    "rows": rows, "stage_successes": stage_successes}
+
+
+class Pipeline:
+  # Input: A list of dockets, the stages, the number of worker processes,
+  #        the number of dockets each worker takes at a time, how to schedule
+  #        chunks (see docket_query.chunk_files), and optionally a path for
+  #        the run's counts.
+
+  def __init__(self, dockets, stages, workers=1, batch_size=100, schedule=None,
+               counts=None):
+    self.dockets = dockets
+    self.stages = stages
+    self.workers = workers
+    self.batch_size = batch_size
+    self.schedule = schedule
+    self.counts = counts
+
+  @classmethod
+  def from_spec(cls, spec):
+    # Input: A pipeline spec, as loaded from yaml (see the top of this file).
+    check_keys(spec, PIPELINE_KEYS, "pipeline")
+    if not spec.get("stages"):
+      raise ValueError("A pipeline needs at least one stage.")
+    dockets = input_dockets(spec.get("input", {}))
+    filters = spec.get("filters")
+    if filters:
+      from DocketQuery.partitions import matches
+      dockets = [docket for docket in dockets
+                 if matches(docket_number_parts(docket_number_from_path(getattr(docket, "name", docket))),
+                            filters)]
+    stages = [Stage.from_spec(stage) for stage in spec["stages"]]
+    names = [stage.name for stage in stages]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+      # Stage names key the counts, so they must be unique.
+      raise ValueError("Duplicate stage names: {}.".format(", ".join(duplicates)))
+    return cls(dockets, stages,
+               spec.get("workers", 1), spec.get("batch_size", 100),
+               spec.get("schedule"), spec.get("counts"))
+
+  def run(self, progress=None):
+    # Input: Optionally a progress.Progress to report to.
+    # Output: The counts: dockets scraped, dockets parsed ("successes"), and
+    #         the successes, rows and errors of each stage.  Outputs (and
+    #         text indexes) are written as chunks finish.
+    stage_jobs = tuple(stage.job() for stage in self.stages)
+    jobs = [(stage_jobs, chunk)
+            for chunk in chunk_files(self.dockets, self.workers, self.batch_size, self.schedule)]
+    results = [CsvOutput(stage.results, "No results reported") if stage.results else None
+               for stage in self.stages]
+    errors = [CsvOutput(stage.errors, "No errors reported") if stage.errors else None
+              for stage in self.stages]
+    from DocketQuery.text_index import TextIndex
+    indexes = [TextIndex(stage.text_index) if stage.text_index else None
+               for stage in self.stages]
+    counts = {"total_dockets_scraped": 0, "successes": 0}
+    for stage in self.stages:
+      counts[stage.name + "_successes"] = 0
+      counts[stage.name + "_rows"] = 0
+      counts[stage.name + "_errors"] = 0
+    if progress is not None:
+      progress.start(len(self.dockets))
+    try:
+      for outcomes, chunk_counts in map_chunks(run_chunk, jobs, self.workers):
+        chunk_errors = 0
+        for i, (stage, (stage_errors, rows, partials, scraped)) in enumerate(zip(self.stages, outcomes)):
+          if results[i] is not None:
+            results[i].write(rows)
+          if indexes[i] is not None:
+            indexes[i].add(scraped)
+          if errors[i] is not None:
+            errors[i].write(stage_errors)
+          for (aggregator, path), partial in zip(stage.aggregations, partials):
+            aggregator.merge(partial)
+          counts[stage.name + "_successes"] += chunk_counts["stage_successes"][i]
+          counts[stage.name + "_rows"] += chunk_counts["rows"][i]
+          counts[stage.name + "_errors"] += len(stage_errors)
+          chunk_errors += len(stage_errors)
+        counts["total_dockets_scraped"] += chunk_counts["total_dockets_scraped"]
+        counts["successes"] += chunk_counts["successes"]
+        if progress is not None:
+          progress.update(chunk_counts, rows=sum(chunk_counts["rows"]), errors=chunk_errors)
+    finally:
+      for output in results + errors + indexes:
+        if output is not None:
+          output.close()
+    for stage in self.stages:
+      for aggregator, path in stage.aggregations:
+        output = CsvOutput(path, "No results reported")
+        output.write(aggregator.rows())
+        output.close()
+    if self.counts:
+      output = CsvOutput(self.counts, "No counts")
+      output.write([counts])
+      output.close()
+    if progress is not None:
+      progress.finish()
+    return counts
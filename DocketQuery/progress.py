@@ -0,0 +1,142 @@
+#  This file reports the progress of long scrapes.  A Progress is handed to
+#  AskADocket.scrape_files (or scrape_directory, aggregate_files ...) and is
+#  updated with the counts of each chunk of dockets as it finishes, whether
+#  the chunk ran in this process or in a worker.  Every `interval` seconds it
+#  prints a line like
+#
+#    1200/48000 dockets (2.5%), 95.3 dockets/s, 310.2 rows/s, 0.2% failed, ETA 8m32s
+#
+#  and optionally rewrites a Prometheus text-format file and/or appends a
+#  json line with the same metrics, for dashboards.
+
+import json
+import os
+import sys
+import time
+
+METRICS = [
+  ("files_total", "gauge", "Dockets to scrape in this run."),
+  ("files_done", "counter", "Dockets scraped so far."),
+  ("failures", "counter", "Dockets that could not be scraped."),
+  ("rows", "counter", "Result rows produced."),
+  ("errors", "counter", "Field errors reported by the saved function."),
+  ("elapsed_seconds", "gauge", "Seconds since the run started."),
+  ("dockets_per_second", "gauge", "Average dockets scraped per second."),
+  ("rows_per_second", "gauge", "Average result rows per second."),
+  ("error_rate", "gauge", "Share of scraped dockets that failed."),
+  ("eta_seconds", "gauge", "Estimated seconds until the run is done."),
+]
+
+
+def format_seconds(seconds):
+  if seconds is None:
+    return "unknown"
+  minutes, seconds = divmod(int(seconds), 60)
+  hours, minutes = divmod(minutes, 60)
+  if hours:
+    return "{}h{:02d}m".format(hours, minutes)
+  return "{}m{:02d}s".format(minutes, seconds)
+
+
+class Progress:
+  # Input: How often to report, in seconds, a stream to print to (None for
+  #        no printing), an optional path for a Prometheus text-format file,
+  #        an optional path for a json lines file, a prefix for the
+  #        Prometheus metric names, and a clock (for testing).
+
+  def __init__(self, interval=10, stream=sys.stdout, prometheus_file=None,
+               jsonl_file=None, prefix="docketquery", clock=time.monotonic):
+    self.interval = interval
+    self.stream = stream
+    self.prometheus_file = prometheus_file
+    self.jsonl_file = jsonl_file
+    self.prefix = prefix
+    self.clock = clock
+    self.total = 0
+    self.done = 0
+    self.failures = 0
+    self.rows = 0
+    self.errors = 0
+    self.started = None
+    self.last_report = None
+
+  def start(self, total):
+    # Input: The number of dockets in the run, or None if it isn't known
+    #        (as when they are streamed from an iterator).
+    self.total = total
+    self.started = self.last_report = self.clock()
+
+  def update(self, counts, rows=0, errors=0):
+    # Input: The counts of a chunk of dockets (with "total_dockets_scraped"
+    #        and "successes"), and how many rows and errors it produced.
+    self.done += counts["total_dockets_scraped"]
+    self.failures += counts["total_dockets_scraped"] - counts["successes"]
+    self.rows += rows
+    self.errors += errors
+    if self.clock() - self.last_report >= self.interval:
+      self.report()
+
+  def finish(self):
+    self.report()
+
+  def snapshot(self):
+    # Output: A dict of the current metrics (see METRICS).
+    elapsed = self.clock() - self.started if self.started is not None else 0.0
+    dockets_per_second = self.done / elapsed if elapsed > 0 else 0.0
+    remaining = None if self.total is None else self.total - self.done
+    if remaining is None:
+      eta = None
+    elif remaining <= 0:
+      eta = 0.0
+    elif dockets_per_second > 0:
+      eta = remaining / dockets_per_second
+    else:
+      eta = None
+    return {"files_total": self.total,
+            "files_done": self.done,
+            "failures": self.failures,
+            "rows": self.rows,
+            "errors": self.errors,
+            "elapsed_seconds": elapsed,
+            "dockets_per_second": dockets_per_second,
+            "rows_per_second": self.rows / elapsed if elapsed > 0 else 0.0,
+            "error_rate": self.failures / self.done if self.done else 0.0,
+            "eta_seconds": eta}
+
+  def report(self):
+    self.last_report = self.clock()
+    metrics = self.snapshot()
+    if self.stream is not None:
+      if metrics["files_total"] is None:
+        done = "{}/? dockets".format(metrics["files_done"])
+      else:
+        percent = 100.0 * metrics["files_done"] / metrics["files_total"] if metrics["files_total"] else 100.0
+        done = "{}/{} dockets ({:.1f}%)".format(metrics["files_done"], metrics["files_total"], percent)
+      self.stream.write("{}, {:.1f} dockets/s, {:.1f} rows/s, "
+                        "{:.1f}% failed, ETA {}\n".format(
+                          done,
+                          metrics["dockets_per_second"], metrics["rows_per_second"],
+                          100 * metrics["error_rate"], format_seconds(metrics["eta_seconds"])))
+      self.stream.flush()
+    if self.prometheus_file:
+      self.write_prometheus(metrics)
+    if self.jsonl_file:
+      with open(self.jsonl_file, "a") as f:
+        f.write(json.dumps(dict(metrics, time=time.time())) + "\n")
+    return metrics
+
+  def write_prometheus(self, metrics):
+    # Rewrite the Prometheus file in one step, so a scraper never reads half
+    # of it.
+    lines = []
+    for name, kind, description in METRICS:
+      if metrics[name] is None:
+        continue
+      full_name = "{}_{}".format(self.prefix, name)
+      lines.append("# HELP {} {}".format(full_name, description))
+      lines.append("# TYPE {} {}".format(full_name, kind))
+      lines.append("{} {}".format(full_name, metrics[name]))
+    temporary = self.prometheus_file + ".tmp"
+    with open(temporary, "w") as f:
+      f.write("\n".join(lines) + "\n")
+    os.replace(temporary, self.prometheus_file)
@@ -0,0 +1,152 @@
+#  This file contains tools for estimating statistics about a corpus of
+#  dockets from a sample, before committing to a full scrape.
+#  Samples are drawn with reservoir sampling in one pass over the listing, so
+#  they are reproducible for a given seed and listing order, and only ever
+#  hold n paths in memory (n per stratum, when stratified).  Statistics are
+#  computed with online (one pass) algorithms and reported with confidence
+#  intervals.
+
+import math
+import random
+
+from DocketQuery.docket_query import docket_number_from_path, docket_number_parts
+
+
+def reservoir_sample(items, n, rng):
+  # Input: An iterable, the size of the sample, and a random.Random.
+  # Output: A list of n items chosen uniformly at random from the iterable
+  #         (or all the items, if there are fewer than n), in the order they
+  #         were seen.
+  reservoir = []
+  for i, item in enumerate(items):
+    if i < n:
+      reservoir.append((i, item))
+    else:
+      j = rng.randint(0, i)
+      if j < n:
+        reservoir[j] = (i, item)
+  return [item for i, item in sorted(reservoir, key=lambda pair: pair[0])]
+
+
+def stratum_of(path, stratify):
+  # Input: A path to a docket and a list of docket number parts.
+  # Output: A tuple of the values of those parts for the docket.
+  parts = docket_number_parts(docket_number_from_path(path))
+  return tuple(parts[part] for part in stratify)
+
+
+def allocate(stratum_sizes, n):
+  # Input: A dict of stratum -> number of dockets in it, and the total size
+  #        of the sample.
+  # Output: A dict of stratum -> number of dockets to sample from it,
+  #         proportional to the stratum's size (largest remainder method).
+  population = sum(stratum_sizes.values())
+  if population <= n:
+    return dict(stratum_sizes)
+  shares = {stratum: size * n / population for stratum, size in stratum_sizes.items()}
+  allocation = {stratum: int(share) for stratum, share in shares.items()}
+  remaining = n - sum(allocation.values())
+  by_remainder = sorted(shares, key=lambda stratum: (allocation[stratum] - shares[stratum], stratum))
+  for stratum in by_remainder[:remaining]:
+    allocation[stratum] += 1
+  return allocation
+
+
+def sample_files(files, n, seed=None, stratify=None):
+  # Input: An iterable of docket paths, the size of the sample, a random
+  #        seed, and optionally a list of docket number parts (see
+  #        docket_query.docket_number_parts) to stratify the sample by.
+  # Output: A list of at most n paths.  With stratify, each stratum is
+  #         represented in proportion to its share of the files.
+  rng = random.Random(seed)
+  if not stratify:
+    return reservoir_sample(files, n, rng)
+  # One reservoir per stratum, each big enough for the whole sample, so the
+  # files are only listed once.  They are trimmed once the strata sizes are
+  # known.
+  reservoirs = {}
+  sizes = {}
+  for path in files:
+    stratum = stratum_of(path, stratify)
+    sizes[stratum] = sizes.get(stratum, 0) + 1
+    reservoir = reservoirs.setdefault(stratum, [])
+    if len(reservoir) < n:
+      reservoir.append(path)
+    else:
+      j = rng.randint(0, sizes[stratum] - 1)
+      if j < n:
+        reservoir[j] = path
+  sample = []
+  for stratum, count in sorted(allocate(sizes, n).items()):
+    sample += rng.sample(reservoirs[stratum], count)
+  return sample
+
+
+class OnlineStats:
+  # Running count, mean and variance of a stream of numbers (Welford's
+  # algorithm).  Two OnlineStats can be merged, so partial statistics from
+  # separate workers can be combined.
+
+  def __init__(self):
+    self.count = 0
+    self.mean = 0.0
+    self.m2 = 0.0
+
+  def add(self, value):
+    self.count += 1
+    delta = value - self.mean
+    self.mean += delta / self.count
+    self.m2 += delta * (value - self.mean)
+
+  def merge(self, other):
+    if other.count == 0:
+      return self
+    total = self.count + other.count
+    delta = other.mean - self.mean
+    self.mean += delta * other.count / total
+    self.m2 += other.m2 + delta * delta * self.count * other.count / total
+    self.count = total
+    return self
+
+  def variance(self):
+    # Sample variance.
+    return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+  def stddev(self):
+    return math.sqrt(self.variance())
+
+  def confidence_interval(self, z=1.96):
+    # Input: The z score for the confidence level (1.96 for 95%).
+    # Output: A (low, high) tuple for the mean.
+    margin = z * self.stddev() / math.sqrt(self.count) if self.count else 0.0
+    return self.mean - margin, self.mean + margin
+
+
+def estimate(results, value, by=(), z=1.96):
+  # Input: A list of result dicts (from a saved function), the value to
+  #        estimate, the fields to group by, and the z score for the
+  #        confidence intervals.  `value` is either a field name, or a
+  #        function of a result dict, e.g.
+  #        lambda row: "Guilty" in row["disposition"] to estimate a rate.
+  #        Values that aren't numbers (like "unknown") are skipped.
+  # Output: A list of dicts, one per group, with the group's fields and
+  #         "n", "mean", "stddev", "ci_low" and "ci_high".
+  get_value = value if callable(value) else lambda row: row.get(value)
+  groups = {}
+  for row in results:
+    observed = get_value(row)
+    if isinstance(observed, bool):
+      observed = int(observed)
+    if not isinstance(observed, (int, float)):
+      continue
+    key = tuple(row.get(field) for field in by)
+    groups.setdefault(key, OnlineStats()).add(observed)
+  estimates = []
+  for key in sorted(groups, key=str):
+    stats = groups[key]
+    low, high = stats.confidence_interval(z)
+    row = dict(zip(by, key))
+    row.update({"n": stats.count, "mean": stats.mean, "stddev": stats.stddev(),
+                "ci_low": low, "ci_high": high})
+    estimates.append(row)
+  return estimates
@@ -1,7 +1,11 @@
 import pytest
-import re
-from fractions import Fraction
 import datetime
+from lxml import etree
+
+from DocketQuery.errors import error_code, field_path
+from DocketQuery.extraction import xpath_text, DEFENDANT_NAME, DOCKET_NUMBER, BIRTH_DATE, \
+                                   DATE_INITIATED, DATE_FILED, guilty_sentences, \
+                                   day_count, sentence_days
 
 #  This file contains functions used to scrape data from dockets.
 #  Each function receives a docket as an lxml ElementTree and the name of the
@@ -9,9 +13,36 @@ import datetime
 #  logging purposes, so it could be some other identifier of the docket.
 #  Each function must return two objects:
 #    1) A list of dicts that represent errors.  Each dict has two fields,
-#       "error_file" and "error_field".
+#       "error_file" and "error_field", and may have a "message" with an
+#       error code from errors.py.  Don't store exceptions or Elements in
+#       errors or results; they keep the whole docket's tree in memory.
 #    2) A list of dicts that are observations pulled from dockets.
 
+#  Queries are compiled once, here and in extraction.py, rather than on
+#  every call.  They return plain strings (smart_strings=False), which unlike
+#  lxml's default "smart" strings don't keep a reference to the element they
+#  came from.
+
+def first_text(query, element):
+  # Input: A compiled query from this file and an element.
+  # Output: The first text the query finds, with surrounding whitespace
+  #         stripped.  Raises IndexError if the query finds nothing.
+  return query(element)[0].strip()
+
+def all_text(query, element):
+  # Input: A compiled query from this file and an element.
+  # Output: All the text the query finds, with each run of whitespace
+  #         made one space.  "" if the query finds nothing.
+  return " ".join(" ".join(query(element)).split())
+
+SEQUENCE_DESCRIPTION = xpath_text("sequence_description/text()")
+PROGRAM = xpath_text("program/text()")
+SENTENCES = etree.XPath("sentence_info")
+ACTIONS_WITH_SENTENCES = etree.XPath("judge_action[sentence_info]")
+SEQUENCES = etree.XPath("//sequence")
+OFFENSE_DISPOSITION = xpath_text("offense_disposition/text()")
+EXTRA_SENTENCE_DETAILS = xpath_text("extra_sentence_details/text()")
+
 
 def docket_number_and_name(docket_tree, file_name):
   #Input: a docket as an ElementTree
@@ -21,12 +52,12 @@ def docket_number_and_name(docket_tree, file_name):
   #           of the given docket.
   errors = []
   try:
-    name = docket_tree.xpath("/docket/header/caption/defendant/text()")[0].strip()
+    name = first_text(DEFENDANT_NAME, docket_tree)
   except Exception as e:
     errors.append({"error_file":file_name, "error_field": "defendant_name"})
     name = "unknown"
   try:
-    number = docket_tree.xpath("/docket/header/docket_number/text()")[0].strip()
+    number = first_text(DOCKET_NUMBER, docket_tree)
   except Exception as e:
     errors.append({"error_file":file_name, "error_field": "docket number"})
     number = "unknown"
@@ -41,34 +72,34 @@ def docket_num_name_age(docket_tree, file_name):
   #         name, and age of the person in the docket.
   errors = []
   try:
-    name = docket_tree.xpath("/docket/header/caption/defendant/text()")[0].strip()
+    name = first_text(DEFENDANT_NAME, docket_tree)
   except Exception as e:
     errors.append({"error_file":file_name, "error_field": "defendant_name",
-                   "message":e})
+                   "message":error_code(e)})
     name = "unknown"
   try:
-    number = docket_tree.xpath("/docket/header/docket_number/text()")[0].strip()
+    number = first_text(DOCKET_NUMBER, docket_tree)
   except Exception as e:
     errors.append({"error_file":file_name, "error_field": "docket number",
-                   "message":e})
+                   "message":error_code(e)})
     number = "unknown"
   try:
-    birth_date = docket_tree.xpath("/docket/section[@name='Defendant_Information']/defendant_information/birth_date/text()")[0].strip()
+    birth_date = first_text(BIRTH_DATE, docket_tree)
   except Exception as e:
     errors.append({"error_file":file_name, "error_field": "birth_date",
-                   "message":e})
+                   "message":error_code(e)})
     birth_date = "unknown"
   try:
-    docket_initiated = docket_tree.xpath("/docket/section[@name='Case_Information']/case_info/date_initiated/text()")[0].strip()
+    docket_initiated = first_text(DATE_INITIATED, docket_tree)
   except Exception as e:
     errors.append({"error_file":file_name, "error_field": "date_initiated",
-                   "message":e})
+                   "message":error_code(e)})
     docket_initiated = "unknown"
   try:
-    docket_filed = docket_tree.xpath("/docket/section[@name='Case_Information']/case_info/date_filed/text()")[0].strip()
+    docket_filed = first_text(DATE_FILED, docket_tree)
   except Exception as e:
     errors.append({"error_file":file_name, "error_field": "date_filed",
-                   "message":e})
+                   "message":error_code(e)})
     docket_filed = "unknown"
   return errors, [{"defendant_name": name,
                    "docket_number": number,
@@ -78,93 +109,86 @@ def docket_num_name_age(docket_tree, file_name):
 
 def conviction_information(docket_tree, file_name):
   #  This function scrapes conviction information from a docket as well as
-  #  basic information like docket name and defendant information.
+  #  basic information like docket name and defendant information.  The
+  #  fields of the guilty sequences come from extraction.guilty_sentences,
+  #  which scripts/guilty_records_query.py uses too.
   results = []
   errors, basic_info = docket_num_name_age(docket_tree, file_name)
-  # Get a list of the sequences that have the word "guilty" in them.
-  guilty_sequences = docket_tree.xpath("//sequence[contains(./offense_disposition, 'Guilty') and (judge_action/sentence_info/length_of_sentence)]")
   # Loop through sequences with guilty dispositions
-  for i, sequence in enumerate(guilty_sequences):
+  for i, (sequence, actions) in enumerate(guilty_sentences(docket_tree)):
     sequence_info = dict()
     sequence_info.update(basic_info[0]) # Load a copy of the basic info into the sequence_info dict.
-    try:
-      sequence_info["charge_desc"] = sequence.xpath("sequence_description/text()")[0].strip()
-    except Exception as e:
-      errors.append({"error_file":file_name,
-                     "error_field": "sequence_{}/charge_desc".format(i),
-                     "message":e})
-      sequence_info["charge_desc"] = "unknown"
-    try:
-      sequence_info["charge_section"] = sequence.xpath("code_section/text()")[0].strip()
-    except Exception as e:
-      errors.append({"error_file":file_name,
-                     "error_field": "sequence_{}/charge_section".format(i),
-                     "message":e})
-      sequence_info["charge_section"] = "unknown"
-    try:
-      sequence_info["grade"] = sequence.xpath("grade/text()")[0].strip()
-    except Exception as e:
-      errors.append({"error_file":file_name,
-                     "error_field":"sequence_{}/grade".format(i),
-                     "message":e})
-      sequence_info["grade"] = "unknown"
+    for key, field in [("charge_desc", "sequence_description"),
+                       ("charge_section", "code_section"), ("grade", "grade")]:
+      sequence_info[key] = _known(sequence[field], errors, file_name,
+                                 "sequence_{}/{}".format(i, key))
     # Loop through actions within a sequence that have a sentence
-    for i2, action in enumerate(get_actions_with_sentences(sequence)):
+    for i2, (action, sentences) in enumerate(actions):
       action_info = dict()
       action_info.update(sequence_info) # Load a copy of the basic info and
                                         # sequence info into action_info.
-      # Judge
-      try:
-        action_info["judge_name"] = action.xpath("judge_name/text()")[0].strip()
-      except Exception as e:
-        errors.append({"error_file":file_name,
-                       "error_field":"sequence_{}/action_{}/judge_name".format(i,i2),
-                       "message":e})
-        action_info["judge_name"] = "unknown"
-      # Date of action
-      try:
-        action_info["action_date"] = action.xpath("date/text()")[0].strip()
-      except Exception as e:
-        errors.append({"error_file":file_name,
-                       "error_field":"sequence_{}/action_{}/date".format(i,i2),
-                       "message":e})
-        action_info["action_date"] = "unknown"
+      action_info["judge_name"] = _known(action["judge_name"], errors, file_name,
+                                        "sequence_{}/action_{}/judge_name".format(i, i2))
+      action_info["action_date"] = _known(action["date"], errors, file_name,
+                                         "sequence_{}/action_{}/date".format(i, i2))
       # Loop through sentences in the action.
-      for i3, sentence in enumerate(action.xpath("sentence_info")):
+      for i3, sentence in enumerate(sentences):
         sentence_info = dict()
         sentence_info.update(action_info)
-        #Program
-        try:
-          sentence_info["program"] = sentence.xpath("program/text()")[0].strip()
-        except Exception as e:
-          errors.append({"error_file":file_name,
-                         "error_field":"sequence_{}/action_{}/sentence_{}/program".format(i,i2, i3),
-                         "message":e})
-          sentence_info["program"] = "unknown"
-        #Min length
-        try:
-          min_time = sentence.xpath("length_of_sentence/min_length/time/text()")[0].strip()
-          min_unit = sentence.xpath("length_of_sentence/min_length/unit/text()")[0].strip()
-          sentence_info["min_time"] = convert_time(min_time, min_unit).days
-        except Exception as e:
-          errors.append({"error_file":file_name,
-                         "error_field":"sequence_{}/action_{}/sentence_{}/min_time".format(i,i2, i3),
-                         "message":e})
-          sentence_info["min_time"] = "unknown"
-        #Max length
-        try:
-          max_time = sentence.xpath("length_of_sentence/max_length/time/text()")[0].strip()
-          max_unit = sentence.xpath("length_of_sentence/max_length/unit/text()")[0].strip()
-          sentence_info["max_time"] = convert_time(max_time, max_unit).days
-        except Exception as e:
-          errors.append({"error_file":file_name,
-                         "error_field":"sequence_{}/action_{}/sentence_{}/max_time".format(i,i2, i3),
-                         "message":e})
-          sentence_info["max_time"] = "unknown"
+        sentence_info["program"] = _known(sentence["program"], errors, file_name,
+                                         "sequence_{}/action_{}/sentence_{}/program".format(i, i2, i3))
+        for bound in ["min", "max"]:
+          try:
+            sentence_info[bound + "_time"] = sentence_days(sentence[bound + "_time"],
+                                                           sentence[bound + "_unit"])
+          except Exception as e:
+            errors.append({"error_file":file_name,
+                           "error_field": field_path("sequence_{}/action_{}/sentence_{}/{}_time".format(i, i2, i3, bound)),
+                           "message":error_code(e)})
+            sentence_info[bound + "_time"] = "unknown"
         results.append(sentence_info)
-        # End of loop through sentences
-      # End of loop through actions
-    # End of loop through sequences
+  return errors, results
+
+def _known(value, errors, file_name, path):
+  # Input: A field's text from extraction.py (None if it is missing), the
+  #        list of errors, and the file and field path to report it under.
+  # Output: The text, or "unknown" after adding a "missing" error.
+  if value is None:
+    errors.append({"error_file":file_name,
+                   "error_field": field_path(path),
+                   "message":error_code(IndexError())})
+    return "unknown"
+  return value
+
+def sentence_texts(docket_tree, file_name):
+  #  This function scrapes the free text of every sequence (its description)
+  #  and every sentence (its extra_sentence_details), with where in the
+  #  docket each came from, for text_index.py.  There is one row per
+  #  sentence, and one row with empty sentence fields for each sequence
+  #  without sentences.  Missing text is "", not an error, since most
+  #  sentences have no extra details.
+  errors = []
+  results = []
+  try:
+    docket_number = first_text(DOCKET_NUMBER, docket_tree)
+  except Exception as e:
+    errors.append({"error_file": file_name, "error_field": "docket number",
+                   "message": error_code(e)})
+    docket_number = "unknown"
+  for i, sequence in enumerate(SEQUENCES(docket_tree)):
+    sequence_info = {"file": file_name, "docket_number": docket_number,
+                     "sequence": i, "action": None, "sentence": None,
+                     "sequence_description": all_text(SEQUENCE_DESCRIPTION, sequence),
+                     "offense_disposition": all_text(OFFENSE_DISPOSITION, sequence),
+                     "program": "", "extra_sentence_details": ""}
+    rows = []
+    for i2, action in enumerate(get_actions_with_sentences(sequence)):
+      for i3, sentence in enumerate(SENTENCES(action)):
+        sentence_info = dict(sequence_info, action=i2, sentence=i3)
+        sentence_info["program"] = all_text(PROGRAM, sentence)
+        sentence_info["extra_sentence_details"] = all_text(EXTRA_SENTENCE_DETAILS, sentence)
+        rows.append(sentence_info)
+    results += rows or [sequence_info]
   return errors, results
 
 def final_disposition_information(docket_tree, file_name):
@@ -192,41 +216,7 @@ def get_actions_with_sentences(sequence):
           2) a judge_action,
           3) has a sentence_info child.
   """
-  return sequence.xpath("judge_action[sentence_info]")
-
-
-def scrape_sentence_info(sentence):
-  """
-  Input: an etree.Element looking like:
-  <sentence_info>
-              <program>IPP</program>
-              <length_of_sentence>
-                <min_length>
-                  <time>12.00</time>
-                  <unit>Months</unit>
-                </min_length>
-                <max_length>
-                  <time>12.00</time>
-                  <unit>Months</unit>
-                </max_length>
-              </length_of_sentence>
-              <date>03/02/2011</date>
-              <extra_sentence_details>12 months... HOUSE ARREST FOR FIRST 3 MONTHS. SHERIFF TO T RANSPORT... Complete 20 hours community service...</extra_sentence_details>
-            </sentence_info>
-  Output: A dict looking like:
-        {"sentence_program": "IPP",
-         "min_length": <timedelta days=365>,
-         "max_length": <timedelta days=365>}
-  """
-
-  program = sentence.xpath("program/text()")[0].strip()
-  min_length_time = xpath_or_log(sentence, "length_of_sentence/min_length/time/text()", "min_length_time")
-  min_length_unit = xpath_or_log(sentence, "length_of_sentence/min_length/unit/text()", "min_length_unit")
-  max_length_time = xpath_or_log(sentence, "length_of_sentence/max_length/time/text()", "max_length_time")
-  max_length_unit = xpath_or_log(sentence, "length_of_sentence/max_length/unit/text()", "max_length_unit")
-  return {"sentence_program": program,
-          "min_length": convert_time(min_length_time, min_length_unit),
-          "max_length": convert_time(max_length_time, max_length_unit)}
+  return ACTIONS_WITH_SENTENCES(sequence)
 
 
 def convert_time(period, unit):
@@ -235,14 +225,7 @@ def convert_time(period, unit):
       ("7 1/2", "years")
   Out: A timedelta object of the input time period.
   """
-  year_pattern = re.compile("year", flags=re.I)
-  month_pattern = re.compile("month", flags=re.I)
-  if re.search(year_pattern, unit) != None:
-    day_count = sum([float(Fraction(quantity)) * 365 for quantity in period.split()])
-  elif re.search(month_pattern, unit) != None:
-    day_count = sum([float(Fraction(quantity)) * 30.42 for quantity in period.split()])
-                # 30.41666 is the average length of a month in non
-                # leap-year.
-  else:
+  days = day_count(period, unit)
+  if days is None:
     return ' '.join([period, unit, "(cannot parse time)"])
-  return datetime.timedelta(days=day_count)
+  return datetime.timedelta(days=days)
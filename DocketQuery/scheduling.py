@@ -0,0 +1,77 @@
+#  This file orders and chunks the dockets of a parallel scrape by size.
+#  Docket sizes vary by orders of magnitude, and parse time grows with size,
+#  so chunks of files in directory order can leave one worker busy with a
+#  few huge dockets long after the others have finished.
+#
+#  size_chunks puts the largest dockets first and makes chunks of roughly
+#  equal bytes that shrink as the run goes on (guided self-scheduling): a
+#  worker that finishes early takes the next chunk from the pool, and the
+#  small chunks at the end even out the finishing times.  Use it with
+#
+#    scraper.scrape_directory(dir, workers=8, schedule="size")
+#
+#  Sizes come from a stat of each file, or from a snapshot.py manifest of
+#  an earlier run, which already has them.
+
+import json
+import os
+
+
+def docket_size(docket):
+  # Input: A docket path, or a packs.PackedDocket.
+  # Output: Its size in bytes.
+  if hasattr(docket, "length"):
+    return docket.length
+  return os.path.getsize(docket)
+
+
+def docket_sizes(files, manifest_path=None):
+  # Input: A list of dockets, and optionally the path of a snapshot.py
+  #        manifest to take sizes from.
+  # Output: A list of their sizes in bytes.  Dockets that aren't in the
+  #         manifest are stat-ed; dockets that can't be are size 0.
+  known = {}
+  if manifest_path is not None and os.path.exists(manifest_path):
+    with open(manifest_path) as f:
+      known = {path: entry["size"] for path, entry in json.load(f)["inputs"].items()}
+  sizes = []
+  for docket in files:
+    size = known.get(docket) if isinstance(docket, str) else None
+    if size is None:
+      try:
+        size = docket_size(docket)
+      except OSError:
+        size = 0
+    sizes.append(size)
+  return sizes
+
+
+def size_chunks(files, workers, sizes=None, chunks_per_worker=4, max_chunksize=None):
+  # Input: A list of dockets, the number of workers, optionally their sizes
+  #        (see docket_sizes), how many chunks each worker should get from
+  #        the first part of the run, and optionally the most dockets in a
+  #        chunk.
+  # Output: A list of lists of dockets, largest dockets first.  Each chunk
+  #         holds about 1/(workers * chunks_per_worker) of the bytes still
+  #         to be scheduled, and at least one docket.
+  if sizes is None:
+    sizes = docket_sizes(files)
+  order = sorted(range(len(files)), key=lambda i: -sizes[i])
+  remaining = sum(sizes)
+  divisor = max(1, workers * chunks_per_worker)
+  chunks = []
+  chunk = []
+  chunk_bytes = 0
+  budget = remaining / divisor
+  for i in order:
+    chunk.append(files[i])
+    chunk_bytes += sizes[i]
+    if chunk_bytes >= budget or (max_chunksize and len(chunk) >= max_chunksize):
+      chunks.append(chunk)
+      remaining -= chunk_bytes
+      chunk = []
+      chunk_bytes = 0
+      budget = remaining / divisor
+  if chunk:
+    chunks.append(chunk)
+  return chunks
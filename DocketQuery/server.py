@@ -0,0 +1,248 @@
+#  This file runs a local http service over a directory of parsed dockets.
+#  The directory is listed once when the service starts, and the results of
+#  every saved function run through the service are kept in memory, so
+#  repeated queries don't re-list the directory or re-parse dockets.
+#
+#  Usage:
+#    python -m DocketQuery.server -d <directory of parsed dockets/> [-p port]
+#                                 [-w workers] [-f function_to_preload]
+#
+#  Requests:
+#    GET /query?function=conviction_information&match=CP-51-CR-*-2011&format=csv
+#      Runs a saved function over the dockets whose docket number (or file
+#      name) matches the glob pattern `match` (default: all of them) and
+#      streams the results back in chunks, as csv (the default) or as a json
+#      list.  rows=errors streams the errors instead of the results.
+#    GET /stats
+#      The size of the corpus, the number of cached results and the latency
+#      of recent requests, as json.
+
+import csv
+import fnmatch
+import getopt
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from DocketQuery import saved_functions
+from DocketQuery.docket_query import AskADocket, list_dockets, docket_number_from_path
+from DocketQuery.errors import error_code
+
+SAVED_FUNCTIONS = {
+  "docket_number_and_name": saved_functions.docket_number_and_name,
+  "docket_num_name_age": saved_functions.docket_num_name_age,
+  "conviction_information": saved_functions.conviction_information,
+}
+
+ROWS_PER_CHUNK = 500
+
+
+class Corpus:
+  # Input: A path to a directory of parsed dockets, ending in a slash, and
+  #        the number of threads to scrape dockets with.
+  # The directory is listed once.  Results are cached per saved function
+  # and docket, so each docket is parsed at most once per function.  A
+  # docket that fails to parse isn't cached; it is answered with an error
+  # row and tried again by the next request for it.
+
+  def __init__(self, directory_path, workers=4):
+    self.directory_path = directory_path
+    self.files = sorted(list_dockets(directory_path))
+    self.names = {path: docket_number_from_path(path) or os.path.basename(path)
+                  for path in self.files}
+    self.executor = ThreadPoolExecutor(max_workers=workers)
+    self.cache = {}
+    self.pending = {}   # Futures of the scrapes in progress, by (function, path).
+    self.lock = threading.Lock()
+
+  def select(self, match=None):
+    # Input: A glob pattern for docket numbers or file names, or None.
+    # Output: The paths of the matching dockets, in sorted order.
+    if not match:
+      return list(self.files)
+    return [path for path in self.files
+            if fnmatch.fnmatchcase(self.names[path], match)
+            or fnmatch.fnmatchcase(os.path.basename(path), match)]
+
+  def _scrape(self, function_name, path):
+    key = (function_name, path)
+    try:
+      outcome = AskADocket(SAVED_FUNCTIONS[function_name]).scrape_docket(path)
+    except Exception as e:
+      print("Error while parsing {}.".format(path))
+      print(e)
+      with self.lock:
+        del self.pending[key]
+      return [{"error_file": path, "error_field": "docket", "message": error_code(e)}], []
+    with self.lock:
+      self.cache[key] = outcome
+      del self.pending[key]
+    return outcome
+
+  def run(self, function_name, paths):
+    # Input: The name of a saved function and a list of docket paths.
+    # Output: An iterator over (errors, results) for each docket, in order.
+    #         Cached dockets are answered right away; the rest are scraped
+    #         by the worker threads.  A docket another request is already
+    #         scraping is waited for rather than scraped again.
+    if function_name not in SAVED_FUNCTIONS:
+      raise KeyError(function_name)
+    answers = []
+    with self.lock:
+      for path in paths:
+        key = (function_name, path)
+        if key in self.cache:
+          answers.append(self.cache[key])
+          continue
+        if key not in self.pending:
+          self.pending[key] = self.executor.submit(self._scrape, function_name, path)
+        answers.append(self.pending[key])
+    for answer in answers:
+      yield answer.result() if isinstance(answer, Future) else answer
+
+  def warm(self, function_name):
+    # Scrape every docket in the corpus with the function, so later queries
+    # are answered from memory.
+    for _ in self.run(function_name, self.files):
+      pass
+
+
+def csv_chunks(rows):
+  # Input: An iterator over dicts.
+  # Output: An iterator over strings of csv, with a header taken from the
+  #         first row, like dicts2csv.
+  writer = None
+  buffer = io.StringIO()
+  for count, row in enumerate(rows, 1):
+    if writer is None:
+      writer = csv.DictWriter(buffer, delimiter=',', quotechar='|',
+                              fieldnames=list(row.keys()), extrasaction="ignore")
+      writer.writeheader()
+    writer.writerow(row)
+    if count % ROWS_PER_CHUNK == 0:
+      yield buffer.getvalue()
+      buffer.seek(0)
+      buffer.truncate()
+  if writer is None:
+    buffer.write("No results reported\r\n")
+  yield buffer.getvalue()
+
+
+def json_chunks(rows):
+  # Input: An iterator over dicts.
+  # Output: An iterator over strings that together make a json list.
+  #         Values json can't represent (like dates) are written as strings.
+  pieces = ["["]
+  for count, row in enumerate(rows):
+    pieces.append(("," if count else "") + json.dumps(row, default=str))
+    if len(pieces) >= ROWS_PER_CHUNK:
+      yield "".join(pieces)
+      pieces = []
+  pieces.append("]")
+  yield "".join(pieces)
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+
+  def do_GET(self):
+    started = time.perf_counter()
+    url = urlparse(self.path)
+    params = {key: values[0] for key, values in parse_qs(url.query).items()}
+    if url.path == "/stats":
+      self._send_json(200, self.server.stats())
+    elif url.path == "/query":
+      self._query(params)
+    else:
+      self._send_json(404, {"error": "Unknown path {}".format(url.path)})
+    self.server.record_latency(self.path, time.perf_counter() - started)
+
+  def _send_json(self, status, body):
+    data = json.dumps(body, default=str).encode("utf-8")
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+  def _query(self, params):
+    corpus = self.server.corpus
+    function_name = params.get("function")
+    if function_name not in SAVED_FUNCTIONS:
+      self._send_json(400, {"error": "Unknown function {}".format(function_name),
+                            "functions": sorted(SAVED_FUNCTIONS)})
+      return
+    output = params.get("format", "csv")
+    if output not in ("csv", "json"):
+      self._send_json(400, {"error": "Unknown format {}".format(output)})
+      return
+    which = 0 if params.get("rows") == "errors" else 1
+    paths = corpus.select(params.get("match"))
+    rows = (row for outcome in corpus.run(function_name, paths) for row in outcome[which])
+    self.send_response(200)
+    self.send_header("Content-Type", "text/csv" if output == "csv" else "application/json")
+    self.send_header("Transfer-Encoding", "chunked")
+    self.send_header("X-Dockets-Matched", str(len(paths)))
+    self.end_headers()
+    for chunk in (csv_chunks(rows) if output == "csv" else json_chunks(rows)):
+      data = chunk.encode("utf-8")
+      if data:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+    self.wfile.write(b"0\r\n\r\n")
+
+
+class QueryServer(ThreadingHTTPServer):
+  # Input: An (address, port) tuple and a Corpus.
+  # Each request is handled on its own thread.
+
+  daemon_threads = True
+
+  def __init__(self, address, corpus):
+    ThreadingHTTPServer.__init__(self, address, QueryHandler)
+    self.corpus = corpus
+    self.latencies = deque(maxlen=100)
+    self.latency_lock = threading.Lock()
+
+  def record_latency(self, path, seconds):
+    with self.latency_lock:
+      self.latencies.append({"request": path, "seconds": round(seconds, 6)})
+    print("{} took {:.3f}s".format(path, seconds))
+
+  def stats(self):
+    with self.latency_lock:
+      recent = list(self.latencies)
+    return {"dockets": len(self.corpus.files),
+            "cached_results": len(self.corpus.cache),
+            "recent_requests": recent}
+
+
+def main():
+  usage_string = "python -m DocketQuery.server -d <directory/> [-p port] [-w workers] [-f function_to_preload]"
+  try:
+    opts, args = getopt.getopt(sys.argv[1:], "hd:p:w:f:")
+  except getopt.GetoptError:
+    print(usage_string)
+    sys.exit(2)
+  opts = dict(opts)
+  if "-h" in opts or "-d" not in opts:
+    print(usage_string)
+    sys.exit(2)
+  corpus = Corpus(opts["-d"], workers=int(opts.get("-w", 4)))
+  print("Loaded {} dockets.".format(len(corpus.files)))
+  if "-f" in opts:
+    corpus.warm(opts["-f"])
+    print("Preloaded {}.".format(opts["-f"]))
+  server = QueryServer(("127.0.0.1", int(opts.get("-p", 8000))), corpus)
+  print("Serving on http://127.0.0.1:{}/".format(server.server_address[1]))
+  server.serve_forever()
+
+
+if __name__ == "__main__":
+  main()
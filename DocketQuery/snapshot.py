@@ -0,0 +1,174 @@
+#  This file records what produced the output of a scrape, so a run can be
+#  skipped when nothing has changed since the last one.
+#
+#  A manifest is a json file listing:
+#    - every input docket, with its size, modification time and sha1,
+#    - the identity of the saved function and transforms: their names and a
+#      hash of the source of the modules that define them and of the
+#      DocketQuery modules those import (see function_identity),
+#    - every output file, with its size, modification time and sha1.
+#
+#  is_current() answers "is this output still current?" by comparing sizes
+#  and modification times only.  A file is only hashed if its stat has
+#  changed, to tell a touched file from an edited one.
+
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import sys
+import time
+
+# The packages whose modules count as part of a function's version.
+LOCAL_PACKAGES = ("DocketQuery", "scripts")
+# Modules hashed with every function, since saved functions may call them
+# through imports that function_identity can't see (inside a function).
+IDENTITY_MODULES = ("DocketQuery.extraction", "DocketQuery.errors", "DocketQuery.dates")
+
+
+def file_hash(path):
+  # Input: A path to a file.
+  # Output: The sha1 hex digest of its contents.
+  digest = hashlib.sha1()
+  with open(path, "rb") as f:
+    for block in iter(lambda: f.read(1 << 16), b""):
+      digest.update(block)
+  return digest.hexdigest()
+
+
+def file_entry(path, with_hash=True):
+  stat = os.stat(path)
+  entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+  if with_hash:
+    entry["sha1"] = file_hash(path)
+  return entry
+
+
+def is_local(name):
+  return name is not None and name.split(".")[0] in LOCAL_PACKAGES
+
+
+def local_imports(module):
+  # Input: A module.
+  # Output: The set of names of the modules in LOCAL_PACKAGES that it
+  #         imports, or imports functions, classes or values from.
+  names = set()
+  for value in vars(module).values():
+    if inspect.ismodule(value):
+      name = value.__name__
+    else:
+      name = getattr(value, "__module__", None)
+    if is_local(name) and name != module.__name__:
+      names.add(name)
+  return names
+
+
+def module_source(module):
+  # Output: The source of a module as bytes, or None if it has none.
+  try:
+    return inspect.getsource(module).encode("utf-8")
+  except (TypeError, OSError):
+    return None
+
+
+def function_identity(fun):
+  # Input: A function.
+  # Output: A dict with its module and name, and a hash of the source of
+  #         the module that defines it, of the local modules that module
+  #         imports (and they import), and of IDENTITY_MODULES, so that
+  #         editing a helper it calls counts as a new version too.
+  names = {fun.__module__}
+  for name in IDENTITY_MODULES:
+    importlib.import_module(name)
+    names.add(name)
+  pending = list(names)
+  while pending:
+    module = sys.modules.get(pending.pop())
+    if module is None:
+      continue
+    for name in local_imports(module) - names:
+      names.add(name)
+      pending.append(name)
+  digest = hashlib.sha1()
+  for name in sorted(names):
+    source = module_source(sys.modules[name]) if name in sys.modules else None
+    if source is None:
+      if name != fun.__module__:
+        continue
+      source = fun.__code__.co_code
+    digest.update(name.encode("utf-8") + b"\0" + source + b"\0")
+  return {"name": "{}.{}".format(fun.__module__, fun.__qualname__),
+          "source_sha1": digest.hexdigest()}
+
+
+def scraper_identity(scraper):
+  # Input: An AskADocket.
+  # Output: The identities of its saved function and transforms.
+  return {"function": function_identity(scraper.scrape_function),
+          "transforms": [function_identity(transform) for transform in scraper.transforms]}
+
+
+def record(manifest_path, inputs, scraper, outputs):
+  # Input: A path for the manifest, the list of docket paths that were
+  #        scraped, the AskADocket that scraped them, and the paths of the
+  #        files the results were written to.
+  # Output: The manifest, which is also written to manifest_path.
+  manifest = {"created": time.strftime("%Y-%m-%d %H:%M:%S"),
+              "scraper": scraper_identity(scraper),
+              "inputs": {path: file_entry(path) for path in inputs},
+              "outputs": {path: file_entry(path) for path in outputs}}
+  with open(manifest_path, "w") as f:
+    json.dump(manifest, f, indent=1, sort_keys=True)
+  return manifest
+
+
+def unchanged(path, entry):
+  # Input: A path and its manifest entry.
+  # Output: True if the file still has the contents it had when recorded.
+  try:
+    stat = os.stat(path)
+  except OSError:
+    return False
+  if stat.st_size != entry["size"]:
+    return False
+  if stat.st_mtime_ns == entry["mtime_ns"]:
+    return True
+  return file_hash(path) == entry["sha1"]
+
+
+def changes(manifest_path, inputs, scraper):
+  # Input: A path to a manifest, the docket paths a new run would scrape,
+  #        and the AskADocket it would scrape them with.
+  # Output: A list of reasons the recorded output is out of date (empty if
+  #         it is current).
+  try:
+    with open(manifest_path) as f:
+      manifest = json.load(f)
+  except (OSError, ValueError):
+    return ["no manifest at {}".format(manifest_path)]
+  reasons = []
+  if manifest["scraper"] != scraper_identity(scraper):
+    reasons.append("the saved function or transforms changed")
+  recorded = manifest["inputs"]
+  inputs = set(inputs)
+  added = inputs.difference(recorded)
+  removed = set(recorded).difference(inputs)
+  if added:
+    reasons.append("{} new input files".format(len(added)))
+  if removed:
+    reasons.append("{} input files are gone".format(len(removed)))
+  edited = [path for path in inputs.intersection(recorded)
+            if not unchanged(path, recorded[path])]
+  if edited:
+    reasons.append("{} input files changed".format(len(edited)))
+  for path, entry in manifest["outputs"].items():
+    if not unchanged(path, entry):
+      reasons.append("output {} is missing or changed".format(path))
+  return reasons
+
+
+def is_current(manifest_path, inputs, scraper):
+  # Output: True if the output recorded in the manifest is still what
+  #         scraping `inputs` with `scraper` would produce.
+  return not changes(manifest_path, inputs, scraper)
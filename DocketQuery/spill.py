@@ -0,0 +1,110 @@
+#  This file contains SpillList, a list that keeps at most `limit` items in
+#  memory and writes the rest to temporary segment files on disk.  It is
+#  what AskADocket.scrape_files returns for results and errors when given
+#  spill_after=<limit>, so a run whose results don't fit in memory can
+#  still finish, and callers that loop over the results, take len() or
+#  results[0], or pass them to dicts2csv don't need to change.
+#
+#  Segments are deleted when the SpillList is closed or garbage collected.
+
+import itertools
+import os
+import pickle
+import shutil
+import tempfile
+import weakref
+
+
+class SpillList:
+  # Input: The number of items to keep in memory before writing them out
+  #        to a segment, and optionally a directory for the segments.
+
+  def __init__(self, limit, directory=None):
+    if limit < 1:
+      raise ValueError("limit must be at least 1.")
+    self.limit = limit
+    self.buffer = []
+    self.segments = []        # (path, number of items)
+    self.spilled = 0
+    self.directory = tempfile.mkdtemp(prefix="docketquery_spill_", dir=directory)
+    self._finalizer = weakref.finalize(self, shutil.rmtree, self.directory, True)
+
+  def append(self, item):
+    self.buffer.append(item)
+    if len(self.buffer) >= self.limit:
+      self.spill()
+
+  def extend(self, items):
+    for item in items:
+      self.append(item)
+
+  def __iadd__(self, items):
+    self.extend(items)
+    return self
+
+  def spill(self):
+    # Write the items in memory to a new segment.
+    if not self.buffer:
+      return
+    path = os.path.join(self.directory, "segment_{:06d}.pickle".format(len(self.segments)))
+    with open(path, "wb") as f:
+      pickler = pickle.Pickler(f, protocol=pickle.HIGHEST_PROTOCOL)
+      for item in self.buffer:
+        pickler.dump(item)
+    self.segments.append((path, len(self.buffer)))
+    self.spilled += len(self.buffer)
+    self.buffer = []
+
+  def _read_segment(self, path):
+    with open(path, "rb") as f:
+      unpickler = pickle.Unpickler(f)
+      while True:
+        try:
+          yield unpickler.load()
+        except EOFError:
+          return
+
+  def __iter__(self):
+    # Segments are read back one item at a time, in the order the items
+    # were added.
+    for path, count in self.segments:
+      for item in self._read_segment(path):
+        yield item
+    for item in list(self.buffer):
+      yield item
+
+  def __len__(self):
+    return self.spilled + len(self.buffer)
+
+  def __bool__(self):
+    return len(self) > 0
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return list(self)[index]
+    if index < 0:
+      index += len(self)
+    if not 0 <= index < len(self):
+      raise IndexError("SpillList index out of range")
+    if index >= self.spilled:
+      return self.buffer[index - self.spilled]
+    for path, count in self.segments:
+      if index < count:
+        return next(itertools.islice(self._read_segment(path), index, None))
+      index -= count
+
+  def __eq__(self, other):
+    if isinstance(other, (list, SpillList)):
+      return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+    return NotImplemented
+
+  def __repr__(self):
+    return "<SpillList of {} items, {} on disk in {} segments>".format(
+      len(self), self.spilled, len(self.segments))
+
+  def close(self):
+    # Delete the segments.  The list is empty afterwards.
+    self._finalizer()
+    self.buffer = []
+    self.segments = []
+    self.spilled = 0
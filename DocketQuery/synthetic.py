@@ -0,0 +1,174 @@
+#  This file builds synthetic parsed dockets that have the same layout as the
+#  xml produced by docket_parse.  Real dockets contain personal information,
+#  so the tests and benchmarks generate their corpora with these functions
+#  instead.
+
+import os
+import random
+from xml.sax.saxutils import escape
+
+FIRST_NAMES = ["Samuel", "Sergio", "Maria", "Keisha", "John", "Anh", "Luis",
+               "Tanya", "Robert", "Aisha", "Kevin", "Rosa"]
+LAST_NAMES = ["Mccray", "Moore", "Smith", "Johnson", "Nguyen", "Garcia",
+              "Brown", "Williams", "Jones", "Davis", "Lopez", "Jackson"]
+JUDGES = ["Hill, Glynnis", "Brinkley, Ramy I.", "Bronson, Gwendolyn N.",
+          "Means, Sheila A.", "Woods-Skipper, Sheila"]
+CHARGES = [("Rape Forcible Compulsion", "18 § 3121 §§ A1", "F1"),
+           ("Poss Instrument Of Crime W/Int", "18 § 907 §§ A", "M1"),
+           ("Theft By Unlaw Taking-Movable Prop", "18 § 3921 §§ A", "M1"),
+           ("Simple Assault", "18 § 2701 §§ A", "M2"),
+           ("Int Poss Contr Subst By Per Not Reg", "35 § 780-113 §§ A16", "M"),
+           ("Robbery-Inflict Serious Bodily Injury", "18 § 3701 §§ A1I", "F1")]
+DISPOSITIONS = ["Guilty Plea - Negotiated", "Guilty", "Nolle Prossed",
+                "Withdrawn", "Not Guilty"]
+PROGRAMS = [("Confinement", "years"), ("Probation", "Years"),
+            ("IPP", "Months"), ("Confinement", "Months")]
+DETAILS = ["HOUSE ARREST FOR FIRST 3 MONTHS.", "Complete 20 hours community service.",
+           "LIFE TIME REGISTRATION WITH STATE POLICE.", "PAY COURT COST & FINES.",
+           "Probation is to be served non-reporting."]
+
+
+def sentence_xml(program, min_length, max_length, date, details=""):
+  # Input: A program name, (time, unit) tuples for the min and max length,
+  #        the date of the sentence and any extra details.
+  # Output: A <sentence_info> element as a string.
+  return """
+              <sentence_info>
+                <program>{}</program>
+                <length_of_sentence>
+                  <min_length>
+                    <time>{}</time>
+                    <unit>{}</unit>
+                  </min_length>
+                  <max_length>
+                    <time>{}</time>
+                    <unit>{}</unit>
+                  </max_length>
+                </length_of_sentence>
+                <date>{}</date>
+                <extra_sentence_details>{}</extra_sentence_details>
+              </sentence_info>""".format(escape(program),
+                                         escape(min_length[0]), escape(min_length[1]),
+                                         escape(max_length[0]), escape(max_length[1]),
+                                         escape(date), escape(details))
+
+
+def action_xml(judge_name, date, sentences=()):
+  # Input: The judge's name, the date of the action and a list of
+  #        <sentence_info> strings.
+  # Output: A <judge_action> element as a string.
+  return """
+            <judge_action>
+              <judge_name>{}</judge_name>
+              <date>{}</date>{}
+            </judge_action>""".format(escape(judge_name), escape(date),
+                                      "".join(sentences))
+
+
+def sequence_xml(number, description, disposition, grade, code_section,
+                 actions=()):
+  # Input: The fields of a disposition sequence and a list of
+  #        <judge_action> strings.
+  # Output: A <sequence> element as a string.
+  return """
+          <sequence>
+            <sequence_num>{}</sequence_num>
+            <sequence_description>{}</sequence_description>
+            <offense_disposition>{}</offense_disposition>
+            <grade>{}</grade>
+            <code_section>{}</code_section>{}
+          </sequence>""".format(number, escape(description), escape(disposition),
+                                escape(grade), escape(code_section),
+                                "".join(actions))
+
+
+def docket_xml(docket_number, defendant_name, birth_date, date_filed,
+               date_initiated, sequences=()):
+  # Input: The header fields of a docket and a list of <sequence> strings.
+  # Output: A complete parsed docket as a string.
+  return """<?xml version="1.0" encoding="UTF-8"?>
+<docket>
+  <header>
+    <court_name>Court of Common Pleas of Philadelphia County</court_name>
+    <docket_number>{}</docket_number>
+    <caption>
+      <plaintiff>Commonwealth of Pennsylvania</plaintiff>
+      <defendant>{}</defendant>
+    </caption>
+  </header>
+  <section name="Case_Information">
+    <case_info>
+      <date_filed>{}</date_filed>
+      <date_initiated>{}</date_initiated>
+    </case_info>
+  </section>
+  <section name="Defendant_Information">
+    <defendant_information>
+      <birth_date>{}</birth_date>
+    </defendant_information>
+  </section>
+  <section name="Disposition_Sentencing_Penalties">
+    <disposition_section>
+      <case_event>
+        <sequences>{}
+        </sequences>
+      </case_event>
+    </disposition_section>
+  </section>
+</docket>
+""".format(escape(docket_number), escape(defendant_name), escape(date_filed),
+           escape(date_initiated), escape(birth_date), "".join(sequences))
+
+
+def _date(rng, year):
+  return "{:02d}/{:02d}/{}".format(rng.randint(1, 12), rng.randint(1, 28), year)
+
+
+def random_docket(rng, docket_number, max_sequences=6):
+  # Input: A random.Random, a docket number like CP-51-CR-0000001-2011 and
+  #        the most sequences the docket may have.
+  # Output: A plausible parsed docket as a string.  The year of the docket
+  #         number is used for the filing and sentencing dates.
+  year = int(docket_number.split("-")[-1])
+  date_filed = "01/{:02d}/{}".format(rng.randint(1, 28), year)
+  sequences = []
+  for number in range(1, rng.randint(1, max_sequences) + 1):
+    description, code_section, grade = rng.choice(CHARGES)
+    disposition = rng.choice(DISPOSITIONS)
+    actions = [action_xml(rng.choice(JUDGES), _date(rng, year))]
+    if "Guilty" in disposition and not disposition.startswith("Not"):
+      sentences = []
+      for _ in range(rng.randint(1, 2)):
+        program, unit = rng.choice(PROGRAMS)
+        low = rng.randint(1, 5)
+        sentences.append(sentence_xml(program, ("{}.00".format(low), unit),
+                                      ("{}.00".format(low * 2), unit),
+                                      _date(rng, year), rng.choice(DETAILS)))
+      actions.append(action_xml(rng.choice(JUDGES), _date(rng, year), sentences))
+    sequences.append(sequence_xml(number, description, disposition, grade,
+                                  code_section, actions))
+  return docket_xml(docket_number,
+                    "{} {}".format(rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)),
+                    _date(rng, rng.randint(1950, 1995)), date_filed, date_filed,
+                    sequences)
+
+
+def write_corpus(directory, count, seed=0, counties=("51",), years=(2011,)):
+  # Input: A directory to write to, the number of dockets to write, a random
+  #        seed, and the counties and years to spread the dockets across.
+  # Output: A list of the paths written.  Files are named the way
+  #         docket_parse names them, e.g.
+  #         CP-51-CR-0000001-2011_stitched_complete.xml
+  rng = random.Random(seed)
+  if not os.path.exists(directory):
+    os.makedirs(directory)
+  paths = []
+  for i in range(count):
+    docket_number = "CP-{}-CR-{:07d}-{}".format(counties[i % len(counties)],
+                                                i + 1,
+                                                years[(i // len(counties)) % len(years)])
+    path = os.path.join(directory, docket_number + "_stitched_complete.xml")
+    with open(path, "w") as f:
+      f.write(random_docket(rng, docket_number))
+    paths.append(path)
+  return paths
@@ -0,0 +1,298 @@
+#  This file contains versions of saved functions that never build a tree.
+#  Each is an lxml parser target: the parser calls its start(), data() and
+#  end() methods as it reads the docket, and a small state machine keeps
+#  only the text of the elements the function needs.  Sequence rows are
+#  built as each <sequence> closes.
+#
+#  They give the same errors and results as the tree-based functions in
+#  saved_functions.py.  To use them, pick the "target" backend:
+#
+#    AskADocket(conviction_information, backend="target")
+#
+#  TARGET_EXTRACTORS lists the saved functions that have a target version.
+#  guilty_sentences() is the target version of what
+#  scripts/guilty_records_query.py's Docket reads; see its backend option.
+
+from lxml import etree
+
+from DocketQuery.errors import error_code, field_path
+from DocketQuery import saved_functions
+from DocketQuery.extraction import sentence_days, ACTION_FIELDS, SENTENCE_NAMES
+
+HEADER_PATHS = {
+  ("docket", "header", "caption", "defendant"): "defendant_name",
+  ("docket", "header", "docket_number"): "docket number",
+  ("docket", "section[@name='Defendant_Information']", "defendant_information", "birth_date"): "birth_date",
+  ("docket", "section[@name='Case_Information']", "case_info", "date_initiated"): "date_initiated",
+  ("docket", "section[@name='Case_Information']", "case_info", "date_filed"): "date_filed",
+}
+# The order docket_num_name_age reports errors in, and its result keys.
+HEADER_FIELDS = [("defendant_name", "defendant_name"), ("docket number", "docket_number"),
+                 ("birth_date", "birth_date"), ("date_initiated", "date_initiated"),
+                 ("date_filed", "date_filed")]
+SEQUENCE_FIELDS = {"sequence_description", "code_section", "grade", "offense_disposition"}
+SENTENCE_PATHS = {("program",): "program",
+                  ("length_of_sentence", "min_length", "time"): "min_time",
+                  ("length_of_sentence", "min_length", "unit"): "min_unit",
+                  ("length_of_sentence", "max_length", "time"): "max_time",
+                  ("length_of_sentence", "max_length", "unit"): "max_unit"}
+
+
+def first_text(texts, keep_blank_text=False):
+  # Input: The [first text, pieces of the current text, has children] of an
+  #        element being read, and whether the tree it stands in for keeps
+  #        whitespace-only text between child elements.
+  # Output: Its first text node so far, as xpath("text()")[0] would find it.
+  #         docket_query.parse_docket drops that whitespace; a plain
+  #         etree.parse keeps it.
+  if texts[0] is None and texts[1]:
+    text = "".join(texts[1])
+    if keep_blank_text or not texts[2] or text.strip():
+      texts[0] = text
+  texts[1] = []
+  return texts[0]
+
+
+class HeaderTarget:
+  # Collects the header fields of docket_num_name_age.  The first text
+  # found for a path wins, as with xpath("...text()")[0].
+  keep_blank_text = False
+
+  def __init__(self, file_name):
+    self.file_name = file_name
+    self.stack = []
+    self.texts = []   # For each element in the stack, see first_text.
+    self.header = {}
+
+  def start(self, tag, attrib):
+    if tag == "section" and "name" in attrib:
+      tag = "section[@name='{}']".format(attrib["name"])
+    if self.texts:
+      # The text before a child is settled; text after it is a new node.
+      parent = self.texts[-1]
+      parent[2] = True
+      first_text(parent, self.keep_blank_text)
+    self.stack.append(tag)
+    self.texts.append([None, [], False])
+
+  def data(self, data):
+    self.texts[-1][1].append(data)
+
+  def end(self, tag):
+    text = first_text(self.texts.pop(), self.keep_blank_text)
+    if len(self.stack) <= 4 and text is not None:
+      field = HEADER_PATHS.get(tuple(self.stack))
+      if field is not None and field not in self.header:
+        self.header[field] = text.strip()
+    self.stack.pop()
+    return text
+
+  def header_info(self):
+    # Output: The errors and the single result of docket_num_name_age.
+    errors = []
+    info = {}
+    for field, key in HEADER_FIELDS:
+      if field in self.header:
+        info[key] = self.header[field]
+      else:
+        errors.append({"error_file": self.file_name, "error_field": field,
+                       "message": error_code(IndexError())})
+        info[key] = "unknown"
+    return errors, [info]
+
+  def close(self):
+    return self.header_info()
+
+
+class ConvictionTarget(HeaderTarget):
+  # Collects the rows of conviction_information.
+
+  def __init__(self, file_name):
+    HeaderTarget.__init__(self, file_name)
+    self.sequence = None      # The sequence being read, and its depth.
+    self.sequence_depth = None
+    self.action = None
+    self.sentence = None
+    self.guilty_count = 0
+    self.sequence_rows = []   # (sequence_info, action rows) per guilty sequence.
+    self.sequence_errors = []
+
+  def start(self, tag, attrib):
+    HeaderTarget.start(self, tag, attrib)
+    depth = len(self.stack)
+    if tag == "sequence" and self.sequence is None:
+      self.sequence = {"actions": []}
+      self.sequence_depth = depth
+    elif self.sequence is not None:
+      if tag == "judge_action" and depth == self.sequence_depth + 1:
+        self.action = {"sentences": []}
+        self.sequence["actions"].append(self.action)
+      elif tag == "sentence_info" and self.action is not None \
+           and depth == self.sequence_depth + 2:
+        self.sentence = {"has_length": False}
+        self.action["sentences"].append(self.sentence)
+      elif tag == "length_of_sentence" and self.sentence is not None \
+           and depth == self.sequence_depth + 3:
+        self.sentence["has_length"] = True
+
+  def end(self, tag):
+    depth = len(self.stack)
+    text = HeaderTarget.end(self, tag)
+    if self.sequence is None:
+      return
+    if depth == self.sequence_depth:
+      self.end_sequence()
+    elif depth == self.sequence_depth + 1:
+      if tag in SEQUENCE_FIELDS:
+        self.set_first(self.sequence, tag, text, tag == "offense_disposition")
+      elif tag == "judge_action":
+        self.action = None
+    elif self.action is not None and depth == self.sequence_depth + 2:
+      if tag in ("judge_name", "date"):
+        self.set_first(self.action, tag, text)
+      elif tag == "sentence_info":
+        self.sentence = None
+    elif self.sentence is not None:
+      path = tuple(self.stack[self.sequence_depth + 2:]) + (tag,)
+      field = SENTENCE_PATHS.get(path)
+      if field is not None:
+        self.set_first(self.sentence, field, text)
+
+  def set_first(self, record, field, text, keep_empty=False):
+    # text()[0] is the first element of the field that has text.  For the
+    # disposition, contains() looks at the first element, text or not.
+    if field in record:
+      return
+    if text is not None:
+      record[field] = text
+    elif keep_empty:
+      record[field] = ""
+
+  def end_sequence(self):
+    sequence = self.sequence
+    self.sequence = self.sequence_depth = self.action = self.sentence = None
+    if "Guilty" not in sequence.get("offense_disposition", ""):
+      return
+    if not any(sentence["has_length"] for action in sequence["actions"]
+               for sentence in action["sentences"]):
+      return
+    self.add_sequence(sequence)
+
+  def add_sequence(self, sequence):
+    # Makes the rows of a guilty sequence.
+    i = self.guilty_count
+    self.guilty_count += 1
+    errors = self.sequence_errors
+    sequence_info = {}
+    for tag, key in [("sequence_description", "charge_desc"),
+                     ("code_section", "charge_section"), ("grade", "grade")]:
+      if tag in sequence:
+        sequence_info[key] = sequence[tag].strip()
+      else:
+        errors.append({"error_file": self.file_name,
+                       "error_field": field_path("sequence_{}/{}".format(i, key)),
+                       "message": error_code(IndexError())})
+        sequence_info[key] = "unknown"
+    rows = []
+    actions = [action for action in sequence["actions"] if action["sentences"]]
+    for i2, action in enumerate(actions):
+      action_info = {}
+      for tag, key, name in [("judge_name", "judge_name", "judge_name"),
+                             ("date", "action_date", "date")]:
+        if tag in action:
+          action_info[key] = action[tag].strip()
+        else:
+          errors.append({"error_file": self.file_name,
+                         "error_field": field_path("sequence_{}/action_{}/{}".format(i, i2, name)),
+                         "message": error_code(IndexError())})
+          action_info[key] = "unknown"
+      for i3, sentence in enumerate(action["sentences"]):
+        sentence_info = dict(action_info)
+        if "program" in sentence:
+          sentence_info["program"] = sentence["program"].strip()
+        else:
+          errors.append({"error_file": self.file_name,
+                         "error_field": field_path("sequence_{}/action_{}/sentence_{}/program".format(i, i2, i3)),
+                         "message": error_code(IndexError())})
+          sentence_info["program"] = "unknown"
+        for bound in ["min", "max"]:
+          try:
+            sentence_info[bound + "_time"] = sentence_days(sentence.get(bound + "_time"),
+                                                           sentence.get(bound + "_unit"))
+          except Exception as e:
+            errors.append({"error_file": self.file_name,
+                           "error_field": field_path("sequence_{}/action_{}/sentence_{}/{}_time".format(i, i2, i3, bound)),
+                           "message": error_code(e)})
+            sentence_info[bound + "_time"] = "unknown"
+        rows.append(sentence_info)
+    self.sequence_rows.append((sequence_info, rows))
+
+  def close(self):
+    errors, basic_info = self.header_info()
+    results = []
+    for sequence_info, rows in self.sequence_rows:
+      for row in rows:
+        result = dict(basic_info[0])
+        result.update(sequence_info)
+        result.update(row)
+        results.append(result)
+    return errors + self.sequence_errors, results
+
+
+def _stripped(text):
+  return None if text is None else text.strip()
+
+
+class GuiltySentencesTarget(ConvictionTarget):
+  # Collects the header fields and guilty sequences in the layout of
+  # extraction.header_text and extraction.guilty_sentences, for
+  # guilty_records_query's Docket, which parses without dropping blank text.
+  keep_blank_text = True
+
+  def __init__(self, file_name):
+    ConvictionTarget.__init__(self, file_name)
+    self.sequences = []
+
+  def add_sequence(self, sequence):
+    fields = {tag: _stripped(sequence.get(tag)) for tag in SEQUENCE_FIELDS}
+    actions = []
+    for action in sequence["actions"]:
+      if action["sentences"]:
+        actions.append(({field: _stripped(action.get(field)) for field in ACTION_FIELDS},
+                        [{name: _stripped(sentence.get(name)) for name in SENTENCE_NAMES}
+                         for sentence in action["sentences"]]))
+    self.sequences.append((fields, actions))
+
+  def close(self):
+    header = {key: self.header.get(field) for field, key in HEADER_FIELDS}
+    return header, self.sequences
+
+
+def extract(target_class, docket, file_name):
+  # Input: A target class, a path to (or file object of) a docket, and the
+  #        name to report errors under.
+  # Output: The errors and results of the target.
+  parser = etree.XMLParser(target=target_class(file_name))
+  return etree.parse(docket, parser)
+
+
+def docket_num_name_age(docket, file_name):
+  return extract(HeaderTarget, docket, file_name)
+
+
+def conviction_information(docket, file_name):
+  return extract(ConvictionTarget, docket, file_name)
+
+
+def guilty_sentences(docket):
+  # Input: A path to (or file object of) a docket.
+  # Output: A dict of its header fields, by the names in
+  #         extraction.HEADER_QUERIES (None where missing), and what
+  #         extraction.guilty_sentences finds in it.
+  return extract(GuiltySentencesTarget, docket, None)
+
+
+TARGET_EXTRACTORS = {
+  saved_functions.docket_num_name_age: docket_num_name_age,
+  saved_functions.conviction_information: conviction_information,
+}
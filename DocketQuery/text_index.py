@@ -0,0 +1,242 @@
+#  This file keeps an on-disk inverted index of the free text in dockets:
+#  each sequence's description and each sentence's extra_sentence_details
+#  (and program).  Rows come from saved_functions.sentence_texts, one per
+#  sentence, and every word in them points back to its row:
+#
+#    index = TextIndex("texts.sqlite")
+#    index.add_files(list_dockets(dir), workers=4)   # only new or changed files are read
+#    index.search("house arrest")                   # rows with both words
+#    index.search("life time registration", phrase=True)
+#
+#  add_files reads the dockets in a pass of its own.  To index them while
+#  they are scraped for other things, give a pipeline stage running
+#  sentence_texts a text_index (see pipeline.py): its rows are added to the
+#  index chunk by chunk, with the same file signatures, so a later add_files
+#  skips those files.
+#
+#  The index is an sqlite file.  Adding files is incremental: files already
+#  in the index with the same size and modification time are skipped, files
+#  that changed since are reindexed, and files that couldn't be scraped are
+#  left out, to be tried again next time.  Indexes built separately (per
+#  partition, per machine) can be merged into one with merge(), which keeps
+#  the newer version of a file that both have.  Rows are looked up through
+#  the term table's primary key, so a search reads only the postings of its
+#  terms.
+
+import os
+import re
+import sqlite3
+
+from DocketQuery.docket_query import AskADocket, map_chunks
+from DocketQuery.saved_functions import sentence_texts
+
+TEXT_FIELDS = ("sequence_description", "extra_sentence_details", "program")
+ROW_FIELDS = ("file", "docket_number", "sequence", "action", "sentence",
+              "sequence_description", "offense_disposition", "program",
+              "extra_sentence_details")
+TOKEN = re.compile(r"[a-z0-9]+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (file TEXT PRIMARY KEY, size INTEGER, mtime REAL);
+CREATE TABLE IF NOT EXISTS rows (
+  id INTEGER PRIMARY KEY, file TEXT, docket_number TEXT, sequence INTEGER,
+  action INTEGER, sentence INTEGER, sequence_description TEXT,
+  offense_disposition TEXT, program TEXT, extra_sentence_details TEXT);
+CREATE TABLE IF NOT EXISTS postings (
+  term TEXT, field TEXT, row_id INTEGER,
+  PRIMARY KEY (term, field, row_id)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rows_file ON rows (file);
+"""
+
+
+def tokenize(text):
+  # Input: A string.
+  # Output: Its words, lowercased, in order.  Punctuation separates words.
+  if not text:
+    return []
+  return TOKEN.findall(text.lower())
+
+
+def file_signature(file):
+  # Input: A docket path.
+  # Output: Its (size, modification time), or (None, None) if it can't be
+  #         stat-ed.  A file whose signature changed is reindexed.
+  try:
+    status = os.stat(file)
+  except (OSError, TypeError, ValueError):
+    return None, None
+  return status.st_size, status.st_mtime
+
+
+def index_chunk(job):
+  # Input: A tuple of an AskADocket and a list of docket paths.  (One
+  #        argument, so it can be mapped over a Pool.)
+  # Output: The errors, a list of (file, signature, rows) for each docket
+  #         that was scraped, and the counts for the chunk.  Like
+  #         docket_query.scrape_chunk, but the rows stay with their file, so
+  #         dockets that fail aren't marked as indexed.
+  scraper, files = job
+  errors = []
+  scraped = []
+  for file in files:
+    signature = file_signature(file)
+    try:
+      file_errors, rows = scraper.scrape_docket(file)
+    except Exception as e:
+      print("Error while parsing {}.".format(file))
+      print(e)
+      continue
+    errors += file_errors
+    scraped.append((file, signature, rows))
+  return errors, scraped, {"total_dockets_scraped": len(files), "successes": len(scraped)}
+
+
+class TextIndex:
+  # Input: The path of the index file, which is created if it doesn't exist.
+
+  def __init__(self, path):
+    self.path = path
+    self.connection = sqlite3.connect(path)
+    self.connection.executescript(SCHEMA)
+
+  def close(self):
+    self.connection.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def files(self):
+    # Output: The set of files in the index.
+    return {file for (file,) in self.connection.execute("SELECT file FROM files")}
+
+  def signatures(self):
+    # Output: A dict of the files in the index to their (size, mtime) when
+    #         they were indexed.
+    return {file: (size, mtime)
+            for file, size, mtime in self.connection.execute("SELECT file, size, mtime FROM files")}
+
+  def __len__(self):
+    # Output: The number of rows in the index.
+    return self.connection.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+  def remove(self, file):
+    # Input: A file.  If it is in the index, it is deleted with its rows and
+    #        their postings, in the caller's transaction.
+    old_rows = self.connection.execute(
+      "SELECT id, {} FROM rows WHERE file = ?".format(", ".join(TEXT_FIELDS)), (file,)).fetchall()
+    for row_id, *texts in old_rows:
+      self.connection.executemany(
+        "DELETE FROM postings WHERE term = ? AND field = ? AND row_id = ?",
+        [(term, field, row_id) for field, text in zip(TEXT_FIELDS, texts)
+         for term in set(tokenize(text))])
+    self.connection.execute("DELETE FROM rows WHERE file = ?", (file,))
+    self.connection.execute("DELETE FROM files WHERE file = ?", (file,))
+
+  def add(self, scraped):
+    # Input: A list of (file, signature, rows), as index_chunk returns them,
+    #        with the rows as sentence_texts returns them.  A file that is
+    #        already in the index has its old rows replaced.
+    # The batch is committed as one transaction, so a file is either fully
+    # in the index or not at all.
+    with self.connection:
+      for file, (size, mtime), rows in scraped:
+        self.remove(file)
+        self.connection.execute("INSERT INTO files VALUES (?, ?, ?)", (file, size, mtime))
+        for row in rows:
+          cursor = self.connection.execute(
+            "INSERT INTO rows ({}) VALUES ({})".format(", ".join(ROW_FIELDS),
+                                                       ", ".join("?" * len(ROW_FIELDS))),
+            [row[field] for field in ROW_FIELDS])
+          row_id = cursor.lastrowid
+          self.connection.executemany(
+            "INSERT OR IGNORE INTO postings VALUES (?, ?, ?)",
+            [(term, field, row_id) for field in TEXT_FIELDS for term in set(tokenize(row[field]))])
+
+  def add_files(self, files, workers=1, chunksize=100):
+    # Input: Paths to parsed dockets, and the number of worker processes to
+    #        scrape them with.  Files already in the index are skipped,
+    #        unless their size or modification time changed.
+    # Output: The errors, and counts with the number of "files_skipped".
+    #         Workers only scrape; rows are written here, one chunk (and
+    #         one transaction) at a time.  Files that fail to scrape aren't
+    #         added, so they are tried again by the next add_files.
+    files = list(files)
+    indexed = self.signatures()
+    new_files = [file for file in files if indexed.get(file) != file_signature(file)]
+    scraper = AskADocket(sentence_texts)
+    jobs = [(scraper, new_files[i:i + chunksize])
+            for i in range(0, len(new_files), chunksize)]
+    errors = []
+    counts = {"total_dockets_scraped": 0, "successes": 0,
+              "files_skipped": len(files) - len(new_files)}
+    for chunk_errors, scraped, chunk_counts in map_chunks(index_chunk, jobs, workers):
+      self.add(scraped)
+      errors += chunk_errors
+      for key in ("total_dockets_scraped", "successes"):
+        counts[key] += chunk_counts[key]
+    return errors, counts
+
+  def merge(self, other_path):
+    # Input: The path of another index.  Its files that aren't in this
+    #        index are copied in, with their rows and postings, and so are
+    #        files whose signature differs from this index's and that were
+    #        modified later there, which replace this index's rows for them.
+    connection = self.connection
+    connection.execute("ATTACH DATABASE ? AS other", (other_path,))
+    try:
+      with connection:
+        connection.execute(
+          "CREATE TEMP TABLE new_files AS SELECT o.file FROM other.files o "
+          "LEFT JOIN main.files m ON m.file = o.file "
+          "WHERE m.file IS NULL OR ((o.size IS NOT m.size OR o.mtime IS NOT m.mtime) "
+          "AND o.mtime > COALESCE(m.mtime, -1))")
+        for (file,) in connection.execute("SELECT file FROM new_files").fetchall():
+          self.remove(file)
+        offset = connection.execute("SELECT COALESCE(MAX(id), 0) FROM rows").fetchone()[0]
+        connection.execute("INSERT INTO main.files SELECT file, size, mtime FROM other.files "
+                           "WHERE file IN (SELECT file FROM new_files)")
+        connection.execute(
+          "INSERT INTO main.rows SELECT id + ?, {0} FROM other.rows "
+          "WHERE file IN (SELECT file FROM new_files)".format(", ".join(ROW_FIELDS)), (offset,))
+        connection.execute(
+          "INSERT OR IGNORE INTO main.postings SELECT p.term, p.field, p.row_id + ? "
+          "FROM other.postings p JOIN other.rows r ON r.id = p.row_id "
+          "WHERE r.file IN (SELECT file FROM new_files)", (offset,))
+        connection.execute("DROP TABLE new_files")
+    finally:
+      connection.execute("DETACH DATABASE other")
+
+  def search(self, query, fields=TEXT_FIELDS, phrase=False, limit=None):
+    # Input: Words to look for, the fields to look in, whether the words
+    #        must appear together in that order in one field, and
+    #        optionally the most rows to return.
+    # Output: A list of row dicts (see ROW_FIELDS) that have every word of
+    #         the query in the fields, in the order they were added.
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+      return []
+    fields = list(fields)
+    sql = ("SELECT {} FROM rows WHERE id IN ("
+           "SELECT row_id FROM postings WHERE term IN ({}) AND field IN ({}) "
+           "GROUP BY row_id HAVING COUNT(DISTINCT term) = ?) ORDER BY id").format(
+             ", ".join(ROW_FIELDS), ", ".join("?" * len(terms)), ", ".join("?" * len(fields)))
+    rows = (dict(zip(ROW_FIELDS, values))
+            for values in self.connection.execute(sql, terms + fields + [len(terms)]))
+    results = []
+    words = tokenize(query)
+    for row in rows:
+      if phrase and not any(contains_phrase(tokenize(row[field]), words) for field in fields):
+        continue
+      results.append(row)
+      if limit is not None and len(results) >= limit:
+        break
+    return results
+
+
+def contains_phrase(tokens, words):
+  # Output: True if words appear in tokens, together and in order.
+  n = len(words)
+  return any(tokens[i:i + n] == words for i in range(len(tokens) - n + 1))
@@ -0,0 +1,199 @@
+#  This file contains two tools for checking what gets scraped from dockets.
+#
+#  1) A LayoutProfile learns which element paths occur in a corpus, and in
+#     which docket variants (dockets with different sets of sections).
+#     Extractors can use it to skip xpath queries for paths that no docket
+#     of the variant at hand has (see skippable), and it shows which fields
+#     a corpus can't provide at all.
+#
+#  2) A Schema describes the type of each field of a record.  validate()
+#     checks the records of one docket against it one field (column) at a
+#     time, and returns errors in the same form the extractors report them.
+
+import datetime
+import json
+import re
+
+from lxml import etree
+
+SECTION_PREDICATE = "[@name='{}']"
+
+
+def element_paths(tree):
+  # Input: A docket as an ElementTree.
+  # Output: The set of paths of the elements in it, without positions, e.g.
+  #         "/docket/section[@name='Case_Information']/case_info/date_filed".
+  #         Sections are told apart by name, the way the extractors' xpath
+  #         queries tell them apart.
+  paths = set()
+  root = tree.getroot() if hasattr(tree, "getroot") else tree
+  stack = [(root, "/" + root.tag)]
+  while stack:
+    element, path = stack.pop()
+    paths.add(path)
+    for child in element:
+      if not isinstance(child.tag, str):
+        continue  # Comments and processing instructions.
+      child_path = path + "/" + child.tag
+      if child.tag == "section" and child.get("name"):
+        child_path += SECTION_PREDICATE.format(child.get("name"))
+      stack.append((child, child_path))
+  return paths
+
+
+def docket_variant(tree):
+  # Input: A docket as an ElementTree.
+  # Output: A tuple of the names of its sections, in sorted order.
+  return tuple(sorted(set(tree.xpath("/docket/section/@name"))))
+
+
+class LayoutProfile:
+  # Counts of the element paths seen in each docket variant.
+
+  def __init__(self):
+    self.variants = {}
+
+  def add(self, tree):
+    paths = element_paths(tree)
+    variant = docket_variant(tree)
+    profile = self.variants.setdefault(variant, {"dockets": 0, "paths": {}})
+    profile["dockets"] += 1
+    for path in paths:
+      profile["paths"][path] = profile["paths"].get(path, 0) + 1
+    return variant
+
+  def add_files(self, files):
+    # Input: An iterable of docket paths.  Dockets that can't be parsed are
+    #        skipped.
+    for file in files:
+      try:
+        self.add(etree.parse(file))
+      except (OSError, etree.XMLSyntaxError) as e:
+        print("Error while profiling {}.".format(file))
+        print(e)
+    return self
+
+  def seen(self, path, variant=None):
+    # Input: An element path (see element_paths) and optionally a variant.
+    # Output: True if some docket (of that variant) has the path.
+    variants = [self.variants.get(variant, {"paths": {}})] if variant is not None \
+               else self.variants.values()
+    return any(path in profile["paths"] for profile in variants)
+
+  def skippable(self, path, variant=None):
+    # Input: An element path and optionally the variant of the docket it
+    #        would be looked up in (see docket_variant).
+    # Output: True if no profiled docket has the path, or if the variant was
+    #         profiled and none of its dockets have it.  A variant that
+    #         wasn't profiled only skips paths no docket has.
+    if not self.seen(path):
+      return True
+    return variant in self.variants and not self.seen(path, variant)
+
+  def seen_tag(self, tag, variant=None):
+    # Input: An element name and optionally a variant.
+    # Output: True if some docket (of that variant) has an element by that
+    #         name anywhere.
+    variants = [self.variants.get(variant, {"paths": {}})] if variant is not None \
+               else self.variants.values()
+    end = "/" + tag
+    return any(path.endswith(end) for profile in variants for path in profile["paths"])
+
+  def coverage(self, path):
+    # Output: The share of all profiled dockets that have the path.
+    dockets = sum(profile["dockets"] for profile in self.variants.values())
+    having = sum(profile["paths"].get(path, 0) for profile in self.variants.values())
+    return having / dockets if dockets else 0.0
+
+  def save(self, path):
+    with open(path, "w") as f:
+      json.dump([{"variant": list(variant), "dockets": profile["dockets"],
+                  "paths": profile["paths"]}
+                 for variant, profile in self.variants.items()], f, indent=1)
+
+  @classmethod
+  def load(cls, path):
+    profile = cls()
+    with open(path) as f:
+      for entry in json.load(f):
+        profile.variants[tuple(entry["variant"])] = {"dockets": entry["dockets"],
+                                                     "paths": entry["paths"]}
+    return profile
+
+
+def query_path(query_string):
+  # Input: An absolute xpath query like ".../date_filed/text()".
+  # Output: The element path it selects, in the form of element_paths.
+  return re.sub(r"/text\(\)$", "", query_string)
+
+
+# Field types.  Each is a function of a column (a list of values) that
+# returns the positions of the invalid values.
+
+def text_field(column):
+  return [i for i, value in enumerate(column)
+          if not isinstance(value, str) or not value or "unknown" in value]
+
+def date_field(column):
+  invalid = []
+  for i, value in enumerate(column):
+    if isinstance(value, datetime.date):
+      continue
+    try:
+      datetime.datetime.strptime(value, "%m/%d/%Y")
+    except (TypeError, ValueError):
+      invalid.append(i)
+  return invalid
+
+def length_field(column):
+  # A sentence length as a timedelta.  A zero length is what convert_time
+  # returns when it can't read the time, so it is invalid.
+  return [i for i, value in enumerate(column)
+          if not isinstance(value, datetime.timedelta) or value == datetime.timedelta(0)]
+
+def days_field(column):
+  return [i for i, value in enumerate(column)
+          if isinstance(value, bool) or not isinstance(value, (int, float))]
+
+
+class Schema:
+  # Input: A dict of field name -> field type (a function above).
+
+  def __init__(self, fields):
+    self.fields = dict(fields)
+
+  def invalid(self, records):
+    # Input: A list of record dicts.
+    # Output: A sorted list of (record position, field) pairs for the
+    #         values that are missing or don't have the field's type.
+    invalid = []
+    for field, check in self.fields.items():
+      column = [record.get(field) for record in records]
+      invalid += [(i, field) for i in check(column)]
+    invalid.sort(key=lambda pair: pair[0])
+    return invalid
+
+
+GUILTY_RECORD_SCHEMA = Schema({
+  "docket_number": text_field, "date_filed": date_field,
+  "defendant_name": text_field, "birth_date": date_field,
+  "judge": text_field, "action_date": date_field, "charge": text_field,
+  "disposition": text_field, "sentence_program": text_field,
+  "min_length": length_field, "max_length": length_field})
+
+CONVICTION_SCHEMA = Schema({
+  "docket_number": text_field, "defendant_name": text_field,
+  "birth_date": date_field, "date_initiated": date_field,
+  "date_filed": date_field, "charge_desc": text_field,
+  "charge_section": text_field, "grade": text_field,
+  "judge_name": text_field, "action_date": date_field,
+  "program": text_field, "min_time": days_field, "max_time": days_field})
+
+
+def validate(records, schema, file_name, file_key="file"):
+  # Input: The records of a docket, a Schema, the file they came from and the
+  #        key to report the file under ("file" for guilty_records_query,
+  #        "error_file" for saved functions).
+  # Output: A list of error dicts, one per invalid value, in record order.
+  return [{file_key: file_name, "error_field": field}
+          for i, field in schema.invalid(records)]
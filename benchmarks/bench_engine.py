@@ -0,0 +1,49 @@
+#  Benchmarks the extraction engine in extraction.py against the code it
+#  replaced (the reference copies in tests/test_extraction.py), for both of
+#  its users: saved_functions.conviction_information, from a parsed tree,
+#  and guilty_records_query's Docket.get_guilty_sequence_records, from a
+#  path (its own parse included).
+#
+#  Usage:
+#    python -m benchmarks.bench_engine [number of dockets]
+
+import sys
+import time
+
+from DocketQuery.docket_query import parse_docket
+from DocketQuery.saved_functions import conviction_information
+from DocketQuery.synthetic import write_corpus
+from tests.test_extraction import reference_conviction_information, \
+                                  reference_guilty_sequence_records, guilty_sequence_records
+
+CORPUS = "tests/output/bench_corpus/"
+
+
+def time_per_docket(function, items, repeat=3):
+  # The best of `repeat` runs over the items, per item.
+  best = None
+  for _ in range(repeat):
+    started = time.perf_counter()
+    for item in items:
+      function(*item)
+    elapsed = time.perf_counter() - started
+    best = elapsed if best is None else min(best, elapsed)
+  return best / len(items)
+
+
+def run(count=500):
+  files = write_corpus(CORPUS, count, seed=0)
+  trees = [(parse_docket(path), path) for path in files]
+  paths = [(path,) for path in files]
+  print("{} dockets".format(count))
+  for name, old, new, items in [
+      ("conviction_information", reference_conviction_information, conviction_information, trees),
+      ("guilty_sequence_records", reference_guilty_sequence_records, guilty_sequence_records, paths)]:
+    old_time = time_per_docket(old, items)
+    new_time = time_per_docket(new, items)
+    print("{:24s} old {:8.1f} us  new {:8.1f} us  {:.2f}x".format(
+      name, old_time * 1e6, new_time * 1e6, old_time / new_time))
+
+
+if __name__ == "__main__":
+  run(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
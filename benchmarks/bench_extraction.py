@@ -0,0 +1,51 @@
+#  Benchmarks the saved functions on a synthetic corpus.
+#
+#  For each function this reports the time per docket to parse and extract,
+#  the time per docket to extract from an already parsed tree, and the peak
+#  memory allocated (by tracemalloc) while extracting from one docket.
+#
+#  Usage:
+#    python -m benchmarks.bench_extraction [number of dockets]
+
+import sys
+import time
+import tracemalloc
+
+from DocketQuery.docket_query import parse_docket
+from DocketQuery.saved_functions import docket_num_name_age, conviction_information
+from DocketQuery.synthetic import write_corpus
+
+CORPUS = "tests/output/bench_corpus/"
+
+
+def time_per_docket(function, items):
+  started = time.perf_counter()
+  for item in items:
+    function(item)
+  return (time.perf_counter() - started) / len(items)
+
+
+def peak_bytes_per_docket(function, items):
+  peaks = []
+  for item in items:
+    tracemalloc.start()
+    function(item)
+    peaks.append(tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+  return sum(peaks) / len(peaks)
+
+
+def run(count=500):
+  files = write_corpus(CORPUS, count, seed=0)
+  trees = [(parse_docket(path), path) for path in files]
+  print("{} dockets".format(count))
+  for function in [docket_num_name_age, conviction_information]:
+    parse_and_extract = time_per_docket(lambda path: function(parse_docket(path), path), files)
+    extract = time_per_docket(lambda pair: function(*pair), trees)
+    peak = peak_bytes_per_docket(lambda pair: function(*pair), trees[:100])
+    print("{:24s} parse+extract {:8.1f} us  extract {:8.1f} us  peak {:8.0f} bytes".format(
+      function.__name__, parse_and_extract * 1e6, extract * 1e6, peak))
+
+
+if __name__ == "__main__":
+  run(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
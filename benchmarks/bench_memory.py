@@ -0,0 +1,40 @@
+#  Reports the memory each saved function, and
+#  guilty_records_query.Docket.get_guilty_sequence_records, uses on a
+#  synthetic corpus: bytes retained per docket with the outputs kept, the
+#  peak while streaming, and the lines that allocated the retained memory
+#  (see DocketQuery/memory.py).  The budgets are checked by
+#  tests/test_memory.py.
+#
+#  Usage:
+#    python -m benchmarks.bench_memory [number of dockets]
+
+import sys
+
+from DocketQuery.docket_query import parse_docket
+from DocketQuery import saved_functions
+from DocketQuery.memory import profile, report
+from DocketQuery.synthetic import write_corpus
+from scripts.guilty_records_query import Docket
+
+CORPUS = "tests/output/bench_corpus/"
+FUNCTIONS = [saved_functions.docket_number_and_name, saved_functions.docket_num_name_age,
+             saved_functions.conviction_information, saved_functions.sentence_texts]
+
+
+def run(count=500):
+  files = write_corpus(CORPUS, count, seed=0)
+  extractors = [(function.__name__, lambda path, function=function: function(parse_docket(path), path))
+                for function in FUNCTIONS]
+  extractors.append(("Docket.get_guilty_sequence_records",
+                     lambda path: Docket(path).get_guilty_sequence_records()))
+  for name, extract in extractors:
+    extract(files[0])
+    kept = profile(extract, files)
+    streamed = profile(extract, files, keep=False)
+    print(report(name, kept))
+    print("  streaming: {:.0f} bytes retained, peak {:.1f} KiB".format(
+      streamed["retained_bytes"], streamed["peak_bytes"] / 1024))
+
+
+if __name__ == "__main__":
+  run(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,75 @@
+#  Compares scraping parsed xml files with scraping the same dockets from
+#  pack files (packs.py), whole and cut down to SAVED_FUNCTION_SECTIONS.
+#  Real dockets have sections no saved function reads (docket entries,
+#  calendar events ...), so the corpus is run twice: as generated, and with
+#  a section of `entries` docket entries added to each docket.
+#
+#  Usage:
+#    python -m benchmarks.bench_packs [number of dockets] [entries]
+
+import os
+import shutil
+import sys
+import time
+
+from DocketQuery.docket_query import AskADocket
+from DocketQuery.packs import convert_corpus, SAVED_FUNCTION_SECTIONS
+from DocketQuery.saved_functions import conviction_information
+from DocketQuery.synthetic import write_corpus
+
+CORPUS = "tests/output/bench_corpus/"
+PADDED_CORPUS = "tests/output/bench_padded_corpus/"
+PACKS = "tests/output/bench_packs/"
+ENTRY = """
+      <docket_entry>
+        <filed_date>01/{:02d}/2011</filed_date>
+        <entry_text>Order Granting Motion for Continuance</entry_text>
+        <filer>Court of Common Pleas</filer>
+      </docket_entry>"""
+
+
+def pad_corpus(files, directory, entries):
+  if not os.path.exists(directory):
+    os.makedirs(directory)
+  padded = []
+  section = '  <section name="Docket_Entry_Information">\n    <docket_entries>{}\n    </docket_entries>\n  </section>\n</docket>'.format(
+    "".join(ENTRY.format(i % 28 + 1) for i in range(entries)))
+  for path in files:
+    with open(path) as f:
+      text = f.read()
+    destination = os.path.join(directory, os.path.basename(path))
+    with open(destination, "w") as f:
+      f.write(text.replace("</docket>", section))
+    padded.append(destination)
+  return padded
+
+
+def seconds(function):
+  started = time.perf_counter()
+  function()
+  return time.perf_counter() - started
+
+
+def compare(files):
+  scraper = AskADocket(conviction_information)
+  xml = seconds(lambda: scraper.scrape_files(files))
+  print("  xml files          {:8.0f} dockets/s".format(len(files) / xml))
+  for label, sections in [("pack", None), ("pack, sections", SAVED_FUNCTION_SECTIONS)]:
+    shutil.rmtree(PACKS, ignore_errors=True)
+    convert = seconds(lambda: convert_corpus(files, PACKS, sections=sections))
+    packed = seconds(lambda: scraper.scrape_pack(PACKS))
+    size = sum(os.path.getsize(os.path.join(PACKS, name)) for name in os.listdir(PACKS))
+    print("  {:18s} {:8.0f} dockets/s ({:.2f}x), {:.0f} bytes/docket, converted in {:.2f}s".format(
+      label, len(files) / packed, xml / packed, size / len(files), convert))
+
+
+def run(count=2000, entries=40):
+  files = write_corpus(CORPUS, count, seed=0)
+  print("{} dockets, conviction_information".format(count))
+  compare(files)
+  print("with {} docket entries each".format(entries))
+  compare(pad_corpus(files, PADDED_CORPUS, entries))
+
+
+if __name__ == "__main__":
+  run(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,72 @@
+#  Compares file-order chunking with size-aware scheduling (scheduling.py)
+#  for a parallel scrape of a corpus where a few dockets are far bigger
+#  than the rest, as real corpora are.  For each, it reports the makespan
+#  (wall time of the run) and the workers' idle time: the time between a
+#  worker finishing its last chunk and the end of the run, summed over
+#  workers, as a share of workers * makespan.
+#
+#  Usage:
+#    python -m benchmarks.bench_scheduling [number of dockets] [workers]
+
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+from DocketQuery.docket_query import AskADocket, chunk_files, map_chunks, scrape_chunk
+from DocketQuery.saved_functions import conviction_information
+from DocketQuery.synthetic import random_docket
+
+CORPUS = "tests/output/bench_skewed_corpus/"
+
+
+def write_skewed_corpus(count, seed=0):
+  # Mostly small dockets, and one in 50 with up to 400 sequences.  The big
+  # ones have the highest docket numbers, so file order puts them last.
+  rng = random.Random(seed)
+  if not os.path.exists(CORPUS):
+    os.makedirs(CORPUS)
+  files = []
+  for i in range(count):
+    docket_number = "CP-51-CR-{:07d}-2011".format(i + 1)
+    big = i >= count - max(1, count // 50)
+    path = os.path.join(CORPUS, docket_number + "_stitched_complete.xml")
+    with open(path, "w") as f:
+      f.write(random_docket(rng, docket_number, max_sequences=400 if big else 4))
+    files.append(path)
+  return files
+
+
+def timed_scrape_chunk(job):
+  started = time.time()
+  scrape_chunk(job)
+  return os.getpid(), started, time.time()
+
+
+def run_schedule(files, workers, schedule, chunksize=50):
+  scraper = AskADocket(conviction_information)
+  jobs = [(scraper, chunk) for chunk in chunk_files(files, workers, chunksize, schedule)]
+  started = time.time()
+  spans = list(map_chunks(timed_scrape_chunk, jobs, workers))
+  ended = time.time()
+  makespan = ended - started
+  last = defaultdict(float)
+  for pid, chunk_started, chunk_ended in spans:
+    last[pid] = max(last[pid], chunk_ended)
+  idle = sum(ended - last.get(pid, started) for pid in list(last)[:workers])
+  idle += (workers - len(last)) * makespan
+  return makespan, idle / (workers * makespan), len(jobs)
+
+
+def run(count=3000, workers=4):
+  files = write_skewed_corpus(count)
+  print("{} dockets, {} workers, conviction_information".format(count, workers))
+  for label, schedule in [("file order", None), ("by size", "size")]:
+    makespan, idle, chunks = run_schedule(files, workers, schedule)
+    print("  {:10s} makespan {:6.2f}s, tail idle {:5.1f}%, {} chunks".format(
+      label, makespan, 100 * idle, chunks))
+
+
+if __name__ == "__main__":
+  run(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,36 @@
+#  Compares the tree backend of AskADocket with the parser target backend
+#  (targets.py) on a synthetic corpus, reporting dockets per second for
+#  each saved function that has a target version.
+#
+#  Usage:
+#    python -m benchmarks.bench_targets [number of dockets]
+
+import sys
+import time
+
+from DocketQuery.docket_query import AskADocket
+from DocketQuery.saved_functions import docket_num_name_age, conviction_information
+from DocketQuery.synthetic import write_corpus
+
+CORPUS = "tests/output/bench_corpus/"
+
+
+def dockets_per_second(scraper, files):
+  started = time.perf_counter()
+  for path in files:
+    scraper.scrape_docket(path)
+  return len(files) / (time.perf_counter() - started)
+
+
+def run(count=1000):
+  files = write_corpus(CORPUS, count, seed=0)
+  print("{} dockets".format(count))
+  for function in [docket_num_name_age, conviction_information]:
+    tree = dockets_per_second(AskADocket(function), files)
+    target = dockets_per_second(AskADocket(function, backend="target"), files)
+    print("{:24s} tree {:8.0f}/s  target {:8.0f}/s  ({:.2f}x)".format(
+      function.__name__, tree, target, target / tree))
+
+
+if __name__ == "__main__":
+  run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
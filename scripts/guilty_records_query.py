@@ -1,14 +1,18 @@
 from lxml import etree
 import datetime
-from fractions import Fraction
 import csv
 import os
 import glob
-import re
 import logging
 
 import pytest # For debugging.
 
+from DocketQuery.validation import GUILTY_RECORD_SCHEMA, validate, query_path, docket_variant
+from DocketQuery.extraction import HEADER_QUERIES, action_fields, day_count, \
+                                   guilty_sentences, header_text, sentence_fields
+from DocketQuery.saved_functions import get_actions_with_sentences # Once defined here too.
+from DocketQuery import targets
+
 """
 docket_query is a tool for retrieving information from a criminal docket that
 has been parsed into xml with docket_parse.
@@ -25,25 +29,54 @@ TODO: A user can't customize queries without editing this module. Maybe
       fix that?  Or call it a feature?
 """
 
-def query_directory(path, records_destination, errors_destination):
+RECORD_FIELDS = ["docket_number", "date_filed", "defendant_name", "birth_date", "judge",
+                 "action_date", "charge", "disposition", "sentence_program",
+                 "min_length", "max_length"]
+ERROR_FIELDS = ["file", "error_field"]
+
+def query_directory(path, records_destination, errors_destination, progress=None):
   """
-  In: A path to a directory containing xml files representing dockets and
-      a path to a file where the results will be saved. Should be a .csv
-      file.
-  Output: A list of dicts written and a list of errors that occurred.
+  In: A directory of xml files representing dockets (or a glob of them, like
+      "dockets/*"), paths to the .csv files for the records and the errors,
+      and optionally a DocketQuery.progress.Progress to report throughput to.
+  Output: The number of records written and the number of errors written.
+
+  Each file is opened once and gets a single header.  A docket's records and
+  errors are written as soon as it is read, so memory use doesn't grow with
+  the number of dockets.  A docket that can't be read is logged, counted as a
+  failure and skipped.
   """
-  records = []
-  errors = []
-  files_iterator = glob.iglob(path) #TODO: should make the glob more
-                                    #      restrictive.
-  for file in files_iterator:
-    docket = Docket(file)
-    new_records_list, new_errors = docket.get_guilty_sequence_records()
-    records = records + new_records_list
-    errors = errors + new_errors
-
-  write_guilty_sequence_records(records, records_destination, errors, errors_destination, mode="a")
-  return records, errors
+  if os.path.isdir(path):
+    path = os.path.join(path, "*.xml")
+  files = sorted(glob.glob(path))
+  records_written = 0
+  errors_written = 0
+  if progress is not None:
+    progress.start(len(files))
+  with open(records_destination, "w", newline='') as records_file, \
+       open(errors_destination, "w", newline='') as errors_file:
+    records_writer = csv.DictWriter(records_file, fieldnames=RECORD_FIELDS)
+    records_writer.writeheader()
+    errors_writer = csv.DictWriter(errors_file, fieldnames=ERROR_FIELDS)
+    errors_writer.writeheader()
+    for file in files:
+      try:
+        records, errors = Docket(file).get_guilty_sequence_records()
+      except (etree.XMLSyntaxError, OSError) as e:
+        logging.error("Could not read {}: {}".format(file, e))
+        records, errors, successes = [], [], 0
+      else:
+        successes = 1
+      records_writer.writerows(records)
+      errors_writer.writerows(errors)
+      records_written += len(records)
+      errors_written += len(errors)
+      if progress is not None:
+        progress.update({"total_dockets_scraped": 1, "successes": successes},
+                        rows=len(records), errors=len(errors))
+  if progress is not None:
+    progress.finish()
+  return records_written, errors_written
 
 def load_from_path(path):
   """
@@ -67,19 +100,10 @@ def convert_time(period, unit):
   """
   In: A period of time as a number and the unit of that number, as in:
       ("7 1/2", "years")
-  Out: A timedelta object of the input time period.
+  Out: A timedelta object of the input time period.  An unknown unit is
+       0 days.
   """
-  year_pattern = re.compile("year", flags=re.I)
-  month_pattern = re.compile("month", flags=re.I)
-  if re.search(year_pattern, unit) != None:
-    day_count = sum([float(Fraction(quantity)) * 365 for quantity in period.split()])
-  elif re.search(month_pattern, unit) != None:
-    day_count = sum([float(Fraction(quantity)) * 30.42 for quantity in period.split()])
-                # 30.41666 is the average length of a month in non
-                # leap-year.
-  else:
-    day_count=0
-  return datetime.timedelta(days=day_count)
+  return datetime.timedelta(days=day_count(period, unit) or 0)
 
 def scrape_sentence_info(sentence):
   """
@@ -104,14 +128,18 @@ def scrape_sentence_info(sentence):
          "min_length": <timedelta days=365>,
          "max_length": <timedelta days=365>}
   """
-  program = xpath_or_log(sentence, "program/text()", "program")
-  min_length_time = xpath_or_log(sentence, "length_of_sentence/min_length/time/text()", "min_length_time")
-  min_length_unit = xpath_or_log(sentence, "length_of_sentence/min_length/unit/text()", "min_length_unit")
-  max_length_time = xpath_or_log(sentence, "length_of_sentence/max_length/time/text()", "max_length_time")
-  max_length_unit = xpath_or_log(sentence, "length_of_sentence/max_length/unit/text()", "max_length_unit")
-  return {"sentence_program": program,
-          "min_length": convert_time(min_length_time, min_length_unit),
-          "max_length": convert_time(max_length_time, max_length_unit)}
+  return sentence_record(sentence_fields(sentence))
+
+def sentence_record(sentence):
+  """
+  Input: The fields of a sentence, as extraction.sentence_fields returns them.
+  Output: The dict scrape_sentence_info returns.
+  """
+  return {"sentence_program": or_unknown(sentence["program"], "program"),
+          "min_length": convert_time(or_unknown(sentence["min_time"], "min_length_time"),
+                                     or_unknown(sentence["min_unit"], "min_length_unit")),
+          "max_length": convert_time(or_unknown(sentence["max_time"], "max_length_time"),
+                                     or_unknown(sentence["max_unit"], "max_length_unit"))}
 
 def scrape_action(action):
   """
@@ -151,13 +179,19 @@ def scrape_action(action):
      "max_length": <timedelta object>
     }
   """
+  return action_records(*action_fields(action))
+
+def action_records(action, sentences):
+  """
+  Input: The fields of a judge_action and of its sentences, as
+         extraction.action_fields returns them.
+  Output: The list scrape_action returns.
+  """
+  base_action = {"judge": or_unknown(action["judge_name"], "judge"),
+                 "action_date": or_unknown(action["date"], "action_date")}
   actions = []
-  judge = xpath_or_log(action, "judge_name/text()", "judge")
-  date = xpath_or_log(action, "date/text()", "action_date")
-  base_action = {"judge":judge,
-                 "action_date":date}
-  for sentence in action.xpath("sentence_info"):
-    new_action = scrape_sentence_info(sentence)
+  for sentence in sentences:
+    new_action = sentence_record(sentence)
     new_action.update(base_action)
     actions.append(new_action)
   return actions
@@ -173,18 +207,14 @@ def write_guilty_sequence_records(records, records_destination, errors, errors_d
   Output: The list of dicts with the observations recorded.
   """
   with open(records_destination, mode, newline='') as csvfile:
-    fieldnames =  ["docket_number", "date_filed", "defendant_name", "birth_date", "judge", "action_date",
-                   "charge", "disposition", "sentence_program", "min_length",
-                   "max_length"]
-    writer = csv.DictWriter(csvfile, fieldnames = fieldnames)
+    writer = csv.DictWriter(csvfile, fieldnames = RECORD_FIELDS)
     writer.writeheader()
     for record in records:
       writer.writerow(record)
   csvfile.close()
 
   with open(errors_destination, mode, newline='') as errors_file:
-    fieldnames =["file", "error_field"]
-    writer = csv.DictWriter(errors_file, fieldnames = fieldnames)
+    writer = csv.DictWriter(errors_file, fieldnames = ERROR_FIELDS)
     writer.writeheader()
     for error in errors:
       writer.writerow(error)
@@ -199,16 +229,6 @@ def get_birth_date_and_created_date(docket):
   """
   pass
 
-def get_actions_with_sentences(sequence):
-  """
-  Input: An lxml Element representing a docket disposition sequence.
-  Output: A list of Elements such that each Element is:
-          1) a child of the disposition sequence,
-          2) a judge_action,
-          3) has a sentence_info child.
-  """
-  return sequence.xpath("judge_action[sentence_info]")
-
 def xpath_or_log(element, query_string, variable_sought):
   """
   This method is for retrieving a text value from an xml element.
@@ -232,25 +252,130 @@ def xpath_or_log(element, query_string, variable_sought):
     return "%s unknown" % variable_sought
 
 
+def or_unknown(value, variable_sought):
+  """
+  Input: A value from extraction.py, None if it wasn't found, and the name
+         of the variable, as for xpath_or_log.
+  Output: The value, or "[variable] unknown".
+  """
+  if value is None:
+    return "%s unknown" % variable_sought
+  return value
+
+
+HEADER_FIELDS = {
+  "docket_number": (HEADER_QUERIES["docket_number"].path, "docket_number"),
+  "defendant_name": (HEADER_QUERIES["defendant_name"].path, "defendant_name"),
+  "birth_date": (HEADER_QUERIES["birth_date"].path, "defendant_birthdate"),
+  "date_filed": (HEADER_QUERIES["date_filed"].path, "date_filed"),
+}
+
+
 class Docket():
+  """
+  A handle on a parsed docket.  Creating a Docket doesn't read the file;
+  it is parsed the first time a value is asked for, and each value (header
+  fields and the guilty sequence records) is only looked up once.
+
+  With release_tree=True the parsed tree is dropped after every lookup, so
+  a Docket only holds on to the values that were extracted.  To extract
+  several values with a single parse, use prefetch().
+
+  Given a validation.LayoutProfile of the corpus, header fields whose
+  elements never occur in the corpus are reported unknown without querying
+  (or parsing) the docket.  Once the docket is parsed, header fields and
+  guilty sequences that no profiled docket of its variant (its set of
+  sections) has are not queried either.
+
+  With backend="target", the guilty sequence records (and the header
+  fields) are read by a parser target that never builds a tree (see
+  DocketQuery/targets.py), with the same records and errors.  A value
+  that needs a tree still parses the docket.
+  """
+  __slots__ = ("path", "release_tree", "profile", "backend", "_tree", "_values")
 
-  def __init__(self, path):
+  def __init__(self, path, release_tree=False, profile=None, backend="tree"):
+    if backend not in ("tree", "target"):
+      raise ValueError("Unknown backend {}.".format(backend))
     self.path = path
-    self.tree = load_tree_from_path(path)
+    self.release_tree = release_tree
+    self.profile = profile
+    self.backend = backend
+    self._tree = None
+    self._values = {}
+
+  @property
+  def tree(self):
+    if self._tree is None:
+      self._tree = load_tree_from_path(self.path)
+    return self._tree
+
+  def release(self):
+    """
+    Drop the parsed tree.  It is parsed again if an uncached value is needed.
+    """
+    self._tree = None
+
+  def _done(self):
+    if self.release_tree:
+      self.release()
+
+  def _variant(self):
+    # The docket's validation.docket_variant, to look it up in the profile.
+    if "layout_variant" not in self._values:
+      self._values["layout_variant"] = docket_variant(self.tree)
+    return self._values["layout_variant"]
+
+  def _header_field(self, name, header=None):
+    # header: the header fields read by a parser target, if there are any.
+    if name not in self._values:
+      query_string, variable_sought = HEADER_FIELDS[name]
+      path = query_path(query_string)
+      if self.profile is not None and self.profile.skippable(path):
+        self._values[name] = "%s unknown" % variable_sought
+      elif header is not None:
+        self._values[name] = or_unknown(header[name], variable_sought)
+      elif self.profile is not None and self.profile.skippable(path, self._variant()):
+        self._values[name] = "%s unknown" % variable_sought
+      else:
+        self._values[name] = or_unknown(header_text(self.tree, name), variable_sought)
+    return self._values[name]
+
+  def prefetch(self, names=("docket_number", "defendant_name", "birth_date",
+                            "date_filed", "guilty_sequence_records")):
+    """
+    Input: The values to extract: names from HEADER_FIELDS and/or
+           "guilty_sequence_records".
+    Output: The Docket, with those values cached (and its tree released if
+            release_tree is set).
+    """
+    for name in names:
+      if name == "guilty_sequence_records":
+        self._guilty_sequence_records()
+      else:
+        self._header_field(name)
+    self._done()
+    return self
 
   def get_docket_number(self):
-    return xpath_or_log(self.tree, "/docket/header/docket_number/text()", "docket_number")
-
-
+    value = self._header_field("docket_number")
+    self._done()
+    return value
 
   def get_defendant_name(self):
-    return xpath_or_log(self.tree, "/docket/header/caption/defendant/text()", "defendant_name")
+    value = self._header_field("defendant_name")
+    self._done()
+    return value
 
   def get_defendant_birthdate(self):
-    return xpath_or_log(self.tree, "/docket/section[@name='Defendant_Information']/defendant_information/birth_date/text()", "defendant_birthdate")
+    value = self._header_field("birth_date")
+    self._done()
+    return value
 
   def get_date_filed(self):
-    return xpath_or_log(self.tree, "/docket/section[@name='Case_Information']/case_info/date_filed/text()", "date_filed")
+    value = self._header_field("date_filed")
+    self._done()
+    return value
 
   def get_guilty_sequence_records(self):
     """
@@ -275,55 +400,39 @@ class Docket():
     With these observations, I will be able to correlate sentence lengths,
     judges, and charges.
     """
+    records, errors = self._guilty_sequence_records()
+    self._done()
+    # Copies, so a caller that changes them doesn't change later answers.
+    return [dict(record) for record in records], [dict(error) for error in errors]
+
+  def _guilty_sequence_records(self):
+    if "guilty_sequence_records" in self._values:
+      return self._values["guilty_sequence_records"]
     records = [] #Initialize empty list of records.
 
     # Getting a few values that will be in every observation taken from this
     # docket.
-    base_record = {"docket_number": self.get_docket_number(),
-                   "defendant_name": self.get_defendant_name(),
-                   "birth_date" : self.get_defendant_birthdate(),
-                   "date_filed": self.get_date_filed()}
-
-    guilty_sequences = self.tree.xpath("//sequence[contains(./offense_disposition, 'Guilty') and (judge_action/sentence_info/length_of_sentence)]")
-    for sequence in guilty_sequences:
-       charge = xpath_or_log(sequence, "sequence_description/text()", "charge")
-       disposition = xpath_or_log(sequence, "offense_disposition/text()", "offense_disposition")
-       actions_with_sentences = get_actions_with_sentences(sequence)
-       for action in actions_with_sentences:
-         action_list = scrape_action(action)
-         for action_dict in action_list:
+    if self.backend == "target" and self._tree is None:
+      header, sequences = targets.guilty_sentences(self.path)
+    elif self.profile is not None and self._variant() in self.profile.variants \
+         and not self.profile.seen_tag("sequence", self._variant()):
+      header, sequences = None, []
+    else:
+      header, sequences = None, guilty_sentences(self.tree)
+    base_record = {"docket_number": self._header_field("docket_number", header),
+                   "defendant_name": self._header_field("defendant_name", header),
+                   "birth_date" : self._header_field("birth_date", header),
+                   "date_filed": self._header_field("date_filed", header)}
+
+    for sequence, actions in sequences:
+       charge = or_unknown(sequence["sequence_description"], "charge")
+       disposition = or_unknown(sequence["offense_disposition"], "offense_disposition")
+       for action, sentences in actions:
+         for action_dict in action_records(action, sentences):
            action_dict.update(base_record)
            action_dict.update({"charge":charge, "disposition":disposition})
            records.append(action_dict)
 
-    errors = []
-    for record in records:
-      for key, value in record.items():
-        if "length" not in key:
-          if "unknown" in value:
-            errors.append({"file": self.path,
-                           "error_field": key})
-        if key == "length":
-          if value==datetime.timedelta(days==0):
-            errors.append({"file": self.path,
-                           "error_field":key})
-
+    errors = validate(records, GUILTY_RECORD_SCHEMA, self.path)
+    self._values["guilty_sequence_records"] = (records, errors)
     return records, errors
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
@@ -1,17 +1,15 @@
 from scripts import guilty_records_query
+from DocketQuery.pipeline import Pipeline
+from DocketQuery.progress import Progress
 import sys
 import getopt
 import logging
 import yaml
 
 
-def get_parameters():
+def read_parameters():
   """
-  Returns the parameters needed for run():
-  1) Path of the source directory
-  2) Path of the destination directory
-  3) Path for the logging file for the results
-  4) Path for a separate csv for just errors
+  Reads the options and returns the parameters file, loaded.
   """
   usage_string = "user$ query_script.py -p <parameters_file.yaml>"
   try:
@@ -33,6 +31,19 @@ def get_parameters():
           destination_csv: <a path of new csv file to create with query results>
           logfile: <a path for the log to go>
           errorfile: <a path for the errorfile to go>
+          progress_interval: <optional, seconds between throughput reports>
+
+          or, to run saved functions, transforms and aggregations in one pass,
+          a pipeline (see DocketQuery/pipeline.py and scripts/example_pipeline.yaml):
+          pipeline:
+            input: {{directory: <a path to directory of parsed xml files>}}
+            workers: <number of worker processes>
+            batch_size: <dockets per worker chunk>
+            stages:
+              - function: <a saved function>
+                results: <a path for its results>
+          logfile: <optional, a path for the log to go>
+          progress_interval: <optional, seconds between throughput reports>
       """.format(usage_string))
       sys.exit(2)
     if opt=="-p":
@@ -42,17 +53,68 @@ def get_parameters():
     print("Must provide parameters file.")
     sys.exit(2)
 
-  params = yaml.load(open(parameters_file))
+  with open(parameters_file) as f:
+    return yaml.safe_load(f)
+
+def get_parameters(params=None):
+  """
+  Returns the parameters needed for run():
+  1) Path of the source directory
+  2) Path of the destination directory
+  3) Path for the logging file for the results
+  4) Path for a separate csv for just errors
+  5) Seconds between throughput reports
+  """
+  if params is None:
+    params = read_parameters()
   print("Params: {}, {}, {}, {}".format(params["parsed_xml"], params["destination_csv"], params["logfile"], params["errorfile"]))
 
-  return params["parsed_xml"], params["destination_csv"], params["logfile"], params["errorfile"]
+  return params["parsed_xml"], params["destination_csv"], params["logfile"], params["errorfile"], \
+         params.get("progress_interval", 10)
+
+def run_pipeline(spec, logfile=None, progress_interval=10):
+  """
+  Runs a pipeline spec (the "pipeline" section of the parameters file) in
+  one pass over its input, printing throughput every progress_interval
+  seconds.
+  Returns the pipeline's counts.
+  """
+  print("Starting...")
+  if logfile:
+    logging.basicConfig(filename=logfile, level=logging.DEBUG)
+  pipeline = Pipeline.from_spec(spec)
+  progress = Progress(interval=progress_interval)
+  counts = pipeline.run(progress=progress)
+  metrics = progress.snapshot()
+  print("Scraped {} dockets in {:.1f}s ({:.1f} dockets/s).".format(
+    metrics["files_done"], metrics["elapsed_seconds"], metrics["dockets_per_second"]))
+  for stage in pipeline.stages:
+    print("  {}: {} rows, {} errors".format(stage.name, counts[stage.name + "_rows"],
+                                           counts[stage.name + "_errors"]))
+  return counts
 
-def run(parsed_xml_dir, destination_csv, logfile, errorfile):
+def run(parsed_xml_dir, destination_csv, logfile, errorfile, progress_interval=10):
+  """
+  Streams the guilty sequence records of every docket in parsed_xml_dir to
+  destination_csv, and their errors to errorfile, printing throughput every
+  progress_interval seconds.
+  Returns the final throughput metrics (see DocketQuery.progress.METRICS).
+  """
   print("Starting...")
   logging.basicConfig(filename=logfile, level=logging.DEBUG)
-  records_query.query_directory(parsed_xml_dir, destination_csv, errorfile)
+  progress = Progress(interval=progress_interval)
+  records_written, errors_written = guilty_records_query.query_directory(
+    parsed_xml_dir, destination_csv, errorfile, progress=progress)
+  metrics = progress.snapshot()
+  print("Wrote {} records and {} errors from {} dockets in {:.1f}s ({:.1f} dockets/s).".format(
+    records_written, errors_written, metrics["files_done"], metrics["elapsed_seconds"],
+    metrics["dockets_per_second"]))
+  return metrics
 
 
 if __name__ == "__main__":
-  parsed_xml_dir, destination_csv, logfile, errorfile = get_parameters()
-  run(parsed_xml_dir, destination_csv, logfile, errorfile)
\ No newline at end of file
+  params = read_parameters()
+  if "pipeline" in params:
+    run_pipeline(params["pipeline"], params.get("logfile"), params.get("progress_interval", 10))
+  else:
+    run(*get_parameters(params))
\ No newline at end of file
@@ -1,4 +1,4 @@
-from DocketQuery import docket_query
+from DocketQuery import docket_query, snapshot
 from DocketQuery.saved_functions import conviction_information
 import os
 
@@ -8,17 +8,26 @@ dest = "/Users/nathanvogel/Documents/Python/YSRP/statistics/convictions_query/"
 # dest = "tests/output/query_results/"
 
 scraper = docket_query.AskADocket(conviction_information)
-errors, results, counts = scraper.scrape_directory(src)
-if not os.path.exists(dest):
-  os.mkdir(dest)
-docket_query.dicts2csv(errors, results,
-                       open(dest + "errors.csv", 'w'),
-                       open(dest + "results.csv", 'w'),
-                       counts = counts,
-                       counts_file = open(dest + "counts.csv", 'w'))
-with open(dest + "readme.md", "w") as f:
-  f.write("""
+files = sorted(docket_query.list_dockets(src))
+manifest = dest + "manifest.json"
+reasons = snapshot.changes(manifest, files, scraper)
+if not reasons:
+  print("The results in {} are current. Nothing to do.".format(dest))
+else:
+  print("Scraping because: {}".format("; ".join(reasons)))
+  errors, results, counts = scraper.scrape_files(files)
+  if not os.path.exists(dest):
+    os.mkdir(dest)
+  with open(dest + "errors.csv", 'w') as errors_file, \
+       open(dest + "results.csv", 'w') as results_file, \
+       open(dest + "counts.csv", 'w') as counts_file:
+    docket_query.dicts2csv(errors, results, errors_file, results_file,
+                           counts = counts, counts_file = counts_file)
+  with open(dest + "readme.md", "w") as f:
+    f.write("""
   This script applies the conviction information function to all the
-  parsed dockets.
+  parsed dockets.  manifest.json records the input files, the version of
+  the function and the output files of this run.
 """)
-f.close()
\ No newline at end of file
+  snapshot.record(manifest, files, scraper,
+                  [dest + "errors.csv", dest + "results.csv", dest + "counts.csv"])
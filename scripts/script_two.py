@@ -1,4 +1,4 @@
-import docket_query as dq
+from scripts import guilty_records_query
 import os
 
 
@@ -12,5 +12,5 @@ if os.path.exists(errors_destination):
   os.remove(errors_destination)
 
 print("The main event ...")
-records_written, errors = dq.query_directory(directory_path, records_destination, errors_destination)
-print("Complete.")
\ No newline at end of file
+records_written, errors_written = guilty_records_query.query_directory(directory_path, records_destination, errors_destination)
+print("Complete: {} records, {} errors.".format(records_written, errors_written))
\ No newline at end of file
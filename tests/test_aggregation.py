@@ -0,0 +1,88 @@
+from DocketQuery.docket_query import AskADocket
+from DocketQuery.saved_functions import conviction_information
+from DocketQuery.aggregation import QuantileSketch, Aggregator
+from DocketQuery.synthetic import write_corpus
+import random
+import pytest
+
+
+def test_quantile_sketch():
+  rng = random.Random(0)
+  values = sorted(rng.uniform(1, 5000) for _ in range(5000))
+  sketch = QuantileSketch(relative_accuracy=0.01)
+  for value in values: sketch.add(value)
+  for q in [0.1, 0.5, 0.9, 0.99]:
+    exact = values[int(q * (len(values) - 1))]
+    assert sketch.quantile(q) == pytest.approx(exact, rel=0.02)
+  assert QuantileSketch().quantile(0.5) is None
+
+def test_quantile_sketch_merge():
+  left, right, whole = QuantileSketch(), QuantileSketch(), QuantileSketch()
+  for value in [0, 30, 60, 90, -5]:
+    left.add(value)
+    whole.add(value)
+  for value in [365, 730, 1095]:
+    right.add(value)
+    whole.add(value)
+  left.merge(right)
+  assert left.count == 8
+  for q in [0, 0.25, 0.5, 0.75, 1]:
+    assert left.quantile(q) == whole.quantile(q)
+  with pytest.raises(ValueError):
+    left.merge(QuantileSketch(relative_accuracy=0.05))
+
+def test_aggregator():
+  aggregator = Aggregator(["grade"], ["max_time"], quantiles=[0.5])
+  aggregator.add_all([{"grade": "F1", "max_time": 100},
+                      {"grade": "F1", "max_time": 300},
+                      {"grade": "M1", "max_time": "unknown"},
+                      {"max_time": 20}])
+  rows = {row["grade"]: row for row in aggregator.rows()}
+  assert rows["F1"]["count"] == 2
+  assert rows["F1"]["max_time_sum"] == 400
+  assert rows["F1"]["max_time_min"] == 100
+  assert rows["F1"]["max_time_max"] == 300
+  assert rows["F1"]["max_time_mean"] == 200
+  assert 100 <= rows["F1"]["max_time_p50"] <= 300
+  assert rows["M1"]["count"] == 1
+  assert rows["M1"]["max_time_count"] == 0
+  assert rows["unknown"]["max_time_sum"] == 20
+
+def test_aggregator_merge():
+  left = Aggregator(["grade"], ["max_time"])
+  right = left.empty()
+  left.add({"grade": "F1", "max_time": 100})
+  right.add({"grade": "F1", "max_time": 300})
+  right.add({"grade": "M2", "max_time": 30})
+  rows = left.merge(right).rows()
+  assert [row["count"] for row in rows] == [2, 1]
+  assert rows[0]["max_time_max"] == 300
+  with pytest.raises(ValueError):
+    left.merge(Aggregator(["judge_name"], ["max_time"]))
+
+
+class TestAggregateDirectory:
+
+  def setup_method(self, method):
+    self.directory = "tests/output/aggregate_corpus/"
+    write_corpus(self.directory, 40, seed=4)
+
+  def test_matches_materialized_results(self):
+    scraper = AskADocket(conviction_information)
+    errors, results, counts = scraper.scrape_directory(self.directory)
+    expected = Aggregator(["judge_name", "grade"], ["max_time"])
+    expected.add_all(results)
+    errors, aggregator, counts = scraper.aggregate_directory(
+      self.directory, Aggregator(["judge_name", "grade"], ["max_time"]), chunksize=7)
+    assert counts["total_dockets_scraped"] == 40
+    assert aggregator.rows() == expected.rows()
+
+  def test_parallel_workers(self):
+    scraper = AskADocket(conviction_information)
+    serial = scraper.aggregate_directory(self.directory,
+                                         Aggregator(["grade"], ["min_time", "max_time"]))[1]
+    errors, parallel, counts = scraper.aggregate_directory(
+      self.directory, Aggregator(["grade"], ["min_time", "max_time"]),
+      workers=2, chunksize=5)
+    assert counts["successes"] == 40
+    assert parallel.rows() == serial.rows()
@@ -0,0 +1,68 @@
+from DocketQuery.docket_query import AskADocket, dicts2csv
+from DocketQuery.saved_functions import conviction_information, docket_num_name_age
+from DocketQuery.dates import parse_date, to_date, years_between, days_between, \
+                              normalize_dates
+from DocketQuery.synthetic import write_corpus
+from io import StringIO
+import csv
+import datetime
+import pytest
+
+
+def test_parse_date():
+  assert parse_date("01/03/2011") == datetime.date(2011, 1, 3)
+  assert parse_date(" 07/24/1964 ") == datetime.date(1964, 7, 24)
+  assert parse_date("unknown") is None
+  assert parse_date("02/30/2011") is None
+  assert parse_date("01/03/2011") is parse_date("01/03/2011")
+
+def test_to_date():
+  assert to_date(datetime.date(2011, 1, 3)) == datetime.date(2011, 1, 3)
+  assert to_date(None) is None
+
+def test_years_between():
+  birth = datetime.date(1964, 7, 24)
+  assert years_between(birth, datetime.date(2011, 7, 23)) == 46
+  assert years_between(birth, datetime.date(2011, 7, 24)) == 47
+  assert years_between(None, birth) is None
+
+def test_days_between():
+  assert days_between(datetime.date(2011, 1, 3), datetime.date(2011, 9, 9)) == 249
+  assert days_between(datetime.date(2011, 1, 3), None) is None
+
+def test_normalize_dates():
+  row = normalize_dates({"birth_date": "07/24/1964", "date_filed": "01/03/2011",
+                         "action_date": "09/09/2011", "date_initiated": "unknown",
+                         "judge_name": "Hill, Glynnis"})
+  assert row["date_filed"] == datetime.date(2011, 1, 3)
+  assert row["date_initiated"] is None
+  assert row["age_at_filing"] == 46
+  assert row["age_at_action"] == 47
+  assert row["days_filing_to_action"] == 249
+  assert row["judge_name"] == "Hill, Glynnis"
+  assert "age_at_action" not in normalize_dates({"birth_date": "07/24/1964"})
+
+
+class TestDateTransform:
+
+  def setup_method(self, method):
+    self.directory = "tests/output/dates_corpus/"
+    write_corpus(self.directory, 6, seed=13)
+
+  def test_scrape_with_transform(self):
+    plain = AskADocket(docket_num_name_age).scrape_directory(self.directory)[1]
+    scraper = AskADocket(docket_num_name_age, transforms=[normalize_dates])
+    errors, results, counts = scraper.scrape_directory(self.directory, workers=2,
+                                                       chunksize=2)
+    assert len(results) == len(plain)
+    for before, after in zip(plain, results):
+      assert after["date_filed"] == parse_date(before["date_filed"])
+      assert after["age_at_filing"] == years_between(after["birth_date"],
+                                                     after["date_filed"])
+
+  def test_dates_written_as_iso(self):
+    scraper = AskADocket(conviction_information, transforms=[normalize_dates])
+    errors, results, counts = scraper.scrape_directory(self.directory)
+    errors_file, results_file = dicts2csv(errors, results, StringIO(), StringIO())
+    rows = list(csv.DictReader(StringIO(results_file.getvalue()), quotechar='|'))
+    assert rows[0]["action_date"] == results[0]["action_date"].isoformat()
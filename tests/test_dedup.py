@@ -0,0 +1,80 @@
+from DocketQuery.docket_query import AskADocket
+from DocketQuery.saved_functions import docket_number_and_name
+from DocketQuery.dedup import latest_versions, read_docket_number, content_hash
+from DocketQuery.synthetic import write_corpus
+import os
+import shutil
+import pytest
+
+
+class TestLatestVersions:
+
+  def setup_method(self, method):
+    self.directory = "tests/output/dedup_corpus/"
+    if os.path.exists(self.directory):
+      shutil.rmtree(self.directory)
+    self.paths = write_corpus(self.directory, 5, seed=8)
+    first = self.paths[0]
+    # An exact re-download, an older incomplete version, and a file whose
+    # name doesn't carry the docket number.
+    self.redownload = first.replace("_stitched_complete", "_complete_redownload")
+    shutil.copy(first, self.redownload)
+    self.incomplete = self.paths[1].replace("_stitched_complete", "_stitched")
+    with open(self.incomplete, "w") as f:
+      f.write(open(self.paths[1]).read().replace("Guilty", "Pending"))
+    os.utime(self.incomplete, ns=(0, 0))
+    self.unnamed = os.path.join(self.directory, "unnamed.xml")
+    shutil.copy(self.paths[2], self.unnamed)
+
+  def test_read_docket_number(self):
+    assert read_docket_number(self.paths[0]) == "CP-51-CR-0000001-2011"
+    assert read_docket_number(self.unnamed) == "CP-51-CR-0000003-2011"
+
+  def test_content_hash(self):
+    assert content_hash(self.paths[0]) == content_hash(self.redownload)
+    assert content_hash(self.paths[1]) != content_hash(self.incomplete)
+
+  def test_latest_versions(self):
+    files = sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory))
+    kept, counts = latest_versions(files)
+    assert len(kept) == 5
+    assert counts["files"] == 8
+    assert counts["identical"] == 2
+    assert counts["superseded"] == 1
+    assert self.paths[1] in kept
+    assert self.incomplete not in kept
+    # The unnamed copy is newer, but isn't marked complete.
+    assert self.paths[2] in kept
+    assert self.unnamed not in kept
+
+  def test_on_disk_index(self):
+    files = sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory))
+    in_memory, counts = latest_versions(files)
+    on_disk, disk_counts = latest_versions(files, index_path="tests/output/dedup_index")
+    assert on_disk == in_memory
+    assert disk_counts == counts
+    streamed, streamed_counts = latest_versions(files, index_path="tests/output/dedup_index",
+                                               sort=False)
+    assert sorted(streamed) == in_memory
+    assert streamed_counts == counts
+
+  def test_incomplete_does_not_rank_as_complete(self):
+    newer = self.paths[3].replace("_stitched_complete.xml", "_incomplete.xml")
+    with open(newer, "w") as f:
+      f.write(open(self.paths[3]).read().replace("Guilty", "Pending"))
+    kept, counts = latest_versions([self.paths[3], newer])
+    assert kept == [self.paths[3]]
+    assert counts["superseded"] == 1
+
+  def test_scrape_directory_dedup(self):
+    scraper = AskADocket(docket_number_and_name)
+    errors, results, counts = scraper.scrape_directory(self.directory)
+    assert len(results) == 8
+    errors, results, counts = scraper.scrape_directory(self.directory, dedup=True)
+    assert len(results) == 5
+    assert len({result["docket_number"] for result in results}) == 5
+    assert counts["duplicates_skipped"] == 3
+    streamed = scraper.scrape_directory(self.directory, dedup=True,
+                                        dedup_index="tests/output/dedup_index")
+    assert sorted(streamed[1], key=str) == sorted(results, key=str)
+    assert streamed[2] == counts
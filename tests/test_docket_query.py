@@ -1,5 +1,6 @@
 from DocketQuery.docket_query import AskADocket, dicts2csv
 from DocketQuery.saved_functions import docket_number_and_name
+from DocketQuery.synthetic import write_corpus
 
 from lxml import etree
 import pytest
@@ -78,4 +79,21 @@ class TestAskADocket:
       if result["docket_number"] == "CP-51-CR-0000001-2011":
         assert result["defendant_name"] == "Samuel Mccray"
       elif result["docket_number"] == "CP-51-CR-0000012-2011":
-        assert result["defendant_name"] == "Sergio V V. Moore"
\ No newline at end of file
+        assert result["defendant_name"] == "Sergio V V. Moore"
+  def test_scrape_files_reads_iterators_lazily(self):
+    paths = write_corpus("tests/output/lazy_corpus/", 6, seed=4)
+    taken = []
+    def files():
+      for path in paths:
+        taken.append(path)
+        yield path
+    seen = []
+    def count_taken(docket_tree, file_name):
+      seen.append(len(taken))
+      return docket_number_and_name(docket_tree, file_name)
+    errors, results, counts = AskADocket(count_taken).scrape_files(files())
+    # Each docket is scraped before the next one is taken from the iterator.
+    assert seen == [1, 2, 3, 4, 5, 6]
+    assert counts["successes"] == 6
+    assert [result["docket_number"] for result in results] == \
+      ["CP-51-CR-{:07d}-2011".format(i) for i in range(1, 7)]
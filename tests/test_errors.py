@@ -0,0 +1,95 @@
+from DocketQuery.docket_query import AskADocket
+from DocketQuery.saved_functions import conviction_information
+from DocketQuery.errors import error_code, generic_path, field_mask, mask_fields, \
+                               ErrorSummary, MISSING, UNPARSEABLE, OTHER
+from DocketQuery.synthetic import docket_xml, sequence_xml, action_xml, sentence_xml
+from lxml import etree
+from io import BytesIO
+import os
+import pytest
+
+
+def broken_docket(docket_number):
+  # A docket with no birth date, a sequence with no grade and a sentence in
+  # days, which conviction_information can't convert.
+  sentence = sentence_xml("Probation", ("10", "days"), ("20", "days"), "03/02/2011")
+  sequence = sequence_xml(1, "Simple Assault", "Guilty", "M2", "18 § 2701 §§ A",
+                          [action_xml("Hill, Glynnis", "03/02/2011", [sentence])])
+  text = docket_xml(docket_number, "Samuel Mccray", "07/24/1964", "01/03/2011",
+                    "01/03/2011", [sequence, sequence])
+  return text.replace("<birth_date>07/24/1964</birth_date>", "") \
+             .replace("<grade>M2</grade>", "")
+
+
+def test_error_code():
+  assert error_code(IndexError("list index out of range")) == MISSING
+  assert error_code(AttributeError("'str' object has no attribute 'days'")) == UNPARSEABLE
+  assert error_code(KeyError("x")) == OTHER
+
+def test_generic_path():
+  assert generic_path("sequence_10/action_2/sentence_0/min_time") == \
+         "sequence_*/action_*/sentence_*/min_time"
+  assert generic_path("birth_date") == "birth_date"
+
+def test_field_mask():
+  mask = field_mask([{"error_field": "birth_date"},
+                     {"error_field": "sequence_1/action_0/judge_name"},
+                     {"error_field": "something_new"}])
+  assert mask_fields(mask) == ["birth_date", "judge_name", "other"]
+
+def test_errors_hold_codes_not_exceptions():
+  text = broken_docket("CP-51-CR-0000001-2011")
+  errors, results = conviction_information(etree.parse(BytesIO(text.encode("utf-8"))), "broken.xml")
+  assert len(results) == 2
+  for error in errors:
+    assert isinstance(error["message"], str)
+  assert {"error_file": "broken.xml", "error_field": "birth_date",
+          "message": MISSING} in errors
+  assert {"error_file": "broken.xml", "error_field": "sequence_1/grade",
+          "message": MISSING} in errors
+  assert {"error_file": "broken.xml",
+          "error_field": "sequence_0/action_0/sentence_0/min_time",
+          "message": UNPARSEABLE} in errors
+  # Repeated paths are shared.
+  paths = [error["error_field"] for error in errors]
+  again = [error["error_field"] for error in
+           conviction_information(etree.parse(BytesIO(text.encode("utf-8"))), "broken.xml")[0]]
+  assert all(a is b for a, b in zip(paths, again))
+
+
+class TestErrorSummary:
+
+  def setup_method(self, method):
+    self.directory = "tests/output/errors_corpus/"
+    if not os.path.exists(self.directory):
+      os.makedirs(self.directory)
+    for i in range(1, 4):
+      with open(self.directory + "CP-51-CR-000000{}-2011.xml".format(i), "w") as f:
+        f.write(broken_docket("CP-51-CR-000000{}-2011".format(i)))
+
+  def test_summary(self):
+    summary = ErrorSummary()
+    summary.add([{"error_file": "a.xml", "error_field": "sequence_0/grade", "message": MISSING},
+                 {"error_file": "a.xml", "error_field": "sequence_1/grade", "message": MISSING},
+                 {"file": "b.xml", "error_field": "judge"}])
+    assert len(summary) == 3
+    assert summary.field_rows()[0] == {"error_field": "sequence_*/grade",
+                                       "error_code": MISSING, "count": 2}
+    other = ErrorSummary().add([{"error_file": "b.xml", "error_field": "birth_date",
+                                 "message": MISSING}])
+    rows = summary.merge(other).file_rows()
+    assert rows[1]["error_file"] == "b.xml"
+    assert rows[1]["error_count"] == 2
+    assert rows[1]["error_fields"] == "birth_date other"
+
+  def test_scrape_directory_summary(self):
+    scraper = AskADocket(conviction_information)
+    errors, results, counts = scraper.scrape_directory(self.directory)
+    summary, summary_results, counts = scraper.scrape_directory(self.directory,
+                                                                error_summary=True)
+    assert summary_results == results
+    assert len(summary) == len(errors)
+    fields = {row["error_field"]: row["count"] for row in summary.field_rows()}
+    assert fields["birth_date"] == 3
+    assert fields["sequence_*/grade"] == 6
+    assert len(summary.file_rows()) == 3
@@ -0,0 +1,282 @@
+from DocketQuery.docket_query import parse_docket
+from DocketQuery.errors import error_code, field_path
+from DocketQuery.extraction import element_text, guilty_sentences, day_count, sentence_days
+from DocketQuery.saved_functions import conviction_information, docket_num_name_age
+from DocketQuery.synthetic import write_corpus, docket_xml, sequence_xml, action_xml, \
+                                  sentence_xml
+from DocketQuery.validation import GUILTY_RECORD_SCHEMA, validate
+from scripts.guilty_records_query import Docket
+from fractions import Fraction
+from lxml import etree
+import datetime
+import os
+import re
+import pytest
+
+#  Both conviction_information and Docket.get_guilty_sequence_records get
+#  their fields from extraction.py.  These are copies of what they were
+#  before, kept to check that the engine gives exactly the same records,
+#  errors and failures.  benchmarks/bench_engine.py times them too.
+
+def xpath_text(query):
+  return etree.XPath(query, smart_strings=False)
+
+def first_text(query, element):
+  return query(element)[0].strip()
+
+SEQUENCE_DESCRIPTION = xpath_text("sequence_description/text()")
+CODE_SECTION = xpath_text("code_section/text()")
+GRADE = xpath_text("grade/text()")
+JUDGE_NAME = xpath_text("judge_name/text()")
+ACTION_DATE = xpath_text("date/text()")
+PROGRAM = xpath_text("program/text()")
+MIN_TIME = xpath_text("length_of_sentence/min_length/time/text()")
+MIN_UNIT = xpath_text("length_of_sentence/min_length/unit/text()")
+MAX_TIME = xpath_text("length_of_sentence/max_length/time/text()")
+MAX_UNIT = xpath_text("length_of_sentence/max_length/unit/text()")
+GUILTY_SEQUENCES = etree.XPath("//sequence[contains(./offense_disposition, 'Guilty') and (judge_action/sentence_info/length_of_sentence)]")
+SENTENCES = etree.XPath("sentence_info")
+ACTIONS_WITH_SENTENCES = etree.XPath("judge_action[sentence_info]")
+
+
+def reference_convert_time(period, unit, unknown_unit=None):
+  # saved_functions.convert_time, and with unknown_unit=0 the one in
+  # guilty_records_query.py.
+  year_pattern = re.compile("year", flags=re.I)
+  month_pattern = re.compile("month", flags=re.I)
+  if re.search(year_pattern, unit) != None:
+    day_count = sum([float(Fraction(quantity)) * 365 for quantity in period.split()])
+  elif re.search(month_pattern, unit) != None:
+    day_count = sum([float(Fraction(quantity)) * 30.42 for quantity in period.split()])
+  elif unknown_unit is None:
+    return ' '.join([period, unit, "(cannot parse time)"])
+  else:
+    day_count = unknown_unit
+  return datetime.timedelta(days=day_count)
+
+
+def reference_conviction_information(docket_tree, file_name):
+  results = []
+  errors, basic_info = docket_num_name_age(docket_tree, file_name)
+  for i, sequence in enumerate(GUILTY_SEQUENCES(docket_tree)):
+    sequence_info = dict()
+    sequence_info.update(basic_info[0])
+    for key, query in [("charge_desc", SEQUENCE_DESCRIPTION),
+                       ("charge_section", CODE_SECTION), ("grade", GRADE)]:
+      try:
+        sequence_info[key] = first_text(query, sequence)
+      except Exception as e:
+        errors.append({"error_file":file_name,
+                       "error_field": field_path("sequence_{}/{}".format(i, key)),
+                       "message":error_code(e)})
+        sequence_info[key] = "unknown"
+    for i2, action in enumerate(ACTIONS_WITH_SENTENCES(sequence)):
+      action_info = dict()
+      action_info.update(sequence_info)
+      for key, name, query in [("judge_name", "judge_name", JUDGE_NAME),
+                               ("action_date", "date", ACTION_DATE)]:
+        try:
+          action_info[key] = first_text(query, action)
+        except Exception as e:
+          errors.append({"error_file":file_name,
+                         "error_field": field_path("sequence_{}/action_{}/{}".format(i, i2, name)),
+                         "message":error_code(e)})
+          action_info[key] = "unknown"
+      for i3, sentence in enumerate(SENTENCES(action)):
+        sentence_info = dict()
+        sentence_info.update(action_info)
+        try:
+          sentence_info["program"] = first_text(PROGRAM, sentence)
+        except Exception as e:
+          errors.append({"error_file":file_name,
+                         "error_field": field_path("sequence_{}/action_{}/sentence_{}/program".format(i,i2, i3)),
+                         "message":error_code(e)})
+          sentence_info["program"] = "unknown"
+        for key, time_query, unit_query in [("min_time", MIN_TIME, MIN_UNIT),
+                                            ("max_time", MAX_TIME, MAX_UNIT)]:
+          try:
+            time = first_text(time_query, sentence)
+            unit = first_text(unit_query, sentence)
+            sentence_info[key] = reference_convert_time(time, unit).days
+          except Exception as e:
+            errors.append({"error_file":file_name,
+                           "error_field": field_path("sequence_{}/action_{}/sentence_{}/{}".format(i,i2, i3, key)),
+                           "message":error_code(e)})
+            sentence_info[key] = "unknown"
+        results.append(sentence_info)
+  return errors, results
+
+
+def xpath_or_log(element, query_string, variable_sought):
+  query_results = element.xpath(query_string)
+  if len(query_results) > 0:
+    return query_results[0].strip()
+  return "%s unknown" % variable_sought
+
+
+def reference_scrape_action(action):
+  actions = []
+  base_action = {"judge": xpath_or_log(action, "judge_name/text()", "judge"),
+                 "action_date": xpath_or_log(action, "date/text()", "action_date")}
+  for sentence in action.xpath("sentence_info"):
+    new_action = {
+      "sentence_program": xpath_or_log(sentence, "program/text()", "program"),
+      "min_length": reference_convert_time(
+        xpath_or_log(sentence, "length_of_sentence/min_length/time/text()", "min_length_time"),
+        xpath_or_log(sentence, "length_of_sentence/min_length/unit/text()", "min_length_unit"), 0),
+      "max_length": reference_convert_time(
+        xpath_or_log(sentence, "length_of_sentence/max_length/time/text()", "max_length_time"),
+        xpath_or_log(sentence, "length_of_sentence/max_length/unit/text()", "max_length_unit"), 0)}
+    new_action.update(base_action)
+    actions.append(new_action)
+  return actions
+
+
+def reference_guilty_sequence_records(path):
+  tree = etree.parse(path)
+  records = []
+  base_record = {
+    "docket_number": xpath_or_log(tree, "/docket/header/docket_number/text()", "docket_number"),
+    "defendant_name": xpath_or_log(tree, "/docket/header/caption/defendant/text()", "defendant_name"),
+    "birth_date": xpath_or_log(tree, "/docket/section[@name='Defendant_Information']/defendant_information/birth_date/text()", "defendant_birthdate"),
+    "date_filed": xpath_or_log(tree, "/docket/section[@name='Case_Information']/case_info/date_filed/text()", "date_filed")}
+  for sequence in tree.xpath("//sequence[contains(./offense_disposition, 'Guilty') and (judge_action/sentence_info/length_of_sentence)]"):
+    charge = xpath_or_log(sequence, "sequence_description/text()", "charge")
+    disposition = xpath_or_log(sequence, "offense_disposition/text()", "offense_disposition")
+    for action in sequence.xpath("judge_action[sentence_info]"):
+      for action_dict in reference_scrape_action(action):
+        action_dict.update(base_record)
+        action_dict.update({"charge":charge, "disposition":disposition})
+        records.append(action_dict)
+  return records, validate(records, GUILTY_RECORD_SCHEMA, path)
+
+
+def guilty_sequence_records(path):
+  return Docket(path).get_guilty_sequence_records()
+
+
+def outcome(function, *args):
+  # The output of a function with the key order of its dicts, or the type
+  # of exception it raised.
+  try:
+    errors_or_records, records_or_errors = function(*args)
+  except Exception as e:
+    return type(e)
+  return [[list(row.items()) for row in rows] for rows in (errors_or_records, records_or_errors)]
+
+
+ODD_SENTENCES = [
+  sentence_xml("Confinement", ("7 1/2", "years"), ("15", "Years"), "09/09/2011"),
+  sentence_xml(" IPP ", (" 11 1/2 ", " months "), ("23", "Months"), "09/09/2011"),
+  sentence_xml("Probation", ("1.00", "Days"), ("life", "Years"), "09/09/2011"),
+  sentence_xml("Probation", ("1.00", ""), ("", "Years"), "09/09/2011"),
+  """
+  <sentence_info>
+    <length_of_sentence><min_length><unit>Years</unit></min_length></length_of_sentence>
+  </sentence_info>""",
+  """
+  <sentence_info>
+    <!-- A comment --><program><!-- Before the text -->Fines</program>
+    <program>Costs</program>
+    <length_of_sentence>
+      <min_length><time></time><time>2</time><unit>Months</unit></min_length>
+      <max_length><time>3</time></max_length>
+      <max_length><unit>Months</unit></max_length>
+    </length_of_sentence>
+  </sentence_info>""",
+]
+
+ODD_SEQUENCES = [
+  sequence_xml(1, "Simple Assault", "Guilty", "M2", "18 § 2701 §§ A",
+               [action_xml("Hill, Glynnis", "01/02/2011"),
+                action_xml(" Hill, Glynnis ", "02/02/2011", ODD_SENTENCES[:3])]),
+  sequence_xml(2, "Theft", "Nolle Prossed", "M1", "18 § 3921 §§ A",
+               [action_xml("Hill, Glynnis", "01/02/2011", ODD_SENTENCES[:1])]),
+  """
+  <sequence>
+    <offense_disposition>Guilty Plea - Negotiated</offense_disposition>
+    <grade></grade><grade>F1</grade>
+    <judge_action><date>03/03/2011</date>{}</judge_action>
+    <judge_action><judge_name/><judge_name>Means, Sheila A.</judge_name>{}</judge_action>
+  </sequence>""".format(ODD_SENTENCES[5], ODD_SENTENCES[1]),
+  sequence_xml(4, "Robbery", "Guilty", "F1", "18 § 3701 §§ A1I",
+               [action_xml("Woods-Skipper, Sheila", "04/04/2011", ODD_SENTENCES[3:5])]),
+  sequence_xml(5, "Not a charge", "Not Guilty", "M", "",
+               [action_xml("", "", ODD_SENTENCES[:2])]),
+]
+
+
+@pytest.fixture(scope="module")
+def corpus():
+  return write_corpus("tests/output/extraction_corpus/", 300, seed=47)
+
+
+@pytest.fixture(scope="module")
+def odd_dockets():
+  directory = "tests/output/extraction_odd/"
+  if not os.path.exists(directory):
+    os.makedirs(directory)
+  dockets = [docket_xml("CP-51-CR-0000001-2011", "Samuel Mccray", "01/01/1980",
+                        "01/02/2011", "01/02/2011", ODD_SEQUENCES[:3]),
+             docket_xml("CP-51-CR-0000002-2011", "", "", "", "", ODD_SEQUENCES[3:5]),
+             docket_xml("CP-51-CR-0000003-2011", "Anh Nguyen", "01/01/1990",
+                        "01/02/2011", "01/02/2011", ODD_SEQUENCES),
+             """<docket><header/><sequence><offense_disposition>Guilty</offense_disposition>
+                <judge_action>{}</judge_action></sequence></docket>""".format(ODD_SENTENCES[0])]
+  paths = []
+  for i, docket in enumerate(dockets):
+    path = os.path.join(directory, "CP-51-CR-{:07d}-2011_stitched_complete.xml".format(i + 1))
+    with open(path, "w") as f:
+      f.write(docket)
+    paths.append(path)
+  return paths
+
+
+def test_conviction_information_matches_reference(corpus, odd_dockets):
+  for path in corpus + odd_dockets:
+    tree = parse_docket(path)
+    assert outcome(conviction_information, tree, path) == \
+           outcome(reference_conviction_information, tree, path), path
+
+
+def test_guilty_sequence_records_match_reference(corpus, odd_dockets):
+  for path in corpus + odd_dockets:
+    assert outcome(guilty_sequence_records, path) == \
+           outcome(reference_guilty_sequence_records, path), path
+
+
+def test_odd_dockets_have_failures(odd_dockets):
+  # The odd dockets exercise missing, empty and unparseable fields.
+  errors, results = conviction_information(parse_docket(odd_dockets[0]), odd_dockets[0])
+  assert {error["message"] for error in errors} == {"missing", "unparseable"}
+  assert outcome(guilty_sequence_records, odd_dockets[1]) is ValueError
+
+
+def test_element_text():
+  element = etree.fromstring("<a><!-- c --> <b/> tail </a>")
+  assert element_text(element) == ""
+  assert element_text(etree.fromstring("<a><b/> tail </a>")) == "tail"
+  assert element_text(etree.fromstring("<a><b>not mine</b></a>")) is None
+
+
+def test_guilty_sentences(odd_dockets):
+  sequences = guilty_sentences(parse_docket(odd_dockets[0]))
+  assert len(sequences) == 2
+  sequence, actions = sequences[1]
+  assert sequence["sequence_description"] is None
+  assert sequence["grade"] == "F1"
+  assert [action["judge_name"] for action, sentences in actions] == [None, "Means, Sheila A."]
+  assert actions[0][1][0] == {"program": "Fines", "min_time": "2", "min_unit": "Months",
+                              "max_time": "3", "max_unit": "Months"}
+
+
+def test_sentence_days():
+  assert sentence_days(" 7 1/2 ", "years") == 2737
+  assert day_count("11 1/2", "months") == 11 * 30.42 + 0.5 * 30.42
+  assert day_count("1", "days") is None
+  with pytest.raises(IndexError):
+    sentence_days(None, "years")
+  with pytest.raises(AttributeError):
+    sentence_days("1", "days")
+  with pytest.raises(ValueError):
+    sentence_days("life", "years")
@@ -168,8 +168,8 @@ def test_query_directory():
   if os.path.exists(errors_destination):
     os.remove(errors_destination)
 
-  records_written, errors = query_directory(directory_path, records_destination, errors_destination)
-  assert len(records_written) == 17
+  records_written, errors_written = query_directory(directory_path, records_destination, errors_destination)
+  assert records_written == 17
 
 def test_xpath_or_log():
   test_element = etree.parse(StringIO("""<sentence_info>
@@ -230,3 +230,82 @@ class TestDocket:
     records, errors = docket.get_guilty_sequence_records()
     assert len(records) == 0
 
+
+
+class TestLazyDocket:
+
+  def setup_method(self, method):
+    from DocketQuery.synthetic import write_corpus
+    self.path = write_corpus("tests/output/lazy_docket/", 1, seed=3)[0]
+
+  def test_defers_parsing(self):
+    docket = Docket("does/not/exist.xml")
+    assert docket.path == "does/not/exist.xml"
+    with pytest.raises(OSError):
+      docket.get_docket_number()
+
+  def test_memoizes_values(self):
+    docket = Docket(self.path)
+    assert docket.get_docket_number() == "CP-51-CR-0000001-2011"
+    first = docket.get_guilty_sequence_records()
+    assert docket.get_guilty_sequence_records() == first
+    # Changing an answer doesn't change the memoized records.
+    first[0][0]["extra"] = "added"
+    first[0].append({})
+    assert docket.get_guilty_sequence_records() != first
+    first[0].pop()
+    del first[0][0]["extra"]
+    assert docket.get_guilty_sequence_records() == first
+
+  def test_release_tree(self):
+    docket = Docket(self.path, release_tree=True)
+    docket.prefetch()
+    assert docket._tree is None
+    os.rename(self.path, self.path + ".moved")
+    try:
+      # Everything prefetched is answered without the file.
+      assert docket.get_docket_number() == "CP-51-CR-0000001-2011"
+      records, errors = docket.get_guilty_sequence_records()
+      for record in records:
+        assert record["docket_number"] == "CP-51-CR-0000001-2011"
+    finally:
+      os.rename(self.path + ".moved", self.path)
+
+  def test_slots(self):
+    docket = Docket(self.path)
+    with pytest.raises(AttributeError):
+      docket.other = 1
+
+
+class TestStreamingQueryDirectory:
+
+  def setup_method(self, method):
+    import shutil
+    from DocketQuery.synthetic import write_corpus
+    self.directory = "tests/output/streaming_query/"
+    if os.path.exists(self.directory):
+      shutil.rmtree(self.directory)
+    self.paths = write_corpus(self.directory, 12, seed=22)
+    with open(self.directory + "CP-51-CR-0000099-2011_broken.xml", "w") as f:
+      f.write("<docket><header>")
+    self.records_destination = "tests/output/streaming_query_records.csv"
+    self.errors_destination = "tests/output/streaming_query_errors.csv"
+
+  def test_writes_every_docket_once(self):
+    from DocketQuery.progress import Progress
+    progress = Progress(stream=None)
+    records_written, errors_written = query_directory(
+      self.directory, self.records_destination, self.errors_destination, progress=progress)
+    expected = []
+    for path in sorted(self.paths):
+      expected += Docket(path).get_guilty_sequence_records()[0]
+    assert records_written == len(expected) > 0
+    with open(self.records_destination) as f:
+      lines = f.read().splitlines()
+    assert len(lines) == records_written + 1
+    assert lines.count(lines[0]) == 1
+    metrics = progress.snapshot()
+    assert metrics["files_done"] == 13
+    assert metrics["failures"] == 1
+    assert metrics["rows"] == records_written
+    assert metrics["errors"] == errors_written
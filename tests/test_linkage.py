@@ -0,0 +1,128 @@
+from DocketQuery.docket_query import AskADocket
+from DocketQuery.saved_functions import docket_num_name_age, conviction_information
+from DocketQuery.linkage import DefendantIndex, normalize_name
+from DocketQuery.dates import normalize_dates
+from DocketQuery.synthetic import docket_xml, random_docket
+import datetime
+import os
+import random
+import shutil
+
+
+def test_normalize_name():
+  assert normalize_name("Samuel Mccray") == "mccray samuel"
+  assert normalize_name("MCCRAY, Samuel Jr.") == "mccray samuel"
+  assert normalize_name("unknown") is None
+  assert normalize_name(None) is None
+
+def test_link():
+  index = DefendantIndex()
+  assert index.link("Samuel Mccray", "07/24/1964") == (0, "new", None)
+  assert index.link("MCCRAY, SAMUEL", datetime.date(1964, 7, 24)) == (0, "exact", 1.0)
+  defendant_id, match, score = index.link("Samuel Mcray", "07/24/1964")
+  assert (defendant_id, match) == (0, "fuzzy")
+  assert 0.9 <= score < 1
+  # A different birth date, or a different name, is a different defendant.
+  assert index.link("Samuel Mccray", "07/25/1964")[:2] == (1, "new")
+  assert index.link("Samuel Jones", "07/24/1964")[:2] == (2, "new")
+  # Without a birth date, only the exact name links.
+  assert index.link("Samuel Mccray", "unknown")[:2] == (3, "new")
+  assert index.link("Samuel Mccray", "unknown")[:2] == (3, "exact")
+  assert index.link("Samuel Mcray", "unknown")[:2] == (4, "new")
+  assert len(index) == 5
+
+def test_blocking_limits_comparisons():
+  index = DefendantIndex()
+  rng = random.Random(0)
+  letters = "abcdefghijklmnopqrstuvwxyz"
+  for i in range(2000):
+    name = " ".join("".join(rng.choice(letters) for _ in range(7)) for _ in range(2))
+    index.link(name, "01/01/{}".format(1950 + rng.randint(0, 40)))
+  # Each name is compared only with names sharing a birth date and an
+  # initial, not with all the names before it.
+  assert index.comparisons < 2000 * 10
+  assert len(index) == 2000
+
+
+def test_unnumbered_dockets_by_file():
+  index = DefendantIndex()
+  rows = [{"docket_number": "unknown", "defendant_name": "Samuel Mccray",
+           "birth_date": "07/24/1964"} for _ in range(3)]
+  index.add_all(rows, "a.xml")
+  index.add_all([dict(row) for row in rows], "b.xml")
+  assert [row["dockets"] for row in index.defendant_rows()] == [2]
+  assert [(row["docket_number"], row["match"]) for row in index.linkage_rows()] == \
+         [("a.xml", "new"), ("b.xml", "exact")]
+
+
+class TestLinkageScrape:
+
+  def setup_method(self, method):
+    self.directory = "tests/output/linkage_corpus/"
+    if os.path.exists(self.directory):
+      shutil.rmtree(self.directory)
+    os.makedirs(self.directory)
+    rng = random.Random(21)
+    dockets = [("CP-51-CR-0000001-2011", "Samuel Mccray", "07/24/1964"),
+               ("CP-51-CR-0000002-2011", "MCCRAY, SAMUEL", "07/24/1964"),
+               ("CP-51-CR-0000003-2012", "Samuel Mcray", "07/24/1964"),
+               ("CP-51-CR-0000004-2012", "Samuel Mccray", "07/24/1965"),
+               ("CP-51-CR-0000005-2012", "Lila Perez", "02/02/1980")]
+    for docket_number, name, birth_date in dockets:
+      text = random_docket(rng, docket_number)
+      start = text.index("<defendant>") + len("<defendant>")
+      text = text[:start] + name + text[text.index("</defendant>"):]
+      start = text.index("<birth_date>") + len("<birth_date>")
+      text = text[:start] + birth_date + text[text.index("</birth_date>"):]
+      with open(self.directory + docket_number + "_stitched_complete.xml", "w") as f:
+        f.write(text)
+
+  def test_defendant_ids(self):
+    index = DefendantIndex()
+    scraper = AskADocket(docket_num_name_age, transforms=[normalize_dates])
+    errors, results, counts = scraper.scrape_directory(self.directory, linkage=index)
+    ids = {result["docket_number"]: result["defendant_id"] for result in results}
+    assert ids["CP-51-CR-0000001-2011"] == ids["CP-51-CR-0000002-2011"] \
+           == ids["CP-51-CR-0000003-2012"]
+    assert len(set(ids.values())) == 3
+    rows = index.linkage_rows()
+    assert [row["docket_number"] for row in rows][:3] == sorted(ids)[:3]
+    assert [row["match"] for row in rows] == ["new", "exact", "fuzzy", "new", "new"]
+    assert [row["dockets"] for row in index.defendant_rows()] == [3, 1, 1]
+
+  def test_same_ids_with_workers(self):
+    files = sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory))
+    scraper = AskADocket(conviction_information)
+    one = DefendantIndex()
+    errors, results, counts = scraper.scrape_files(files, linkage=one)
+    many = DefendantIndex()
+    errors, parallel_results, counts = scraper.scrape_files(files, workers=2, chunksize=2,
+                                                            linkage=many)
+    assert parallel_results == results
+    assert one.linkage_rows() == many.linkage_rows()
+    # Scheduled by size, chunks run largest first, but dockets are still
+    # linked in file order.
+    for workers in [1, 2]:
+      scheduled = DefendantIndex()
+      errors, scheduled_results, counts = scraper.scrape_files(
+        files, workers=workers, chunksize=2, schedule="size", linkage=scheduled)
+      assert scheduled_results == results
+      assert scheduled.linkage_rows() == one.linkage_rows()
+    # Every row of a docket has the docket's defendant.
+    for result in results:
+      assert result["defendant_id"] == one.links[result["docket_number"]]["defendant_id"]
+
+  def test_dockets_without_rows_are_linked(self):
+    # A docket of the first defendant with no convictions.
+    text = open(self.directory + "CP-51-CR-0000001-2011_stitched_complete.xml").read()
+    text = text.replace("CP-51-CR-0000001-2011", "CP-51-CR-0000006-2012").replace("Guilty", "Nolle Prossed")
+    with open(self.directory + "CP-51-CR-0000006-2012_stitched_complete.xml", "w") as f:
+      f.write(text)
+    files = sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory))
+    index = DefendantIndex()
+    errors, results, counts = AskADocket(conviction_information).scrape_files(files, linkage=index)
+    assert "CP-51-CR-0000006-2012" not in {result["docket_number"] for result in results}
+    assert index.links["CP-51-CR-0000006-2012"]["defendant_id"] == \
+           index.links["CP-51-CR-0000001-2011"]["defendant_id"]
+    assert len(index.linkage_rows()) == 6
+    assert [row["dockets"] for row in index.defendant_rows()] == [4, 1, 1]
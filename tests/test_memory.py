@@ -0,0 +1,80 @@
+from DocketQuery.docket_query import parse_docket
+from DocketQuery import saved_functions
+from DocketQuery.memory import profile, report, retaining_values
+from DocketQuery.synthetic import write_corpus
+from scripts.guilty_records_query import Docket
+from lxml import etree
+import pytest
+
+#  Memory budgets for extracting from one docket.  "retained" is the bytes
+#  per docket still allocated when the outputs are kept, as a caller
+#  collecting results keeps them; "peak" is the most allocated at once while
+#  extracting without keeping outputs.  Both are about twice what the
+#  functions use on the synthetic corpus.  Parsed trees don't count (lxml
+#  allocates them outside tracemalloc's view); outputs are checked for
+#  values that keep a tree alive instead.
+
+def saved_function(function):
+  def extract(path):
+    return function(parse_docket(path), path)
+  extract.__name__ = function.__name__
+  return extract
+
+def guilty_sequence_records(path):
+  return Docket(path).get_guilty_sequence_records()
+
+BUDGETS = [
+  (saved_function(saved_functions.docket_number_and_name), 1024, 2048),
+  (saved_function(saved_functions.docket_num_name_age), 1536, 2048),
+  (saved_function(saved_functions.conviction_information), 4096, 65536),
+  (saved_function(saved_functions.sentence_texts), 4608, 32768),
+  (guilty_sequence_records, 4096, 32768),
+]
+
+
+@pytest.fixture(scope="module")
+def corpus():
+  return write_corpus("tests/output/memory_corpus/", 200, seed=26)
+
+
+@pytest.mark.parametrize("function, retained_budget, peak_budget", BUDGETS,
+                         ids=[budget[0].__name__ for budget in BUDGETS])
+def test_memory_budget(corpus, function, retained_budget, peak_budget):
+  function(corpus[0])   # Compiled queries, parsers and caches are made once.
+  small = profile(function, corpus[:50])
+  large = profile(function, corpus)
+  message = "\n" + report(function.__name__, large)
+  assert large["retaining"] == [], message
+  assert large["retained_per_item"] <= retained_budget, message
+  # What is kept per docket doesn't grow with the corpus.
+  assert large["retained_per_item"] <= 1.25 * small["retained_per_item"] + 64, message
+  streamed_small = profile(function, corpus[:50], keep=False)
+  streamed = profile(function, corpus, keep=False)
+  message = "\n" + report(function.__name__, streamed)
+  # Nothing is kept when the outputs aren't, and the working set doesn't
+  # grow with the corpus.
+  assert streamed["retained_bytes"] <= 16384, message
+  assert streamed["peak_bytes"] <= peak_budget, message
+  assert streamed["peak_bytes"] <= 1.25 * streamed_small["peak_bytes"] + 4096, message
+
+
+def test_retaining_values():
+  tree = etree.fromstring("<docket><a>text</a></docket>").getroottree()
+  try:
+    tree.xpath("/docket/b/text()")[0]
+  except IndexError as e:
+    error = e
+  output = ([{"error_field": "b", "message": error}],
+            [{"a": tree.xpath("/docket/a/text()")[0], "b": "plain"}])
+  assert retaining_values(output) == [("output[0][0]['message']", "IndexError"),
+                                      ("output[1][0]['a']", "_ElementUnicodeResult")]
+  assert retaining_values(([], [{"a": "plain"}])) == []
+
+def test_profile_reports_top_sites(corpus):
+  keep = []
+  def leaky(path):
+    keep.append(bytearray(10000))
+    return [], []
+  result = profile(leaky, corpus[:20], keep=False)
+  assert result["retained_per_item"] >= 10000
+  assert "test_memory.py" in result["top_sites"][0]
@@ -0,0 +1,54 @@
+from DocketQuery.docket_query import AskADocket, list_dockets
+from DocketQuery.saved_functions import docket_num_name_age, conviction_information
+from DocketQuery.packs import convert_corpus, PackIndex, SAVED_FUNCTION_SECTIONS
+from DocketQuery.synthetic import write_corpus
+import os
+import shutil
+import pytest
+
+
+class TestPacks:
+
+  def setup_method(self, method):
+    self.directory = "tests/output/packs_corpus/"
+    self.packs = "tests/output/packs/"
+    for directory in [self.directory, self.packs]:
+      if os.path.exists(directory):
+        shutil.rmtree(directory)
+    self.files = write_corpus(self.directory, 20, seed=23)
+    with open(self.directory + "CP-51-CR-0000099-2011_broken.xml", "w") as f:
+      f.write("<docket><header>")
+
+  @pytest.mark.parametrize("sections", [None, SAVED_FUNCTION_SECTIONS])
+  @pytest.mark.parametrize("backend", ["tree", "target"])
+  def test_same_results_as_xml(self, sections, backend):
+    index = convert_corpus(sorted(list_dockets(self.directory)), self.packs,
+                           sections=sections, pack_size=20000)
+    assert len(index) == 20
+    assert len(index.packs) > 1
+    for function in [docket_num_name_age, conviction_information]:
+      scraper = AskADocket(function, backend=backend)
+      expected = scraper.scrape_files(self.files)
+      assert scraper.scrape_pack(self.packs) == expected
+      assert scraper.scrape_pack(self.packs, workers=2, chunksize=3) == expected
+
+  def test_tree(self):
+    index = convert_corpus(self.files, self.packs)
+    docket = index.dockets()[0]
+    assert docket.name == self.files[0]
+    assert docket.tree().xpath("/docket/header/docket_number/text()") == ["CP-51-CR-0000001-2011"]
+
+  def test_sections(self):
+    index = convert_corpus(self.files, self.packs, sections=["Case_Information"])
+    tree = index.dockets()[0].tree()
+    assert tree.xpath("/docket/section/@name") == ["Case_Information"]
+    assert tree.xpath("/docket/header/docket_number/text()") == ["CP-51-CR-0000001-2011"]
+    with pytest.raises(ValueError):
+      convert_corpus(self.files, self.packs)
+
+  def test_add_to_pack(self):
+    convert_corpus(self.files[:5], self.packs)
+    index = convert_corpus(self.files, self.packs)
+    assert [docket.name for docket in index.dockets()] == self.files
+    assert len(index.packs) == 2
+    assert len(PackIndex.load(self.packs)) == 20
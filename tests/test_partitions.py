@@ -0,0 +1,56 @@
+from DocketQuery.docket_query import AskADocket
+from DocketQuery.saved_functions import docket_number_and_name
+from DocketQuery.partitions import partition_of, partition_path, partition_corpus, \
+                                   matches, Catalog
+from DocketQuery.synthetic import write_corpus
+import os
+import shutil
+import pytest
+
+
+def test_partition_of():
+  partition = partition_of("x/CP-51-CR-0000001-2011_stitched_complete.xml")
+  assert partition == {"court": "CP", "county": "51", "year": "2011"}
+  assert partition_path(partition) == os.path.join("court=CP", "county=51", "year=2011")
+  assert partition_of("x/unnamed.xml")["year"] == "unknown"
+
+def test_matches():
+  partition = {"court": "CP", "county": "51", "year": "2011"}
+  assert matches(partition, None)
+  assert matches(partition, {"county": 51})
+  assert matches(partition, {"year": ["2010", "2011"], "court": "CP"})
+  assert not matches(partition, {"county": "02"})
+  assert matches(partition, lambda p: int(p["year"]) > 2010)
+
+
+class TestPartitionedCorpus:
+
+  def setup_method(self, method):
+    self.flat = "tests/output/flat_corpus/"
+    self.root = "tests/output/partitioned_corpus/"
+    for directory in [self.flat, self.root]:
+      if os.path.exists(directory):
+        shutil.rmtree(directory)
+    self.files = write_corpus(self.flat, 24, seed=16, counties=("51", "02"),
+                              years=(2011, 2012, 2013))
+    self.catalog = partition_corpus(self.files, self.root)
+
+  def test_catalog(self):
+    assert len(self.catalog.partitions) == 6
+    assert sum(p["files"] for p in self.catalog.partitions) == 24
+    loaded = Catalog.load(self.root)
+    assert loaded.partitions == self.catalog.partitions
+    assert len(self.catalog.select({"county": "02"})) == 3
+    assert len(self.catalog.files({"county": "02", "year": "2011"})) == 4
+
+  def test_scrape_partitions(self):
+    scraper = AskADocket(docket_number_and_name)
+    errors, results, counts = scraper.scrape_partitions(
+      Catalog.load(self.root), where={"county": "51", "year": ["2012", "2013"]},
+      workers=2, chunksize=2)
+    assert counts["partitions_scanned"] == 2
+    assert counts["partitions_pruned"] == 4
+    assert counts["total_dockets_scraped"] == 8
+    for result in results:
+      assert result["docket_number"].startswith("CP-51-")
+      assert result["docket_number"][-4:] in ("2012", "2013")
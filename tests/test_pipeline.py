@@ -0,0 +1,146 @@
+from DocketQuery.docket_query import AskADocket, dicts2csv
+from DocketQuery.saved_functions import conviction_information, docket_num_name_age
+from DocketQuery.aggregation import Aggregator
+from DocketQuery.dates import normalize_dates
+from DocketQuery.pipeline import Pipeline, CsvOutput, row_matches, resolve
+from DocketQuery.text_index import TextIndex
+from DocketQuery.synthetic import write_corpus
+from io import StringIO
+import os
+import shutil
+import pytest
+
+
+def fails_on_2012(docket_tree, file_name):
+  # A saved function that raises on some dockets.
+  if "-2012_" in file_name:
+    raise ValueError(file_name)
+  return [], [{"file": file_name}]
+
+
+def test_row_matches():
+  assert row_matches({"grade": "F1"}, None)
+  assert row_matches({"grade": "F1", "year": 2011}, {"grade": ["F1", "F2"], "year": "2011"})
+  assert not row_matches({"grade": "M1"}, {"grade": ["F1", "F2"]})
+  assert not row_matches({}, {"grade": "F1"})
+
+def test_resolve():
+  assert resolve("conviction_information", "DocketQuery.saved_functions") is conviction_information
+  assert resolve("DocketQuery.dates.normalize_dates", "DocketQuery.saved_functions") is normalize_dates
+  with pytest.raises(ValueError):
+    resolve("no_such_function", "DocketQuery.saved_functions")
+
+
+class TestPipeline:
+
+  def setup_method(self, method):
+    self.directory = "tests/output/pipeline_corpus/"
+    self.output = "tests/output/pipeline_test/"
+    for directory in [self.directory, self.output]:
+      if os.path.exists(directory):
+        shutil.rmtree(directory)
+    self.files = sorted(write_corpus(self.directory, 24, seed=27, years=(2011, 2012)))
+
+  def spec(self, **options):
+    spec = {"input": {"directory": self.directory},
+            "counts": self.output + "counts.csv",
+            "stages": [
+              {"name": "convictions", "function": "conviction_information",
+               "transforms": ["normalize_dates"],
+               "results": self.output + "convictions.csv",
+               "errors": self.output + "conviction_errors.csv",
+               "aggregations": [{"by": ["grade"], "values": ["max_time"],
+                                 "output": self.output + "by_grade.csv"}]},
+              {"name": "people", "function": "docket_num_name_age",
+               "results": self.output + "people.csv"}]}
+    spec.update(options)
+    return spec
+
+  def read(self, name):
+    with open(self.output + name, newline="") as f:
+      return f.read()
+
+  def expected(self, scraper, files):
+    errors, results, counts = scraper.scrape_files(files)
+    errors_file, results_file = dicts2csv(errors, results, StringIO(), StringIO())
+    return errors_file.getvalue(), results_file.getvalue(), results
+
+  @pytest.mark.parametrize("workers", [1, 2])
+  def test_same_outputs_as_separate_scrapes(self, workers):
+    counts = Pipeline.from_spec(self.spec(workers=workers, batch_size=5)).run()
+    errors, results, rows = self.expected(AskADocket(conviction_information, [normalize_dates]),
+                                          self.files)
+    assert self.read("convictions.csv") == results
+    assert self.read("conviction_errors.csv") == errors
+    assert self.read("people.csv") == self.expected(AskADocket(docket_num_name_age), self.files)[1]
+    assert counts["total_dockets_scraped"] == counts["successes"] == 24
+    assert counts["convictions_rows"] == len(rows)
+    assert counts["people_rows"] == 24
+    aggregator = Aggregator(["grade"], ["max_time"])
+    aggregator.add_all(rows)
+    by_grade = StringIO()
+    dicts2csv([], aggregator.rows(), StringIO(), by_grade)
+    assert self.read("by_grade.csv") == by_grade.getvalue()
+    assert self.read("counts.csv").splitlines()[0].startswith("total_dockets_scraped,successes")
+
+  def test_failing_stage_keeps_other_stages(self):
+    spec = self.spec()
+    spec["stages"].append({"name": "flaky", "function": "tests.test_pipeline.fails_on_2012",
+                           "results": self.output + "flaky.csv"})
+    counts = Pipeline.from_spec(spec).run()
+    assert self.read("people.csv") == self.expected(AskADocket(docket_num_name_age), self.files)[1]
+    assert counts["successes"] == counts["people_successes"] == 24
+    assert counts["flaky_successes"] == counts["flaky_rows"] == 12
+
+  @pytest.mark.parametrize("workers", [1, 2])
+  def test_text_index_stage(self, workers):
+    spec = self.spec(workers=workers, batch_size=5)
+    spec["stages"].append({"name": "texts", "function": "sentence_texts",
+                           "text_index": self.output + "texts.sqlite"})
+    counts = Pipeline.from_spec(spec).run()
+    assert counts["texts_successes"] == 24
+    with TextIndex(self.output + "texts.sqlite") as index, \
+         TextIndex(self.output + "expected.sqlite") as expected:
+      expected.add_files(self.files)
+      assert index.signatures() == expected.signatures()
+      assert len(index) == len(expected) == counts["texts_rows"]
+      for query in ["house arrest", "community service"]:
+        assert index.search(query) == expected.search(query)
+      # The files were indexed in the pipeline's pass, so none is read again.
+      errors, index_counts = index.add_files(self.files)
+      assert index_counts["files_skipped"] == 24
+
+  def test_filters(self):
+    spec = self.spec(filters={"year": 2012})
+    spec["stages"][0]["where"] = {"grade": ["F1", "F2"]}
+    counts = Pipeline.from_spec(spec).run()
+    files = [path for path in self.files if "-2012_" in path]
+    assert counts["total_dockets_scraped"] == len(files) == 12
+    rows = self.expected(AskADocket(conviction_information, [normalize_dates]), files)[2]
+    assert counts["convictions_rows"] == len([row for row in rows if row["grade"] in ("F1", "F2")])
+
+  def test_empty_outputs(self):
+    spec = self.spec(input={"files": self.directory + "nothing-*.xml"})
+    Pipeline.from_spec(spec).run()
+    assert self.read("convictions.csv") == "No results reported\r\n"
+    assert self.read("conviction_errors.csv") == "No errors reported\r\n"
+
+  def test_bad_specs(self):
+    with pytest.raises(ValueError):
+      Pipeline.from_spec(self.spec(stages=[]))
+    with pytest.raises(ValueError):
+      Pipeline.from_spec(self.spec(outputs="x"))
+    with pytest.raises(ValueError):
+      Pipeline.from_spec(self.spec(stages=[{"function": "no_such_function"}]))
+    with pytest.raises(ValueError):
+      Pipeline.from_spec(self.spec(input={}))
+    with pytest.raises(ValueError):
+      Pipeline.from_spec(self.spec(stages=[{"function": "docket_num_name_age"},
+                                           {"function": "docket_num_name_age"}]))
+
+  def test_rows_with_new_fields_fail(self):
+    output = CsvOutput(self.output + "rows.csv", "No results reported")
+    output.write([{"a": 1}])
+    with pytest.raises(ValueError):
+      output.write([{"a": 2, "b": 3}])
+    output.close()
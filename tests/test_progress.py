@@ -0,0 +1,104 @@
+from DocketQuery.docket_query import AskADocket
+from DocketQuery.saved_functions import conviction_information
+from DocketQuery.aggregation import Aggregator
+from DocketQuery.progress import Progress, format_seconds
+from DocketQuery.synthetic import write_corpus
+from io import StringIO
+import json
+import os
+import pytest
+
+
+class FakeClock:
+
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+
+def test_format_seconds():
+  assert format_seconds(None) == "unknown"
+  assert format_seconds(75) == "1m15s"
+  assert format_seconds(3725) == "1h02m"
+
+def test_progress_metrics():
+  clock = FakeClock()
+  stream = StringIO()
+  progress = Progress(interval=5, stream=stream, clock=clock)
+  progress.start(100)
+  clock.now = 2.0
+  progress.update({"total_dockets_scraped": 10, "successes": 9}, rows=30, errors=4)
+  assert stream.getvalue() == ""
+  clock.now = 10.0
+  progress.update({"total_dockets_scraped": 10, "successes": 10}, rows=20)
+  metrics = progress.snapshot()
+  assert metrics["files_done"] == 20
+  assert metrics["failures"] == 1
+  assert metrics["dockets_per_second"] == 2.0
+  assert metrics["rows_per_second"] == 5.0
+  assert metrics["error_rate"] == 0.05
+  assert metrics["eta_seconds"] == 40.0
+  assert stream.getvalue().startswith("20/100 dockets (20.0%)")
+
+def test_progress_unknown_total():
+  clock = FakeClock()
+  stream = StringIO()
+  progress = Progress(interval=0, stream=stream, clock=clock)
+  progress.start(None)
+  clock.now = 2.0
+  progress.update({"total_dockets_scraped": 10, "successes": 10}, rows=30)
+  assert progress.snapshot()["eta_seconds"] is None
+  assert stream.getvalue().startswith("10/? dockets, 5.0 dockets/s")
+
+def test_progress_exports(tmp_path):
+  prometheus_file = str(tmp_path / "metrics.prom")
+  jsonl_file = str(tmp_path / "metrics.jsonl")
+  clock = FakeClock()
+  progress = Progress(interval=1, stream=None, prometheus_file=prometheus_file,
+                      jsonl_file=jsonl_file, clock=clock)
+  progress.start(4)
+  clock.now = 1.0
+  progress.update({"total_dockets_scraped": 2, "successes": 2}, rows=6)
+  clock.now = 2.0
+  progress.update({"total_dockets_scraped": 2, "successes": 2}, rows=6)
+  with open(prometheus_file) as f:
+    text = f.read()
+  assert "# TYPE docketquery_files_done counter" in text
+  assert "docketquery_files_done 4" in text
+  assert "docketquery_eta_seconds 0.0" in text
+  with open(jsonl_file) as f:
+    lines = [json.loads(line) for line in f]
+  assert [line["files_done"] for line in lines] == [2, 4]
+
+
+class TestScrapeProgress:
+
+  def setup_method(self, method):
+    self.directory = "tests/output/progress_corpus/"
+    write_corpus(self.directory, 20, seed=9)
+
+  def test_scrape_directory_progress(self):
+    stream = StringIO()
+    progress = Progress(interval=0, stream=stream)
+    errors, results, counts = AskADocket(conviction_information).scrape_directory(
+      self.directory, progress=progress)
+    metrics = progress.snapshot()
+    assert metrics["files_total"] == 20
+    assert metrics["files_done"] == 20
+    assert metrics["rows"] == len(results)
+    assert len(stream.getvalue().splitlines()) == 21
+
+  def test_parallel_workers(self):
+    serial = AskADocket(conviction_information).scrape_directory(self.directory)
+    progress = Progress(interval=0, stream=None)
+    errors, results, counts = AskADocket(conviction_information).scrape_directory(
+      self.directory, workers=2, progress=progress)
+    assert results == serial[1]
+    assert progress.snapshot()["rows"] == len(results)
+    aggregate_progress = Progress(interval=0, stream=None)
+    AskADocket(conviction_information).aggregate_directory(
+      self.directory, Aggregator(["grade"], ["max_time"]), workers=2,
+      chunksize=3, progress=aggregate_progress)
+    assert aggregate_progress.snapshot()["rows"] == len(results)
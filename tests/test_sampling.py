@@ -0,0 +1,103 @@
+from DocketQuery.docket_query import AskADocket, docket_number_parts
+from DocketQuery.saved_functions import conviction_information, docket_num_name_age
+from DocketQuery.sampling import reservoir_sample, sample_files, allocate, \
+                                 OnlineStats, estimate
+from DocketQuery.synthetic import write_corpus
+from DocketQuery import sampling
+import random
+import statistics
+import pytest
+
+
+def test_docket_number_parts():
+  parts = docket_number_parts("CP-51-CR-0000001-2011")
+  assert parts["court"] == "CP"
+  assert parts["county"] == "51"
+  assert parts["year"] == "2011"
+  assert docket_number_parts("not a docket")["year"] == "unknown"
+
+def test_reservoir_sample():
+  sample = reservoir_sample(range(1000), 10, random.Random(1))
+  assert len(sample) == 10
+  assert sample == sorted(sample)
+  assert sample == reservoir_sample(range(1000), 10, random.Random(1))
+  assert reservoir_sample(range(5), 10, random.Random(1)) == [0, 1, 2, 3, 4]
+
+def test_allocate():
+  allocation = allocate({("2011",): 75, ("2012",): 25}, 8)
+  assert allocation == {("2011",): 6, ("2012",): 2}
+  assert allocate({("2011",): 3}, 8) == {("2011",): 3}
+
+def test_stratified_sample_files():
+  files = ["CP-51-CR-{:07d}-{}_stitched_complete.xml".format(i, 2011 + i % 4)
+           for i in range(400)]
+  sample = sample_files(files, 40, seed=3, stratify=["year"])
+  assert len(sample) == 40
+  for year in ["2011", "2012", "2013", "2014"]:
+    assert len([path for path in sample if year in path]) == 10
+  assert sample == sample_files(files, 40, seed=3, stratify=["year"])
+
+def test_online_stats():
+  values = [3.0, 1.5, 9.0, 4.25, 7.0, 2.0]
+  stats = OnlineStats()
+  for value in values: stats.add(value)
+  assert stats.mean == pytest.approx(statistics.mean(values))
+  assert stats.variance() == pytest.approx(statistics.variance(values))
+  left, right = OnlineStats(), OnlineStats()
+  for value in values[:2]: left.add(value)
+  for value in values[2:]: right.add(value)
+  merged = left.merge(right)
+  assert merged.count == 6
+  assert merged.variance() == pytest.approx(statistics.variance(values))
+  low, high = merged.confidence_interval()
+  assert low < merged.mean < high
+
+def test_estimate():
+  results = [{"grade": "F1", "max_time": 100}, {"grade": "F1", "max_time": 300},
+             {"grade": "M1", "max_time": 50}, {"grade": "M1", "max_time": "unknown"}]
+  estimates = estimate(results, "max_time", by=["grade"])
+  assert estimates[0]["grade"] == "F1"
+  assert estimates[0]["mean"] == 200
+  assert estimates[1]["n"] == 1
+  rates = estimate(results, lambda row: row["grade"] == "F1")
+  assert rates[0]["mean"] == 0.5
+
+
+class TestSampleDirectory:
+
+  def setup_method(self, method):
+    self.corpus = write_corpus("tests/output/sample_corpus/", 30, seed=2,
+                               years=(2011, 2012, 2013))
+
+  def test_sample_directory(self):
+    scraper = AskADocket(docket_num_name_age)
+    errors, results, counts = scraper.sample_directory("tests/output/sample_corpus/", 9, seed=5)
+    assert counts["population"] == 30
+    assert counts["total_dockets_scraped"] == 9
+    assert len(results) == 9
+    again = scraper.sample_directory("tests/output/sample_corpus/", 9, seed=5)[1]
+    assert [r["docket_number"] for r in results] == [r["docket_number"] for r in again]
+    assert [r["docket_number"] for r in results] == sorted(r["docket_number"] for r in results)
+
+  def test_sample_directory_streams_listing(self, monkeypatch):
+    # The reservoir gets the listing itself, not a list of it.
+    given = []
+    real_sample_files = sampling.sample_files
+    def sample_files(files, n, **options):
+      given.append(files)
+      return real_sample_files(files, n, **options)
+    monkeypatch.setattr(sampling, "sample_files", sample_files)
+    errors, results, counts = AskADocket(docket_num_name_age).sample_directory(
+      "tests/output/sample_corpus/", 9, seed=5)
+    assert not isinstance(given[0], (list, tuple))
+    assert counts["population"] == 30
+    assert len(results) == 9
+
+  def test_stratified_estimate(self):
+    scraper = AskADocket(conviction_information)
+    errors, results, counts = scraper.sample_directory("tests/output/sample_corpus/", 12,
+                                                       seed=1, stratify=["year"])
+    years = {docket_number_parts(r["docket_number"])["year"] for r in results}
+    assert years <= {"2011", "2012", "2013"}
+    for row in estimate(results, "max_time", by=["grade"]):
+      assert row["ci_low"] <= row["mean"] <= row["ci_high"]
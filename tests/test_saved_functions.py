@@ -1,7 +1,10 @@
 from DocketQuery.saved_functions import docket_number_and_name, \
                                         docket_num_name_age, \
                                         conviction_information, \
-                                        get_actions_with_sentences
+                                        get_actions_with_sentences, \
+                                        first_text, xpath_text
+from DocketQuery.docket_query import parse_docket
+from DocketQuery.synthetic import write_corpus
 from lxml import etree
 import re
 from io import StringIO
@@ -33,8 +36,22 @@ def test_conviction_information():
 
 
 
+def test_parse_docket_gives_same_results():
+  # Dropping blank text while parsing doesn't change what gets scraped.
+  for path in write_corpus("tests/output/parse_docket/", 10, seed=17):
+    for function in [docket_num_name_age, conviction_information]:
+      assert function(parse_docket(path), path) == function(etree.parse(path), path)
+
 
 #Testing helpers
+def test_first_text():
+  element = etree.parse(StringIO("<action><judge_name>  Hill, Glynnis </judge_name></action>"))
+  assert first_text(xpath_text("/action/judge_name/text()"), element) == "Hill, Glynnis"
+  assert type(first_text(xpath_text("/action/judge_name/text()"), element)) is str
+  with pytest.raises(IndexError):
+    first_text(xpath_text("/action/date/text()"), element)
+
+
 def test_get_actions_with_sentences():
   sequence = etree.parse(StringIO("""<sequence>
             <sequence_num>1</sequence_num>
@@ -0,0 +1,67 @@
+from DocketQuery.docket_query import AskADocket, chunk_files
+from DocketQuery.saved_functions import conviction_information
+from DocketQuery.aggregation import Aggregator
+from DocketQuery.scheduling import docket_sizes, size_chunks
+from DocketQuery.synthetic import write_corpus
+from DocketQuery import snapshot
+import os
+import shutil
+
+
+def test_size_chunks():
+  files = ["f{}".format(i) for i in range(10)]
+  sizes = [1, 1, 1, 1, 100, 1, 1, 50, 1, 1]
+  chunks = size_chunks(files, 2, sizes, chunks_per_worker=2)
+  assert sorted(sum(chunks, [])) == sorted(files)
+  # Largest first, each big docket alone, and chunks never grow.
+  assert chunks[0] == ["f4"]
+  assert chunks[1] == ["f7"]
+  chunk_bytes = [sum(sizes[files.index(f)] for f in chunk) for chunk in chunks]
+  assert chunk_bytes == sorted(chunk_bytes, reverse=True)
+
+def test_size_chunks_max_chunksize():
+  files = ["f{}".format(i) for i in range(10)]
+  chunks = size_chunks(files, 1, [1] * 10, chunks_per_worker=1, max_chunksize=3)
+  assert [len(chunk) for chunk in chunks] == [3, 3, 3, 1]
+
+def test_chunk_files_in_order_without_schedule():
+  files = list(range(7))
+  assert chunk_files(files, 4, 3) == [[0, 1, 2], [3, 4, 5], [6]]
+  assert chunk_files(files, 1, 3, schedule="size") == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+class TestScheduledScrape:
+
+  def setup_method(self, method):
+    self.directory = "tests/output/scheduling_corpus/"
+    if os.path.exists(self.directory):
+      shutil.rmtree(self.directory)
+    self.files = write_corpus(self.directory, 30, seed=24)
+
+  def test_docket_sizes(self):
+    sizes = docket_sizes(self.files)
+    assert sizes == [os.path.getsize(path) for path in self.files]
+    manifest = "tests/output/scheduling_manifest.json"
+    snapshot.record(manifest, self.files[:10], AskADocket(conviction_information), [])
+    os.truncate(self.files[0], 0)
+    # Sizes in the manifest win over the files.
+    assert docket_sizes(self.files + ["nope.xml"], manifest) == sizes + [0]
+
+  def test_same_rows(self):
+    scraper = AskADocket(conviction_information)
+    errors, results, counts = scraper.scrape_files(self.files)
+    scheduled_errors, scheduled_results, scheduled_counts = scraper.scrape_files(
+      self.files, workers=3, chunksize=4, schedule="size")
+    key = lambda row: sorted(row.items())
+    assert sorted(scheduled_results, key=key) == sorted(results, key=key)
+    assert len(scheduled_errors) == len(errors)
+    assert scheduled_counts == counts
+
+  def test_aggregate(self):
+    scraper = AskADocket(conviction_information)
+    plain = scraper.aggregate_files(self.files, Aggregator(["grade"], ["max_time"]))[1]
+    scheduled = scraper.aggregate_files(self.files, Aggregator(["grade"], ["max_time"]),
+                                        workers=2, schedule="size")[1]
+    assert len(plain.rows()) > 0
+    assert [row["max_time_count"] for row in scheduled.rows()] == \
+           [row["max_time_count"] for row in plain.rows()]
@@ -0,0 +1,120 @@
+from DocketQuery.docket_query import AskADocket
+from DocketQuery.saved_functions import conviction_information
+from DocketQuery.server import Corpus, QueryServer, csv_chunks, json_chunks
+from DocketQuery.synthetic import write_corpus
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen
+from urllib.error import HTTPError
+import csv
+import io
+import json
+import os
+import shutil
+import threading
+import pytest
+
+
+def test_csv_chunks():
+  rows = [{"a": i, "b": "x"} for i in range(1200)]
+  chunks = list(csv_chunks(iter(rows)))
+  assert len(chunks) == 3
+  parsed = list(csv.DictReader(io.StringIO("".join(chunks))))
+  assert len(parsed) == 1200
+  assert list(csv_chunks(iter([]))) == ["No results reported\r\n"]
+
+def test_json_chunks():
+  rows = [{"a": i} for i in range(1200)]
+  assert json.loads("".join(json_chunks(iter(rows)))) == rows
+  assert json.loads("".join(json_chunks(iter([])))) == []
+
+
+class TestQueryServer:
+
+  def setup_method(self, method):
+    self.directory = "tests/output/server_corpus/"
+    write_corpus(self.directory, 12, seed=6, years=(2011, 2012))
+    self.corpus = Corpus(self.directory, workers=2)
+    self.server = QueryServer(("127.0.0.1", 0), self.corpus)
+    self.thread = threading.Thread(target=self.server.serve_forever)
+    self.thread.start()
+    self.url = "http://127.0.0.1:{}".format(self.server.server_address[1])
+
+  def teardown_method(self, method):
+    self.server.shutdown()
+    self.server.server_close()
+    self.thread.join()
+
+  def get(self, path):
+    with urlopen(self.url + path) as response:
+      return response.read().decode("utf-8")
+
+  def test_select(self):
+    assert len(self.corpus.select()) == 12
+    assert len(self.corpus.select("CP-51-CR-*-2012")) == 6
+
+  def test_query_csv(self):
+    errors, expected, counts = AskADocket(conviction_information).scrape_directory(self.directory)
+    body = self.get("/query?function=conviction_information")
+    rows = list(csv.DictReader(io.StringIO(body), quotechar='|'))
+    assert len(rows) == len(expected)
+    assert {row["docket_number"] for row in rows} == \
+           {result["docket_number"] for result in expected}
+
+  def test_query_json_is_cached(self):
+    first = json.loads(self.get("/query?function=docket_num_name_age&format=json&match=CP-51-CR-*-2011"))
+    assert len(first) == 6
+    assert len(self.corpus.cache) == 6
+    again = json.loads(self.get("/query?function=docket_num_name_age&format=json&match=CP-51-CR-*-2011"))
+    assert again == first
+    stats = json.loads(self.get("/stats"))
+    assert stats["dockets"] == 12
+    assert stats["cached_results"] == 6
+    assert len(stats["recent_requests"]) == 2
+
+  def test_concurrent_queries(self):
+    path = "/query?function=conviction_information&format=json"
+    with ThreadPoolExecutor(max_workers=4) as pool:
+      bodies = list(pool.map(self.get, [path] * 4))
+    assert all(json.loads(body) == json.loads(bodies[0]) for body in bodies)
+
+  def test_unknown_function(self):
+    with pytest.raises(HTTPError) as error:
+      self.get("/query?function=nope")
+    assert error.value.code == 400
+
+
+class TestCorpus:
+
+  def setup_method(self, method):
+    self.directory = "tests/output/server_failures/"
+    self.files = write_corpus(self.directory, 4, seed=30)
+    self.broken = self.directory + "CP-51-CR-0000009-2011_stitched_complete.xml"
+    with open(self.broken, "w") as f:
+      f.write("<docket><header>")
+    self.corpus = Corpus(self.directory, workers=4)
+
+  def teardown_method(self, method):
+    os.remove(self.broken)
+
+  def test_failures_are_reported_and_retried(self):
+    (errors, results), = self.corpus.run("conviction_information", [self.broken])
+    assert results == []
+    assert [error["error_file"] for error in errors] == [self.broken]
+    assert ("conviction_information", self.broken) not in self.corpus.cache
+    shutil.copy(self.files[0], self.broken)
+    (errors, results), = self.corpus.run("conviction_information", [self.broken])
+    assert results
+    assert ("conviction_information", self.broken) in self.corpus.cache
+
+  def test_concurrent_requests_scrape_once(self, monkeypatch):
+    calls = []
+    scrape_docket = AskADocket.scrape_docket
+    def counted(scraper, path):
+      calls.append(path)
+      return scrape_docket(scraper, path)
+    monkeypatch.setattr(AskADocket, "scrape_docket", counted)
+    with ThreadPoolExecutor(max_workers=4) as requests:
+      outcomes = list(requests.map(lambda _: list(self.corpus.run("docket_num_name_age", self.files)),
+                                   range(4)))
+    assert all(outcome == outcomes[0] for outcome in outcomes)
+    assert sorted(calls) == sorted(self.files)
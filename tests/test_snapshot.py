@@ -0,0 +1,78 @@
+from DocketQuery.docket_query import AskADocket, list_dockets, dicts2csv
+from DocketQuery.saved_functions import docket_num_name_age, conviction_information
+from DocketQuery.dates import normalize_dates
+from DocketQuery import snapshot
+from DocketQuery.synthetic import write_corpus
+import os
+import shutil
+import pytest
+
+
+def test_function_identity():
+  identity = snapshot.function_identity(conviction_information)
+  assert identity["name"] == "DocketQuery.saved_functions.conviction_information"
+  assert identity == snapshot.function_identity(conviction_information)
+  assert identity["source_sha1"] != snapshot.function_identity(normalize_dates)["source_sha1"]
+
+
+def test_identity_covers_imported_modules(monkeypatch):
+  identity = snapshot.function_identity(conviction_information)
+  module_source = snapshot.module_source
+  def edited(module):
+    source = module_source(module)
+    if module.__name__ == "DocketQuery.extraction":
+      source += b"\n# An edit.\n"
+    return source
+  monkeypatch.setattr(snapshot, "module_source", edited)
+  assert snapshot.function_identity(conviction_information) != identity
+
+
+class TestSnapshot:
+
+  def setup_method(self, method):
+    self.directory = "tests/output/snapshot_corpus/"
+    if os.path.exists(self.directory):
+      shutil.rmtree(self.directory)
+    write_corpus(self.directory, 5, seed=14)
+    self.dest = "tests/output/snapshot_results/"
+    if not os.path.exists(self.dest):
+      os.makedirs(self.dest)
+    self.manifest = self.dest + "manifest.json"
+    self.scraper = AskADocket(docket_num_name_age)
+    self.files = sorted(list_dockets(self.directory))
+    errors, results, counts = self.scraper.scrape_files(self.files)
+    self.outputs = [self.dest + "errors.csv", self.dest + "results.csv"]
+    with open(self.outputs[0], "w") as errors_file, open(self.outputs[1], "w") as results_file:
+      dicts2csv(errors, results, errors_file, results_file)
+    snapshot.record(self.manifest, self.files, self.scraper, self.outputs)
+
+  def test_current(self):
+    assert snapshot.changes(self.manifest, self.files, self.scraper) == []
+    assert snapshot.is_current(self.manifest, self.files, self.scraper)
+
+  def test_touched_input_is_current(self):
+    os.utime(self.files[0], ns=(0, 0))
+    assert snapshot.is_current(self.manifest, self.files, self.scraper)
+
+  def test_changed_input(self):
+    with open(self.files[0], "a") as f:
+      f.write("\n<!-- re-downloaded -->\n")
+    assert snapshot.changes(self.manifest, self.files, self.scraper) == ["1 input files changed"]
+
+  def test_new_and_removed_inputs(self):
+    extra = write_corpus("tests/output/snapshot_extra/", 1, seed=15)
+    reasons = snapshot.changes(self.manifest, self.files[1:] + extra, self.scraper)
+    assert reasons == ["1 new input files", "1 input files are gone"]
+
+  def test_changed_scraper(self):
+    assert not snapshot.is_current(self.manifest, self.files,
+                                   AskADocket(docket_num_name_age, transforms=[normalize_dates]))
+    assert not snapshot.is_current(self.manifest, self.files,
+                                   AskADocket(conviction_information))
+
+  def test_changed_output(self):
+    os.remove(self.outputs[1])
+    assert not snapshot.is_current(self.manifest, self.files, self.scraper)
+
+  def test_missing_manifest(self):
+    assert not snapshot.is_current(self.dest + "nope.json", self.files, self.scraper)
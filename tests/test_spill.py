@@ -0,0 +1,60 @@
+from DocketQuery.docket_query import AskADocket, dicts2csv
+from DocketQuery.saved_functions import conviction_information
+from DocketQuery.spill import SpillList
+from DocketQuery.synthetic import write_corpus
+from io import StringIO
+import os
+import pytest
+
+
+def test_spill_list():
+  items = SpillList(3)
+  items += [{"n": i} for i in range(5)]
+  items.append({"n": 5})
+  items.extend([{"n": 6}, {"n": 7}])
+  assert len(items) == 8
+  assert items.spilled == 6
+  assert len(items.segments) == 2
+  assert list(items) == [{"n": i} for i in range(8)]
+  assert items[0] == {"n": 0}
+  assert items[4] == {"n": 4}
+  assert items[-1] == {"n": 7}
+  assert items[2:4] == [{"n": 2}, {"n": 3}]
+  assert items == [{"n": i} for i in range(8)]
+  with pytest.raises(IndexError):
+    items[8]
+
+def test_spill_list_cleanup():
+  items = SpillList(1)
+  items += [1, 2]
+  directory = items.directory
+  assert os.path.exists(directory)
+  items.close()
+  assert not os.path.exists(directory)
+  assert len(items) == 0
+  assert not items
+
+def test_spill_list_limit():
+  with pytest.raises(ValueError):
+    SpillList(0)
+
+
+class TestSpillScrape:
+
+  def setup_method(self, method):
+    self.directory = "tests/output/spill_corpus/"
+    write_corpus(self.directory, 15, seed=20)
+
+  def test_same_results_as_lists(self):
+    scraper = AskADocket(conviction_information)
+    errors, results, counts = scraper.scrape_directory(self.directory)
+    spilled_errors, spilled_results, spilled_counts = scraper.scrape_directory(
+      self.directory, spill_after=4, workers=2, chunksize=3)
+    assert isinstance(spilled_results, SpillList)
+    assert spilled_results.spilled > 0
+    assert spilled_results == results
+    assert spilled_counts == counts
+    expected = dicts2csv(errors, results, StringIO(), StringIO())
+    written = dicts2csv(spilled_errors, spilled_results, StringIO(), StringIO())
+    assert written[1].getvalue() == expected[1].getvalue()
+    assert written[0].getvalue() == expected[0].getvalue()
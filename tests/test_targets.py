@@ -0,0 +1,87 @@
+from DocketQuery.docket_query import AskADocket, parse_docket
+from DocketQuery.saved_functions import docket_num_name_age, conviction_information, \
+                                        docket_number_and_name
+from DocketQuery import targets
+from DocketQuery.synthetic import write_corpus, docket_xml, sequence_xml, \
+                                  action_xml, sentence_xml
+from DocketQuery.extraction import HEADER_QUERIES, header_text, guilty_sentences
+from scripts.guilty_records_query import Docket, load_tree_from_path
+from io import BytesIO
+import pytest
+
+
+def odd_docket():
+  # Missing fields, a sentence in days, a guilty sequence without a
+  # sentence length, a non-guilty sequence with one, an action whose
+  # sentence has no length, and fields with mixed content.
+  days = sentence_xml("Probation", ("10", "days"), ("20", "days"), "03/02/2011")
+  mixed = sentence_xml("Confinement", ("2", "years"), ("4", "years"), "09/09/2011") \
+    .replace("<program>Confinement</program>", "<program>Conf<b>x</b>tail</program>") \
+    .replace("<unit>years</unit>", "<unit> <b>x</b>years</unit>", 1)
+  years = sentence_xml("Confinement", ("7 1/2", "years"), ("15", "years"), "09/09/2011")
+  no_length = """
+              <sentence_info>
+                <program>Costs</program>
+              </sentence_info>"""
+  sequences = [
+    sequence_xml(1, "Simple Assault", "Guilty", "M2", "18 § 2701 §§ A",
+                 [action_xml("Hill, Glynnis", "03/02/2011", [days, no_length]),
+                  action_xml("Hill, Glynnis", "03/09/2011")]),
+    sequence_xml(2, "Rape", "Guilty Plea - Negotiated", "F1", "18 § 3121 §§ A1",
+                 [action_xml("Hill, Glynnis", "09/09/2011", [years])])
+      .replace("<grade>F1</grade>", "<grade></grade>")
+      .replace("<judge_name>Hill, Glynnis</judge_name>", ""),
+    sequence_xml(3, "Theft", "Guilty", "M1", "18 § 3921 §§ A",
+                 [action_xml("Hill, Glynnis", "09/09/2011", [no_length])]),
+    sequence_xml(4, "Robbery", "Nolle Prossed", "F1", "18 § 3701 §§ A1I",
+                 [action_xml("Hill, Glynnis", "09/09/2011", [years])]),
+    sequence_xml(5, "Burglary", "Guilty", "F2", "18 § 3502 §§ A",
+                 [action_xml("Hill, Glynnis", "09/09/2011", [mixed])])
+      .replace("<grade>F2</grade>", "<grade><b>x</b></grade>"),
+  ]
+  text = docket_xml("CP-51-CR-0000009-2011", "Samuel Mccray", "07/24/1964",
+                    "01/03/2011", "01/03/2011", sequences)
+  return text.replace("<date_initiated>01/03/2011</date_initiated>", "")
+
+
+@pytest.mark.parametrize("function", [docket_num_name_age, conviction_information])
+def test_targets_match_tree_functions(function):
+  target_function = targets.TARGET_EXTRACTORS[function]
+  for path in write_corpus("tests/output/targets_corpus/", 40, seed=18):
+    assert target_function(path, path) == function(parse_docket(path), path)
+  text = odd_docket().encode("utf-8")
+  expected = function(parse_docket(BytesIO(text)), "odd.xml")
+  assert target_function(BytesIO(text), "odd.xml") == expected
+
+def test_guilty_records_target():
+  paths = write_corpus("tests/output/targets_corpus/", 40, seed=18)
+  odd = "tests/output/targets_corpus/CP-51-CR-0000099-2011_stitched_complete.xml"
+  with open(odd, "w") as f:
+    f.write(odd_docket())
+  for path in paths + [odd]:
+    # The tree Docket reads, which keeps blank text.
+    tree = load_tree_from_path(path)
+    header, sequences = targets.guilty_sentences(path)
+    assert header == {name: header_text(tree, name) for name in HEADER_QUERIES}
+    assert sequences == guilty_sentences(tree)
+    expected = Docket(path).get_guilty_sequence_records()
+    assert Docket(path, backend="target").get_guilty_sequence_records() == expected
+  with pytest.raises(ValueError):
+    Docket(odd, backend="sax")
+
+def test_odd_docket_has_errors():
+  errors, results = targets.conviction_information(BytesIO(odd_docket().encode("utf-8")), "odd.xml")
+  assert len(results) == 4
+  fields = [error["error_field"] for error in errors]
+  assert "date_initiated" in fields
+  assert "sequence_0/action_0/sentence_0/min_time" in fields
+  assert "sequence_1/action_0/judge_name" in fields
+
+def test_ask_a_docket_backend():
+  path = write_corpus("tests/output/targets_backend/", 1, seed=19)[0]
+  tree = AskADocket(conviction_information).scrape_docket(path)
+  assert AskADocket(conviction_information, backend="target").scrape_docket(path) == tree
+  with pytest.raises(ValueError):
+    AskADocket(docket_number_and_name, backend="target")
+  with pytest.raises(ValueError):
+    AskADocket(conviction_information, backend="sax")
@@ -0,0 +1,142 @@
+from DocketQuery.docket_query import AskADocket, parse_docket
+from DocketQuery.saved_functions import sentence_texts
+from DocketQuery.text_index import TextIndex, tokenize, contains_phrase
+from DocketQuery.synthetic import write_corpus
+import os
+import shutil
+import time
+import pytest
+
+
+def test_tokenize():
+  assert tokenize("HOUSE ARREST FOR FIRST 3 MONTHS.") == ["house", "arrest", "for", "first", "3", "months"]
+  assert tokenize("") == []
+  assert tokenize(None) == []
+
+def test_contains_phrase():
+  assert contains_phrase(["a", "b", "c"], ["b", "c"])
+  assert not contains_phrase(["a", "b", "c"], ["c", "b"])
+
+
+class TestTextIndex:
+
+  def setup_method(self, method):
+    self.directory = "tests/output/text_index_corpus/"
+    self.index_directory = "tests/output/text_index/"
+    for directory in [self.directory, self.index_directory]:
+      if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.makedirs(self.index_directory)
+    self.files = write_corpus(self.directory, 30, seed=25)
+
+  def grep(self, words):
+    # Rows found the slow way.
+    rows = []
+    for path in self.files:
+      for row in sentence_texts(parse_docket(path), path)[1]:
+        text = tokenize(row["sequence_description"] + " " + row["extra_sentence_details"]
+                        + " " + row["program"])
+        if all(word in text for word in words):
+          rows.append((row["file"], row["sequence"], row["action"], row["sentence"]))
+    return rows
+
+  def test_sentence_texts(self):
+    errors, rows = sentence_texts(parse_docket(self.files[0]), self.files[0])
+    assert errors == []
+    assert rows[0]["docket_number"] == "CP-51-CR-0000001-2011"
+    assert all(row["sequence_description"] for row in rows)
+    rows = [row for path in self.files for row in sentence_texts(parse_docket(path), path)[1]]
+    assert any(row["extra_sentence_details"] for row in rows)
+    assert all(row["extra_sentence_details"] == "" for row in rows if row["sentence"] is None)
+
+  def test_search(self):
+    with TextIndex(self.index_directory + "index.sqlite") as index:
+      errors, counts = index.add_files(self.files, workers=2, chunksize=7)
+      assert counts["successes"] == 30
+      for query in ["house arrest", "community service", "theft", "registration police"]:
+        found = [(row["file"], row["sequence"], row["action"], row["sentence"])
+                 for row in index.search(query)]
+        assert found == self.grep(tokenize(query))
+        assert found
+      assert index.search("arrest house", phrase=True) == []
+      assert len(index.search("house arrest", phrase=True)) == len(self.grep(["house", "arrest"]))
+      assert len(index.search("house arrest", limit=2)) == 2
+      assert index.search("house", fields=["sequence_description"]) == []
+      assert index.search("...") == []
+
+  def test_incremental(self):
+    with TextIndex(self.index_directory + "index.sqlite") as index:
+      index.add_files(self.files[:10])
+      size = len(index)
+      errors, counts = index.add_files(self.files)
+      assert counts["files_skipped"] == 10
+      assert counts["total_dockets_scraped"] == 20
+      assert index.files() == set(self.files)
+      with TextIndex(self.index_directory + "whole.sqlite") as whole:
+        whole.add_files(self.files)
+        assert len(whole) == len(index) > size
+        assert whole.search("community service") == index.search("community service")
+
+  def test_merge(self):
+    with TextIndex(self.index_directory + "a.sqlite") as a, \
+         TextIndex(self.index_directory + "b.sqlite") as b, \
+         TextIndex(self.index_directory + "whole.sqlite") as whole:
+      a.add_files(self.files[:20])
+      b.add_files(self.files[10:])
+      whole.add_files(self.files)
+      a.merge(self.index_directory + "b.sqlite")
+      assert a.files() == set(self.files)
+      assert len(a) == len(whole)
+      for query in ["house arrest", "court cost"]:
+        assert sorted(map(repr, a.search(query))) == sorted(map(repr, whole.search(query)))
+
+  def test_merge_keeps_newer_files(self):
+    terms = "SELECT term, field FROM postings ORDER BY term, field"
+    with TextIndex(self.index_directory + "a.sqlite") as a:
+      a.add_files(self.files[:5])
+      old_terms = a.connection.execute(terms).fetchall()
+    shutil.copy(self.files[5], self.files[4])
+    os.utime(self.files[4], (time.time() + 100, time.time() + 100))
+    with TextIndex(self.index_directory + "b.sqlite") as b, \
+         TextIndex(self.index_directory + "expected.sqlite") as expected:
+      b.add_files(self.files[:5])
+      expected.add_files(self.files[:5])
+      # An older version doesn't replace a newer one.
+      b.merge(self.index_directory + "a.sqlite")
+      assert b.connection.execute(terms).fetchall() == expected.connection.execute(terms).fetchall()
+      with TextIndex(self.index_directory + "a.sqlite") as a:
+        a.merge(self.index_directory + "b.sqlite")
+        assert a.signatures() == expected.signatures()
+        assert len(a) == len(expected)
+        assert a.connection.execute(terms).fetchall() == expected.connection.execute(terms).fetchall()
+        assert a.connection.execute(terms).fetchall() != old_terms
+        assert a.search("house arrest") == expected.search("house arrest")
+
+  def test_failed_files_are_retried(self):
+    broken = self.directory + "CP-51-CR-9999999-2011_stitched_complete.xml"
+    with open(broken, "w") as f:
+      f.write("<docket><header>")
+    with TextIndex(self.index_directory + "index.sqlite") as index:
+      errors, counts = index.add_files(self.files[:5] + [broken])
+      assert counts["successes"] == 5
+      assert index.files() == set(self.files[:5])
+      shutil.copy(self.files[5], broken)
+      errors, counts = index.add_files(self.files[:5] + [broken])
+      assert counts["files_skipped"] == 5
+      assert counts["successes"] == 1
+      assert broken in index.files()
+
+  def test_changed_files_are_reindexed(self):
+    with TextIndex(self.index_directory + "index.sqlite") as index:
+      index.add_files(self.files[:5])
+      with TextIndex(self.index_directory + "expected.sqlite") as expected:
+        expected.add_files(self.files[:4] + [self.files[5]])
+        shutil.copy(self.files[5], self.files[4])
+        os.utime(self.files[4], (1, 1))
+        errors, counts = index.add_files(self.files[:5])
+        assert counts["files_skipped"] == 4
+        assert counts["total_dockets_scraped"] == 1
+        assert len(index) == len(expected)
+        terms = "SELECT term, field FROM postings ORDER BY term, field"
+        assert index.connection.execute(terms).fetchall() == \
+               expected.connection.execute(terms).fetchall()
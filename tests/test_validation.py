@@ -0,0 +1,126 @@
+from DocketQuery.validation import element_paths, docket_variant, LayoutProfile, \
+                                   Schema, text_field, date_field, length_field, \
+                                   days_field, validate, query_path, \
+                                   GUILTY_RECORD_SCHEMA, CONVICTION_SCHEMA
+from DocketQuery.saved_functions import conviction_information
+from DocketQuery.synthetic import write_corpus
+from scripts.guilty_records_query import Docket, HEADER_FIELDS
+from scripts import guilty_records_query
+from lxml import etree
+import datetime
+import pytest
+
+
+class TestLayoutProfile:
+
+  def setup_method(self, method):
+    self.paths = write_corpus("tests/output/validation_corpus/", 4, seed=12)
+    # A variant without a Defendant_Information section.
+    with open(self.paths[3]) as f:
+      text = f.read()
+    start = text.index('  <section name="Defendant_Information">')
+    end = text.index('  <section name="Disposition_Sentencing_Penalties">')
+    with open(self.paths[3], "w") as f:
+      f.write(text[:start] + text[end:])
+
+  def test_element_paths(self):
+    paths = element_paths(etree.parse(self.paths[0]))
+    assert "/docket/header/docket_number" in paths
+    assert query_path(HEADER_FIELDS["date_filed"][0]) in paths
+    assert query_path(HEADER_FIELDS["birth_date"][0]) in paths
+
+  def test_variants(self):
+    profile = LayoutProfile().add_files(self.paths)
+    assert len(profile.variants) == 2
+    short = docket_variant(etree.parse(self.paths[3]))
+    birth_date = query_path(HEADER_FIELDS["birth_date"][0])
+    assert profile.seen(birth_date)
+    assert not profile.seen(birth_date, short)
+    assert profile.coverage(birth_date) == 0.75
+
+  def test_skippable(self):
+    profile = LayoutProfile().add_files(self.paths)
+    short = docket_variant(etree.parse(self.paths[3]))
+    full = docket_variant(etree.parse(self.paths[0]))
+    birth_date = query_path(HEADER_FIELDS["birth_date"][0])
+    assert profile.skippable(birth_date, short)
+    assert not profile.skippable(birth_date, full)
+    assert not profile.skippable(birth_date)
+    # A variant the profile hasn't seen only skips paths no docket has.
+    assert not profile.skippable(birth_date, ("Other",))
+    assert profile.skippable("/docket/nothing", ("Other",))
+    assert profile.seen_tag("sequence", full)
+    assert not profile.seen_tag("nothing")
+
+  def test_docket_skips_paths_by_variant(self, monkeypatch):
+    profile = LayoutProfile().add_files(self.paths)
+    queried = []
+    real_header_text = guilty_records_query.header_text
+    def header_text(tree, name):
+      queried.append(name)
+      return real_header_text(tree, name)
+    monkeypatch.setattr(guilty_records_query, "header_text", header_text)
+    short = Docket(self.paths[3], profile=profile)
+    short.prefetch()
+    assert short.get_defendant_birthdate() == "defendant_birthdate unknown"
+    assert "birth_date" not in queried
+    assert "docket_number" in queried
+    Docket(self.paths[0], profile=profile).prefetch()
+    assert "birth_date" in queried
+
+  def test_docket_skips_sequences_by_variant(self, monkeypatch):
+    # A variant without sentencing sections has no sequences to look for.
+    with open(self.paths[2]) as f:
+      text = f.read()
+    start = text.index('  <section name="Disposition_Sentencing_Penalties">')
+    end = text.index("</docket>")
+    with open(self.paths[2], "w") as f:
+      f.write(text[:start] + text[end:])
+    profile = LayoutProfile().add_files(self.paths)
+    searched = []
+    real_guilty_sentences = guilty_records_query.guilty_sentences
+    def guilty_sentences(tree):
+      searched.append(tree)
+      return real_guilty_sentences(tree)
+    monkeypatch.setattr(guilty_records_query, "guilty_sentences", guilty_sentences)
+    assert Docket(self.paths[2], profile=profile).get_guilty_sequence_records() == \
+           Docket(self.paths[2]).get_guilty_sequence_records()
+    assert len(searched) == 1
+
+  def test_save_and_load(self, tmp_path):
+    profile = LayoutProfile().add_files(self.paths)
+    profile.save(str(tmp_path / "profile.json"))
+    loaded = LayoutProfile.load(str(tmp_path / "profile.json"))
+    assert loaded.variants == profile.variants
+
+  def test_docket_skips_absent_paths(self):
+    profile = LayoutProfile().add_files(self.paths[3:])
+    docket = Docket(self.paths[0], profile=profile)
+    assert docket.get_defendant_birthdate() == "defendant_birthdate unknown"
+    assert docket.get_docket_number() == "CP-51-CR-0000001-2011"
+
+
+def test_field_types():
+  assert text_field(["Hill, Glynnis", "judge unknown", "", None]) == [1, 2, 3]
+  assert date_field(["09/09/2011", "action_date unknown", datetime.date(2011, 9, 9)]) == [1]
+  assert length_field([datetime.timedelta(days=365), datetime.timedelta(0), "15 years"]) == [1, 2]
+  assert days_field([365, 12.5, "unknown", True]) == [2, 3]
+
+def test_validate():
+  schema = Schema({"judge": text_field, "min_length": length_field})
+  records = [{"judge": "Hill, Glynnis", "min_length": datetime.timedelta(days=30)},
+             {"judge": "judge unknown", "min_length": datetime.timedelta(0)},
+             {"min_length": datetime.timedelta(days=1)}]
+  assert validate(records, schema, "a.xml") == [
+    {"file": "a.xml", "error_field": "judge"},
+    {"file": "a.xml", "error_field": "min_length"},
+    {"file": "a.xml", "error_field": "judge"}]
+
+def test_schemas_accept_clean_records():
+  path = write_corpus("tests/output/validation_clean/", 1, seed=1)[0]
+  records, errors = Docket(path).get_guilty_sequence_records()
+  assert len(records) > 0
+  assert errors == []
+  assert validate(records, GUILTY_RECORD_SCHEMA, path) == []
+  errors, results = conviction_information(etree.parse(path), path)
+  assert validate(results, CONVICTION_SCHEMA, path, file_key="error_file") == []